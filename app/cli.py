@@ -0,0 +1,248 @@
+"""
+Comandos de administración de la tienda.
+
+Uso:
+    python -m app.cli rebuild-search-index
+    python -m app.cli rebuild-facets
+    python -m app.cli import-products catalogo.ndjson [--format csv] [--batch-size 1000]
+    python -m app.cli compact-carts [--max-age-days 30] [--batch-size 500]
+    python -m app.cli sweep-reservations [--batch-size 500]
+    python -m app.cli analyze
+    python -m app.cli bench-checkout [--checkouts 200] [--items 3] [--group-size 100]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.repositories.database import Base, SessionLocal, engine
+from app.repositories.migrations import run_migrations
+# Import all models to ensure they're registered with SQLAlchemy
+from app.repositories.models import *
+from app.repositories.product_search_repository import ProductSearchRepository
+from app.repositories.product_facet_repository import ProductFacetRepository
+from app import config
+from app.services.product_import_service import ProductImportService
+from app.services.statistics_service import StatisticsService
+from app.services.cart_compaction_service import CartCompactionService
+from app.services.cart_service import CartService
+from app.services.checkout_service import CheckoutService
+from app.services.order_service import OrderService
+from app.services.stock_reservation_service import StockReservationService
+
+
+def rebuild_search_index(args):
+    """Reconstruir el índice de búsqueda de productos"""
+    db = SessionLocal()
+    try:
+        ProductSearchRepository().rebuild(db)
+    finally:
+        db.close()
+    print("Search index rebuilt")
+
+
+def rebuild_facets(args):
+    """Recalcular los agregados por categoría de productos"""
+    db = SessionLocal()
+    try:
+        ProductFacetRepository().rebuild(db)
+    finally:
+        db.close()
+    print("Product facets rebuilt")
+
+
+def import_products(args):
+    """Importar productos desde un archivo NDJSON o CSV"""
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    db = SessionLocal()
+    try:
+        with open(args.path, encoding="utf-8", newline="") as stream:
+            report = ProductImportService().import_products(
+                db, stream, file_format, batch_size=args.batch_size
+            )
+        # Una importación grande deja viejas las estadísticas de SQLite
+        StatisticsService().refresh(db)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def compact_carts(args):
+    """Purgar carritos abandonados"""
+    db = SessionLocal()
+    try:
+        report = CartCompactionService().compact(
+            db, max_age_days=args.max_age_days, batch_size=args.batch_size
+        )
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+def sweep_reservations(args):
+    """Devolver el stock de las reservas vencidas"""
+    db = SessionLocal()
+    try:
+        report = StockReservationService().sweep(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+def analyze(args):
+    """Actualizar las estadísticas de SQLite (planificador y totales aproximados de los listados)"""
+    db = SessionLocal()
+    try:
+        StatisticsService().refresh(db)
+    finally:
+        db.close()
+    print("Database statistics updated")
+
+
+def _seed_checkout_bench(db, checkouts: int, items: int):
+    """Crear productos con stock de sobra y checkouts usuarios con items productos en el carrito"""
+    product_ids = db.scalars(
+        insert(ProductModel).returning(ProductModel.id),
+        [
+            {"name": f"Bench {i}", "price": 10.0 + i, "description": "", "category": "bench",
+             "stock": checkouts * items, "image": ""}
+            for i in range(items)
+        ]
+    ).all()
+    user_ids = db.scalars(
+        insert(UserModel).returning(UserModel.id),
+        [{"name": f"bench-{time.time_ns()}-{i}", "email": f"bench-{time.time_ns()}-{i}@example.com"} for i in range(checkouts)]
+    ).all()
+    cart_ids = db.scalars(
+        insert(CartModel).returning(CartModel.id), [{"user_id": user_id} for user_id in user_ids]
+    ).all()
+    db.execute(insert(CartItemModel), [
+        {"cart_id": cart_id, "product_id": product_id, "quantity": 1}
+        for cart_id in cart_ids for product_id in product_ids
+    ])
+    db.commit()
+    return user_ids
+
+
+def _legacy_checkout(db, user_id: int):
+    """Flujo anterior de POST /carts/purchase: orden, items, stock por producto y carrito, con un commit cada uno"""
+    result = OrderService().create_order_from_cart(db, user_id)
+    for item in result["cart_items_processed"]:
+        _legacy_reduce_stock(db, item["product_id"], item["quantity"])
+    CartService().clear_user_cart(db, user_id)
+
+
+def _legacy_reduce_stock(db, product_id: int, quantity: int):
+    """
+    reduce_product_stock anterior: leer el producto, controlar el stock y
+    escribir el nuevo valor (lectura-modificación-escritura por fila), con su commit
+    """
+    product = db.get(ProductModel, product_id)
+    if product.stock < quantity:
+        raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.name}")
+    product.stock = product.stock - quantity
+    db.commit()
+
+
+def _group_commit_checkouts(db, user_ids, group_size: int):
+    """Checkouts en lotes de group_size con una transacción por lote, como la cola de checkouts"""
+    checkout_service = CheckoutService()
+    for start in range(0, len(user_ids), group_size):
+        checkout_service.checkout_many(db, user_ids[start:start + group_size])
+
+
+def bench_checkout(args):
+    """
+    Medir checkouts por segundo del flujo anterior, del CheckoutService (una
+    transacción por compra) y del group commit sobre una base temporal
+    """
+    checkout_service = CheckoutService()
+    pipelines = {
+        "legacy": lambda db, user_ids: [_legacy_checkout(db, user_id) for user_id in user_ids],
+        "single_transaction": lambda db, user_ids: [checkout_service.checkout(db, user_id) for user_id in user_ids],
+        "group_commit": lambda db, user_ids: _group_commit_checkouts(db, user_ids, args.group_size),
+    }
+    report = {"checkouts": args.checkouts, "items_per_cart": args.items, "group_size": args.group_size}
+    with tempfile.TemporaryDirectory() as directory:
+        bench_engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=bench_engine)
+        run_migrations(bench_engine)
+        BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=bench_engine)
+        for name, run_checkouts in pipelines.items():
+            db = BenchSession()
+            try:
+                user_ids = _seed_checkout_bench(db, args.checkouts, args.items)
+                started = time.perf_counter()
+                run_checkouts(db, user_ids)
+                elapsed = time.perf_counter() - started
+            finally:
+                db.close()
+            report[name] = {
+                "elapsed_seconds": round(elapsed, 3),
+                "checkouts_per_second": round(len(user_ids) / elapsed, 1),
+            }
+        bench_engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = subparsers.add_parser(
+        "rebuild-search-index", help="Reconstruir el índice de búsqueda de productos"
+    )
+    rebuild_parser.set_defaults(func=rebuild_search_index)
+
+    facets_parser = subparsers.add_parser(
+        "rebuild-facets", help="Recalcular los agregados por categoría de productos"
+    )
+    facets_parser.set_defaults(func=rebuild_facets)
+
+    import_parser = subparsers.add_parser(
+        "import-products", help="Importar productos desde un archivo NDJSON o CSV"
+    )
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"])
+    import_parser.add_argument("--batch-size", type=int, default=config.PRODUCT_IMPORT_BATCH_SIZE)
+    import_parser.set_defaults(func=import_products)
+
+    compact_parser = subparsers.add_parser(
+        "compact-carts", help="Purgar carritos sin modificar hace más de --max-age-days días"
+    )
+    compact_parser.add_argument("--max-age-days", type=float, default=config.CART_COMPACTION_MAX_AGE_DAYS)
+    compact_parser.add_argument("--batch-size", type=int, default=config.CART_COMPACTION_BATCH_SIZE)
+    compact_parser.set_defaults(func=compact_carts)
+
+    sweep_parser = subparsers.add_parser(
+        "sweep-reservations", help="Devolver el stock de las reservas de carrito vencidas"
+    )
+    sweep_parser.add_argument("--batch-size", type=int, default=config.STOCK_RESERVATION_SWEEP_BATCH_SIZE)
+    sweep_parser.set_defaults(func=sweep_reservations)
+
+    analyze_parser = subparsers.add_parser(
+        "analyze", help="Actualizar las estadísticas de SQLite (ANALYZE)"
+    )
+    analyze_parser.set_defaults(func=analyze)
+
+    bench_parser = subparsers.add_parser(
+        "bench-checkout", help="Comparar checkouts por segundo (flujo anterior, una transacción por compra y group commit)"
+    )
+    bench_parser.add_argument("--checkouts", type=int, default=200)
+    bench_parser.add_argument("--items", type=int, default=3)
+    bench_parser.add_argument("--group-size", type=int, default=config.CHECKOUT_QUEUE_BATCH_SIZE)
+    bench_parser.set_defaults(func=bench_checkout)
+
+    args = parser.parse_args(argv)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
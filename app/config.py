@@ -0,0 +1,72 @@
+import os
+
+# Configuración por despliegue, leída de variables de entorno
+
+
+def _int_env(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _float_env(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# Caché de productos (PRODUCT_CACHE_MAX_ENTRIES=0 la desactiva)
+PRODUCT_CACHE_MAX_ENTRIES = _int_env("PRODUCT_CACHE_MAX_ENTRIES", 1024)
+PRODUCT_CACHE_TTL_SECONDS = _float_env("PRODUCT_CACHE_TTL_SECONDS", 30.0)
+
+# Importación masiva de productos
+PRODUCT_IMPORT_BATCH_SIZE = _int_env("PRODUCT_IMPORT_BATCH_SIZE", 1000)
+PRODUCT_IMPORT_MAX_REPORTED_ERRORS = _int_env("PRODUCT_IMPORT_MAX_REPORTED_ERRORS", 1000)
+
+# Exportación en streaming (filas por lote leídas del cursor)
+EXPORT_BATCH_SIZE = _int_env("EXPORT_BATCH_SIZE", 1000)
+
+# Tamaño de página por defecto y máximo de los listados paginados (usuarios, carritos)
+LIST_PAGE_SIZE_DEFAULT = _int_env("LIST_PAGE_SIZE_DEFAULT", 50)
+LIST_PAGE_SIZE_MAX = _int_env("LIST_PAGE_SIZE_MAX", 500)
+
+# Máximo de ids aceptados por GET /products/?ids= y GET /orders/?ids=
+PRODUCT_BATCH_MAX_IDS = _int_env("PRODUCT_BATCH_MAX_IDS", 200)
+ORDER_BATCH_MAX_IDS = _int_env("ORDER_BATCH_MAX_IDS", 200)
+
+# Almacén de carritos: "sql" (directo a SQLite), "memory" o "redis".
+# Con memory/redis los cambios se persisten en SQLite en segundo plano (write-behind)
+CART_STORE_BACKEND = os.getenv("CART_STORE_BACKEND", "sql")
+CART_STORE_REDIS_URL = os.getenv("CART_STORE_REDIS_URL", "redis://localhost:6379/0")
+CART_STORE_FLUSH_INTERVAL_SECONDS = _float_env("CART_STORE_FLUSH_INTERVAL_SECONDS", 1.0)
+CART_STORE_FLUSH_BATCH_SIZE = _int_env("CART_STORE_FLUSH_BATCH_SIZE", 200)
+# Carritos ya persistidos que se conservan: LRU en memory, vencimiento por inactividad en redis (0 = sin límite)
+CART_STORE_MAX_CARTS = _int_env("CART_STORE_MAX_CARTS", 100000)
+CART_STORE_IDLE_TTL_SECONDS = _int_env("CART_STORE_IDLE_TTL_SECONDS", 86400)
+
+# Purga de carritos abandonados (CART_COMPACTION_INTERVAL_SECONDS=0 desactiva el job)
+CART_COMPACTION_MAX_AGE_DAYS = _float_env("CART_COMPACTION_MAX_AGE_DAYS", 30.0)
+CART_COMPACTION_BATCH_SIZE = _int_env("CART_COMPACTION_BATCH_SIZE", 500)
+CART_COMPACTION_INTERVAL_SECONDS = _float_env("CART_COMPACTION_INTERVAL_SECONDS", 3600.0)
+
+# Idempotency-Key: cuánto se guardan las respuestas, caché en memoria y compactación
+IDEMPOTENCY_KEY_TTL_SECONDS = _float_env("IDEMPOTENCY_KEY_TTL_SECONDS", 86400.0)
+IDEMPOTENCY_CACHE_MAX_ENTRIES = _int_env("IDEMPOTENCY_CACHE_MAX_ENTRIES", 10000)
+# Una clave "en curso" más vieja que esto se considera de una petición que murió y se puede retomar
+IDEMPOTENCY_IN_PROGRESS_LEASE_SECONDS = _float_env("IDEMPOTENCY_IN_PROGRESS_LEASE_SECONDS", 60.0)
+IDEMPOTENCY_COMPACTION_INTERVAL_SECONDS = _float_env("IDEMPOTENCY_COMPACTION_INTERVAL_SECONDS", 600.0)
+IDEMPOTENCY_COMPACTION_BATCH_SIZE = _int_env("IDEMPOTENCY_COMPACTION_BATCH_SIZE", 1000)
+
+# Checkout: "sync" (POST /carts/purchase compra en el momento) o "queue"
+# (encola y responde 202; un único escritor compra en lotes con group commit)
+CHECKOUT_MODE = os.getenv("CHECKOUT_MODE", "sync")
+CHECKOUT_QUEUE_MAX_SIZE = _int_env("CHECKOUT_QUEUE_MAX_SIZE", 10000)
+CHECKOUT_QUEUE_BATCH_SIZE = _int_env("CHECKOUT_QUEUE_BATCH_SIZE", 100)
+CHECKOUT_QUEUE_RESULT_TTL_SECONDS = _float_env("CHECKOUT_QUEUE_RESULT_TTL_SECONDS", 3600.0)
+CHECKOUT_QUEUE_RESULTS_MAX_ENTRIES = _int_env("CHECKOUT_QUEUE_RESULTS_MAX_ENTRIES", 100000)
+
+# Reservas de stock al agregar al carrito (STOCK_RESERVATION_TTL_SECONDS=0 las
+# desactiva) y barrido de las vencidas (STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS=0 desactiva el job)
+STOCK_RESERVATION_TTL_SECONDS = _float_env("STOCK_RESERVATION_TTL_SECONDS", 0.0)
+STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS = _float_env("STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS", 30.0)
+STOCK_RESERVATION_SWEEP_BATCH_SIZE = _int_env("STOCK_RESERVATION_SWEEP_BATCH_SIZE", 500)
+
+# Cada cuántos segundos se corre ANALYZE para actualizar los totales aproximados
+# de los listados (DB_ANALYZE_INTERVAL_SECONDS=0 desactiva el job)
+DB_ANALYZE_INTERVAL_SECONDS = _float_env("DB_ANALYZE_INTERVAL_SECONDS", 3600.0)
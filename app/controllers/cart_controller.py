@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from app import config
+from app.controllers.etag import make_etag, etag_matches, not_modified
 from app.repositories.database import get_db
 from app.services.cart_service import CartService
-from app.services.product_service import ProductService
-from app.services.order_service import OrderService
-from app.schemas.cart_schema import Cart, CartWithItems
-from app.schemas.cart_item_schema import AddToCart
+from app.services.cart_compaction_service import CartCompactionService
+from app.services.export_service import ExportService
+from app.services.checkout_service import CheckoutService
+from app.services.checkout_queue import checkout_queue
+from app.services.idempotency_service import IdempotencyService
+from app.services.stock_reservation_service import StockReservationService
+from app.schemas.cart_schema import Cart, CartWithItems, CartSummary, CartPage
+from app.schemas.cart_item_schema import AddToCart, CartBatchUpdate
 from app.schemas.order_schema import Order
 
 
@@ -17,19 +24,35 @@ router = APIRouter(
 )
 
 cart_service = CartService()
-product_service = ProductService()
-order_service = OrderService()
+checkout_service = CheckoutService()
+compaction_service = CartCompactionService()
+export_service = ExportService()
+idempotency_service = IdempotencyService()
+stock_reservation_service = StockReservationService()
 
 
-@router.get("/", response_model=List[Cart])
-def get_all_carts(db: Session = Depends(get_db)):
+@router.get("/", response_model=CartPage)
+def get_all_carts(
+    limit: int = Query(config.LIST_PAGE_SIZE_DEFAULT, ge=1, le=config.LIST_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
     """
-    Obtener todos los carritos
+    Obtener carritos paginados por cursor (para la página siguiente enviar el
+    next_cursor de la respuesta). approximate_total es una estimación sin COUNT(*).
+    Con stream=true devuelve todos los carritos en NDJSON, en streaming.
     """
     try:
-        # Necesitarás agregar este método al CartService
-        carts = cart_service.get_all_carts(db)
+        if stream:
+            return StreamingResponse(
+                export_service.stream_export("carts", "ndjson"),
+                media_type=export_service.media_type("ndjson")
+            )
+        carts = cart_service.get_all_carts(db, limit=limit, cursor=cursor)
         return carts
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -37,6 +60,34 @@ def get_all_carts(db: Session = Depends(get_db)):
         )
 
 
+@router.get("/compaction/stats")
+def get_cart_compaction_stats():
+    """
+    Métricas de la purga de carritos abandonados (ejecuciones, carritos e items borrados)
+    """
+    return compaction_service.get_stats()
+
+
+@router.get("/reservations/stats")
+def get_stock_reservation_stats():
+    """
+    Métricas del barrido de reservas de stock vencidas (ejecuciones, reservas
+    liberadas y unidades devueltas al stock)
+    """
+    return stock_reservation_service.get_stats()
+
+
+@router.get("/checkout-queue/stats")
+def get_checkout_queue_stats():
+    """
+    Estado de la cola de checkouts (CHECKOUT_MODE=queue): compras encoladas,
+    lotes procesados y compras completadas y fallidas
+    """
+    if checkout_queue is None:
+        raise HTTPException(status_code=404, detail="Checkout queue is disabled")
+    return checkout_queue.get_stats()
+
+
 @router.get("/{cart_id}")
 def get_cart(cart_id: int, db: Session = Depends(get_db)):
     """
@@ -58,11 +109,21 @@ def get_cart(cart_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/user/{user_id}")
-def get_user_cart(user_id: int, db: Session = Depends(get_db)):
+def get_user_cart(
+    user_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """
-    Obtener carrito de un usuario específico con detalles de productos
+    Obtener carrito de un usuario específico con detalles de productos.
+    Devuelve ETag; con If-None-Match responde 304 si nada cambió, sin cargar los productos.
     """
     try:
+        etag = make_etag("cart", *cart_service.get_cart_version(db, user_id))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
         cart_details = cart_service.get_cart_with_product_details(db, user_id)
         return cart_details
     except HTTPException:
@@ -74,6 +135,23 @@ def get_user_cart(user_id: int, db: Session = Depends(get_db)):
         )
 
 
+@router.get("/user/{user_id}/summary", response_model=CartSummary)
+def get_user_cart_summary(user_id: int, db: Session = Depends(get_db)):
+    """
+    Obtener cantidad de unidades y monto total del carrito del usuario.
+    Lee los totales guardados en el carrito, sin cargar items ni productos.
+    """
+    try:
+        return cart_service.get_cart_total(db, user_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving cart summary"
+        )
+
+
 @router.post("/{cart_id}/{product_id}")
 def add_product_to_cart(
     cart_id: int, 
@@ -106,6 +184,28 @@ def add_product_to_cart(
         )
 
 
+@router.patch("/{cart_id}/items")
+def update_cart_items(
+    cart_id: int,
+    batch: CartBatchUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Aplicar varias operaciones sobre el carrito en una sola transacción.
+    Cada operación es {"op": "add" | "set" | "remove", "product_id": int, "quantity": int}
+    y la respuesta incluye el resultado de cada una.
+    """
+    try:
+        return cart_service.apply_cart_operations(db, cart_id, batch.operations)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error updating cart items"
+        )
+
+
 @router.delete("/{cart_id}/{product_id}")
 def remove_product_from_cart(
     cart_id: int, 
@@ -116,26 +216,8 @@ def remove_product_from_cart(
     Eliminar producto del carrito
     """
     try:
-        # Obtener el carrito para obtener el user_id
-        cart = cart_service.cart_repository.get_cart(db, cart_id)
-        
-        # Buscar el cart_item específico
-        cart_items = cart_service.cart_item_repository.get_cart_items(db, cart_id)
-        cart_item = None
-        
-        for item in cart_items:
-            if item.product_id == product_id:
-                cart_item = item
-                break
-        
-        if not cart_item:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Product not found in cart"
-            )
-        
-        # Remover el item
-        result = cart_service.remove_item_from_cart(db, cart.user_id, cart_item.id)
+        # Un solo DELETE por (cart_id, product_id)
+        result = cart_service.remove_product_from_cart(db, cart_id, product_id)
         
         return {
             "message": "Product removed from cart successfully",
@@ -151,44 +233,50 @@ def remove_product_from_cart(
         )
 
 
+def _process_purchase(db: Session, user_id: int):
+    """Comprar en el momento (200) o, con la cola de checkouts, encolar (202)"""
+    if checkout_queue is None:
+        return status.HTTP_200_OK, checkout_service.checkout(db, user_id)
+    return status.HTTP_202_ACCEPTED, checkout_queue.submit(user_id)
+
+
 @router.post("/purchase")
-def purchase_cart(user_id: int, db: Session = Depends(get_db)):
+def purchase_cart(
+    user_id: int,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """
-    Procesar compra del carrito: crear orden, reducir stock y vaciar carrito
+    Procesar compra del carrito: reducir stock, crear orden e items y vaciar
+    carrito en una sola transacción (todo o nada).
+    Con el encabezado Idempotency-Key, repetir la petición con la misma clave
+    devuelve la respuesta de la primera compra sin volver a procesarla
+    (encabezado Idempotent-Replayed: true).
+    Con CHECKOUT_MODE=queue la compra se encola: responde 202 con status_url,
+    donde se consulta el resultado.
     """
     try:
-        # 1. Crear orden desde el carrito (esto incluye validaciones)
-        order_result = order_service.create_order_from_cart(db, user_id)
+        if idempotency_key is None:
+            response.status_code, result = _process_purchase(db, user_id)
+            return result
         
-        # 2. Reducir stock de todos los productos
-        for item_data in order_result["cart_items_processed"]:
-            try:
-                product_service.reduce_product_stock(
-                    db, 
-                    item_data["product_id"], 
-                    item_data["quantity"]
-                )
-            except Exception as stock_error:
-                # Si hay error reduciendo stock, cancelar orden
-                try:
-                    order_service.cancel_order(db, order_result["order"].id)
-                except:
-                    pass
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Error updating stock: {str(stock_error)}"
-                )
+        fingerprint = idempotency_service.fingerprint(
+            request.method, request.url.path, request.query_params.multi_items()
+        )
+        replay = idempotency_service.begin(db, idempotency_key, fingerprint)
+        if replay is not None:
+            status_code, content = replay
+            return JSONResponse(content=content, status_code=status_code, headers={"Idempotent-Replayed": "true"})
         
-        # 3. Vaciar el carrito después de la compra exitosa
-        cart_service.clear_user_cart(db, user_id)
-        
-        return {
-            "success": True,
-            "message": "Purchase completed successfully",
-            "order": order_result["order"],
-            "items_purchased": order_result["items_count"],
-            "total_amount": order_result["total_amount"]
-        }
+        try:
+            response.status_code, result = _process_purchase(db, user_id)
+        except Exception:
+            # La compra no se hizo: liberar la clave para poder reintentar
+            idempotency_service.release(db, idempotency_key)
+            raise
+        return idempotency_service.complete(db, idempotency_key, fingerprint, response.status_code, result)
         
     except HTTPException:
         raise
@@ -196,4 +284,15 @@ def purchase_cart(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=500,
             detail=f"Error processing purchase: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/purchase/{checkout_id}")
+def get_purchase_status(checkout_id: str):
+    """
+    Estado de una compra encolada (CHECKOUT_MODE=queue): queued, processing,
+    completed (con la orden en result) o failed (con el error en error)
+    """
+    if checkout_queue is None:
+        raise HTTPException(status_code=404, detail="Checkout not found")
+    return checkout_queue.get_status(checkout_id)
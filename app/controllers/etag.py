@@ -0,0 +1,22 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Response, status
+
+
+def make_etag(*parts) -> str:
+    """ETag fuerte y opaco a partir de las partes que identifican la versión del recurso"""
+    key = ":".join(str(part) for part in parts)
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparar contra If-None-Match (acepta "*", listas y la forma débil W/)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
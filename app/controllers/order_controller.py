@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Header, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import Optional
 
+from app import config
+from app.controllers.etag import make_etag, etag_matches, not_modified
+from app.controllers.query_params import parse_ids
 from app.repositories.database import get_db
 from app.services.order_service import OrderService
-from app.schemas.order_schema import Order, OrderWithItems
+from app.services.export_service import ExportService
+from app.schemas.order_schema import Order, OrderPage, OrderWithItems
 
 
 router = APIRouter(
@@ -13,16 +19,37 @@ router = APIRouter(
 )
 
 order_service = OrderService()
+export_service = ExportService()
 
 
-@router.get("/", response_model=List[Order])
-def get_all_orders(db: Session = Depends(get_db)):
+@router.get("/")
+@router.get("", include_in_schema=False)
+def get_all_orders(
+    ids: Optional[str] = None,
+    limit: int = Query(config.LIST_PAGE_SIZE_DEFAULT, ge=1, le=config.LIST_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """
-    Obtener todas las órdenes
+    Obtener órdenes de la más nueva a la más vieja, paginadas por cursor (para
+    la página siguiente enviar el next_cursor de la respuesta).
+    date_from (incluida) y date_to (excluida) filtran por fecha.
+    fields=id,total devuelve solo esas columnas (el id siempre se incluye).
+    Con ids=1,2,3 devuelve esas órdenes con sus items, en ese orden (dos
+    consultas en total), y los ids inexistentes en missing_ids.
     """
     try:
-        orders = order_service.get_all_orders(db)
+        if ids is not None:
+            return order_service.get_orders_by_ids(db, parse_ids(ids, config.ORDER_BATCH_MAX_IDS))
+        orders = order_service.get_all_orders(
+            db, limit=limit, cursor=cursor, date_from=date_from, date_to=date_to, fields=fields
+        )
         return orders
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -30,12 +57,46 @@ def get_all_orders(db: Session = Depends(get_db)):
         )
 
 
+@router.get("/export")
+def export_orders(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """
+    Exportar todas las órdenes en NDJSON o CSV, enviado en streaming
+    """
+    return StreamingResponse(
+        export_service.stream_export("orders", format),
+        media_type=export_service.media_type(format),
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
+
+
+@router.get("/items/export")
+def export_order_items(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """
+    Exportar todos los items de órdenes en NDJSON o CSV, enviado en streaming
+    """
+    return StreamingResponse(
+        export_service.stream_export("order_items", format),
+        media_type=export_service.media_type(format),
+        headers={"Content-Disposition": f'attachment; filename="order_items.{format}"'}
+    )
+
+
 @router.get("/{order_id}", response_model=OrderWithItems)
-def get_order(order_id: int, db: Session = Depends(get_db)):
+def get_order(
+    order_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """
-    Obtener orden específica por ID con sus items
+    Obtener orden específica por ID con sus items.
+    Devuelve ETag; con If-None-Match responde 304 si la orden no cambió, sin cargar los items.
     """
     try:
+        etag = make_etag("order", order_id, order_service.get_order_version(db, order_id))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
         order = order_service.get_order_by_id(db, order_id)
         return order
     except HTTPException:
@@ -48,14 +109,30 @@ def get_order(order_id: int, db: Session = Depends(get_db)):
         )
 
 
-@router.get("/user/{user_id}", response_model=List[Order])
-def get_orders_by_user(user_id: int, db: Session = Depends(get_db)):
+@router.get("/user/{user_id}", response_model=OrderPage)
+def get_orders_by_user(
+    user_id: int,
+    limit: int = Query(config.LIST_PAGE_SIZE_DEFAULT, ge=1, le=config.LIST_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_items: bool = False,
+    db: Session = Depends(get_db)
+):
     """
-    Obtener todas las órdenes de un usuario específico
+    Obtener el historial de órdenes de un usuario, de la más nueva a la más
+    vieja y paginado por cursor, con los mismos filtros de fecha que GET /orders/.
+    Con include_items=true cada orden trae sus items (una sola consulta más
+    para toda la página).
     """
     try:
-        orders = order_service.get_orders_by_user(db, user_id)
+        orders = order_service.get_orders_by_user(
+            db, user_id, limit=limit, cursor=cursor, date_from=date_from, date_to=date_to,
+            include_items=include_items
+        )
         return orders
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -63,6 +140,23 @@ def get_orders_by_user(user_id: int, db: Session = Depends(get_db)):
         )
 
 
+@router.post("/{order_id}/cancel")
+def cancel_order(order_id: int, db: Session = Depends(get_db)):
+    """
+    Cancelar una orden: devuelve el stock de todos sus productos y la deja con
+    status "cancelled" (no se borra). Cancelar dos veces responde 409.
+    """
+    try:
+        return order_service.cancel_order(db, order_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error cancelling order"
+        )
+
+
 @router.get("/{order_id}/summary")
 def get_order_summary(order_id: int, db: Session = Depends(get_db)):
     """
@@ -1,20 +1,108 @@
-from fastapi import APIRouter,Depends
+import io
+from fastapi import APIRouter,Depends,Query,File,UploadFile,HTTPException,status,Header,Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from typing import Optional
 
+from app import config
 from app.repositories.database import get_db
-from app.services import ProductService
-from app.schemas import Product, ProductCreate, ProductUpdate
+from app.services import ProductService, ProductImportService, ExportService
+from app.controllers.etag import make_etag, etag_matches, not_modified
+from app.controllers.query_params import parse_ids
+from app.schemas import Product, ProductCreate, ProductUpdate, ProductBatch
 
 router  = APIRouter(prefix="/products", tags=["Products"])
 service = ProductService()
+import_service = ProductImportService()
+export_service = ExportService()
 
 @router.get("/")
-def get_products(db: Session = Depends(get_db)):
-    return service.get_products(db)
+@router.get("", include_in_schema=False)
+def get_products(
+    ids: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Listar productos paginados por cursor.
+    sort: id, price o name (prefijo "-" para descendente).
+    Para la página siguiente enviar el next_cursor de la respuesta.
+    fields=name,price devuelve solo esas columnas (el id siempre se incluye).
+    Con ids=1,2,3 devuelve esos productos en ese orden (una sola consulta)
+    y los ids inexistentes en missing_ids.
+    """
+    if ids is not None:
+        products, missing_ids = service.get_products_by_ids(db, parse_ids(ids, config.PRODUCT_BATCH_MAX_IDS))
+        return ProductBatch(items=products, missing_ids=missing_ids)
+    return service.get_products(
+        db, limit=limit, cursor=cursor, sort=sort, category=category,
+        min_price=min_price, max_price=max_price, in_stock=in_stock,
+        fields=fields
+    )
+
+@router.get("/search")
+def search_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Buscar productos por texto (nombre, descripción y categoría).
+    Los resultados vienen ordenados por relevancia; paginar con next_cursor.
+    """
+    return service.search_products(db, q, limit=limit, cursor=cursor)
+
+@router.get("/facets")
+def get_product_facets(db: Session = Depends(get_db)):
+    """
+    Cantidad de productos (total y con stock) y rango de precios por categoría,
+    para los filtros del listado
+    """
+    return service.get_facets(db)
+
+@router.get("/export")
+def export_products(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """
+    Exportar el catálogo completo en NDJSON o CSV, enviado en streaming
+    """
+    return StreamingResponse(
+        export_service.stream_export("products", format),
+        media_type=export_service.media_type(format),
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
+@router.get("/cache/stats")
+def get_product_cache_stats():
+    """
+    Contadores de la caché de productos (hits, misses, desalojos)
+    """
+    return service.get_cache_stats()
 
 @router.get("/{product_id}")
-def get_product(product_id: int,db: Session = Depends(get_db),):
-    return service.get_product(db,product_id)
+def get_product(
+    product_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Obtener producto por ID. Devuelve ETag; con If-None-Match responde 304
+    si el producto no cambió, leyendo solo su versión.
+    """
+    version = service.get_product_version(db, product_id)
+    etag = make_etag("product", product_id, version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return service.get_product(db, product_id, version=version)
 
 @router.post("/")
 def create_product(product: ProductCreate,db: Session = Depends(get_db)):
@@ -29,6 +117,41 @@ def update_product(product_id: int, product: ProductUpdate, db: Session = Depend
 def delete_product(product_id: int,db: Session = Depends(get_db)):
     return service.delete_product(db,product_id)
 
+@router.post("/import")
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(config.PRODUCT_IMPORT_BATCH_SIZE, ge=1, le=50000),
+    db: Session = Depends(get_db),
+):
+    """
+    Importar productos en lote desde un archivo NDJSON (un producto por línea) o CSV
+    (con encabezado name,price,description,category,stock,image).
+    Si no se indica format se deduce de la extensión del archivo.
+    Devuelve un reporte con los errores por fila y las filas por segundo.
+    """
+    file_format = format
+    if file_format is None:
+        filename = (file.filename or "").lower()
+        if filename.endswith(".csv"):
+            file_format = "csv"
+        elif filename.endswith((".ndjson", ".jsonl")):
+            file_format = "ndjson"
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not infer import format, use ?format=ndjson or ?format=csv"
+            )
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        return import_service.import_products(db, stream, file_format, batch_size=batch_size)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File must be UTF-8 encoded")
+    finally:
+        # Evitar que el wrapper cierre el archivo subido, lo cierra FastAPI
+        stream.detach()
+
 @router.post("/example")
 def create_example_products(db: Session = Depends(get_db)):
     """
@@ -0,0 +1,22 @@
+from typing import List
+
+from fastapi import HTTPException, status
+
+
+def parse_ids(ids: str, max_ids: int) -> List[int]:
+    """Convertir un parámetro "1,2,3" en lista de ids (manteniendo el orden)"""
+    try:
+        parsed = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma separated list of integers"
+        )
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must not be empty")
+    if len(parsed) > max_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {max_ids} ids per request"
+        )
+    return parsed
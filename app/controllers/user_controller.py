@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Optional
 
+from app import config
 from app.repositories.database import get_db
+from app.repositories.models.user_model import UserModel
+from app.repositories.projection import parse_fields
+from app.services.export_service import ExportService
 from app.services.user_service import UserService
-from app.schemas.user_schema import User, UserCreate
+from app.schemas.user_schema import User, UserCreate, UserPage
 
 
 router = APIRouter(
@@ -13,16 +18,33 @@ router = APIRouter(
 )
 
 user_service = UserService()
+export_service = ExportService()
 
 
-@router.get("/", response_model=List[User])
-def get_all_users(db: Session = Depends(get_db)):
+@router.get("/", response_model=UserPage)
+def get_all_users(
+    limit: int = Query(config.LIST_PAGE_SIZE_DEFAULT, ge=1, le=config.LIST_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
     """
-    Obtener todos los usuarios
+    Obtener usuarios paginados por cursor (para la página siguiente enviar el
+    next_cursor de la respuesta). approximate_total es una estimación sin COUNT(*).
+    fields=id,name devuelve solo esas columnas (el id siempre se incluye).
+    Con stream=true devuelve todos los usuarios en NDJSON, en streaming.
     """
     try:
-        users = user_service.get_all_users(db)
+        if stream:
+            return StreamingResponse(
+                export_service.stream_export("users", "ndjson", columns=parse_fields(UserModel, fields)),
+                media_type=export_service.media_type("ndjson")
+            )
+        users = user_service.get_all_users(db, limit=limit, cursor=cursor, fields=fields)
         return users
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
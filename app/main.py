@@ -1,14 +1,87 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from app import config
 from app.controllers import product_router, user_router,cart_router,order_router
 from app.repositories.database import Base, engine
+from app.repositories.migrations import run_migrations
+from app.repositories.cart_store import cart_store
+from app.services.cart_service import CartService
+from app.services.cart_compaction_service import CartCompactionService
+from app.services.checkout_queue import checkout_queue
+from app.services.idempotency_service import IdempotencyService
+from app.services.jobs import PeriodicJob
+from app.services.statistics_service import StatisticsService
+from app.services.stock_reservation_service import StockReservationService
 # Import all models to ensure they're registered with SQLAlchemy
 from app.repositories.models import *
 
+
+def background_jobs():
+    """Jobs que corren en segundo plano mientras la API está levantada"""
+    jobs = []
+    if cart_store is not None:
+        jobs.append(PeriodicJob(
+            "cart-store-flush",
+            config.CART_STORE_FLUSH_INTERVAL_SECONDS,
+            CartService().flush_pending_carts,
+        ))
+    if config.CART_COMPACTION_INTERVAL_SECONDS > 0:
+        jobs.append(PeriodicJob(
+            "cart-compaction",
+            config.CART_COMPACTION_INTERVAL_SECONDS,
+            CartCompactionService().run,
+        ))
+    if config.STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS > 0:
+        # Corre aunque las reservas estén desactivadas: así se devuelve el
+        # stock de las que quedaron de cuando estaban activas
+        jobs.append(PeriodicJob(
+            "stock-reservation-sweep",
+            config.STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS,
+            StockReservationService().run_sweep,
+        ))
+    if config.IDEMPOTENCY_COMPACTION_INTERVAL_SECONDS > 0:
+        jobs.append(PeriodicJob(
+            "idempotency-compaction",
+            config.IDEMPOTENCY_COMPACTION_INTERVAL_SECONDS,
+            IdempotencyService().run_compaction,
+        ))
+    if config.DB_ANALYZE_INTERVAL_SECONDS > 0:
+        jobs.append(PeriodicJob(
+            "db-analyze",
+            config.DB_ANALYZE_INTERVAL_SECONDS,
+            StatisticsService().run_refresh,
+        ))
+    return jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if cart_store is not None:
+        # Carritos de un flush que no terminó (por ejemplo, si el proceso murió)
+        cart_store.requeue_unflushed()
+    jobs = background_jobs()
+    for job in jobs:
+        job.start()
+    if checkout_queue is not None:
+        await checkout_queue.start()
+    yield
+    if checkout_queue is not None:
+        # Las compras ya encoladas se procesan antes de apagar
+        await checkout_queue.stop()
+    for job in jobs:
+        job.stop()
+    if cart_store is not None:
+        # Persistir lo que quedó pendiente antes de apagar
+        CartService().flush_pending_carts(drain=True)
+
+
 # creo mi instancia de FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 app.include_router(router=product_router)
 app.include_router(router=user_router)
 app.include_router(router=cart_router)
-app.include_router(router=order_router)
\ No newline at end of file
+app.include_router(router=order_router)
@@ -1,45 +1,183 @@
 from fastapi import HTTPException
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from app.repositories.models.cart_models import CartItemModel
+from typing import Dict, List, Optional
+from app.repositories.cart_repository import CartRepository
+from app.repositories.cart_store import CartStore, cart_store
+from app.repositories.database import begin_write_transaction
+from app.repositories.models.cart_models import CartModel, CartItemModel
+from app.repositories.models.product_model import ProductModel
 
 
 class CartItemRepository:
+    """
+    Items de los carritos. Sin almacén (CART_STORE_BACKEND=sql) cada cambio
+    se escribe en SQLite. Con almacén, lecturas y escrituras se resuelven en
+    memoria/Redis (cargando el carrito de SQLite la primera vez) y
+    flush_pending los persiste en lotes; los items aún no persistidos no
+    tienen id.
+    """
+
+    def __init__(self, store: Optional[CartStore] = cart_store):
+        self.cart_repository = CartRepository()
+        self.store = store
 
     def get_cart_items(self, db: Session, cart_id: int):
+        if self.store is not None:
+            return self._store_items(cart_id, self._get_quantities(db, cart_id))
         return db.query(CartItemModel).filter_by(cart_id=cart_id).all()
 
+    def get_cart_items_with_products(self, db: Session, cart_id: int):
+        """Items del carrito con su producto cargado (solo con almacén; sin él se usa CartRepository.get_cart_with_items)"""
+        items = self.get_cart_items(db, cart_id)
+        product_ids = [item.product_id for item in items]
+        products = {
+            product.id: product
+            for product in db.query(ProductModel).filter(ProductModel.id.in_(product_ids))
+        } if product_ids else {}
+        for item in items:
+            item.product = products.get(item.product_id)
+        return items
+
+    def get_cart_totals(self, db: Session, cart: CartModel):
+        """(unidades, monto) del carrito"""
+        if self.store is None:
+            return cart.total_items, cart.total_amount
+        quantities = self._get_quantities(db, cart.id)
+        if not quantities:
+            return 0, 0.0
+        prices = db.execute(
+            select(ProductModel.id, ProductModel.price).where(ProductModel.id.in_(quantities.keys()))
+        ).all()
+        total_items = sum(quantities[product_id] for product_id, _ in prices)
+        total_amount = sum(price * quantities[product_id] for product_id, price in prices)
+        return total_items, total_amount
+
+    def get_item_versions(self, db: Session, cart_id: int):
+        """(product_id, versión del producto) de cada item, sin cargar los productos"""
+        if self.store is not None:
+            # La versión del carrito en SQLite no cambia hasta el flush:
+            # se agrega la cantidad de cada item a la clave
+            quantities = self._get_quantities(db, cart_id)
+            if not quantities:
+                return []
+            versions = db.execute(
+                select(ProductModel.id, ProductModel.version)
+                .where(ProductModel.id.in_(quantities.keys()))
+                .order_by(ProductModel.id)
+            ).all()
+            return [(product_id, version, quantities[product_id]) for product_id, version in versions]
+        return (
+            db.query(CartItemModel.product_id, ProductModel.version)
+            .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+            .filter(CartItemModel.cart_id == cart_id)
+            .order_by(CartItemModel.product_id)
+            .all()
+        )
+
     def get_cart_item(self, db: Session, item_id: int):
         item = db.query(CartItemModel).filter_by(id=item_id).first()
         if not item:
             raise HTTPException(status_code=404, detail="Cart item not found")
         return item
 
-    def add_item_to_cart(self, db: Session, cart_id: int, product_id: int, quantity: int = 1):
-        # Verificar si el item ya existe en el carrito
-        existing_item = db.query(CartItemModel).filter_by(
+    def add_item_to_cart(self, db: Session, cart_id: int, product_id: int, quantity: int = 1, commit: bool = True):
+        """
+        Sumar quantity del producto al carrito. Con commit=False (sin almacén)
+        el upsert queda en la transacción del llamador; con almacén la
+        escritura va al almacén en el momento.
+        """
+        if self.store is not None:
+            self._get_quantities(db, cart_id)
+            new_quantity = self.store.add_quantity(cart_id, product_id, quantity)
+            return CartItemModel(cart_id=cart_id, product_id=product_id, quantity=new_quantity)
+        # Un solo upsert sobre (cart_id, product_id): si el item ya existe se suma la cantidad
+        statement = sqlite_insert(CartItemModel).values(
             cart_id=cart_id,
-            product_id=product_id
-        ).first()
-        
-        if existing_item:
-            # Si existe, sumar la cantidad
-            existing_item.quantity += quantity
+            product_id=product_id,
+            quantity=quantity
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[CartItemModel.cart_id, CartItemModel.product_id],
+            set_={"quantity": CartItemModel.quantity + statement.excluded.quantity}
+        ).returning(CartItemModel)
+        item = db.scalars(statement, execution_options={"populate_existing": True}).one()
+        self.cart_repository.touch_cart(db, cart_id)
+        if commit:
             db.commit()
-            db.refresh(existing_item)
-            return existing_item
-        else:
-            # Si no existe, crear nuevo item
-            new_item = CartItemModel(
-                cart_id=cart_id,
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.add(new_item)
+        return item
+
+    def sync_cart_items(
+        self,
+        db: Session,
+        cart_id: int,
+        current_items: List[CartItemModel],
+        quantities: Dict[int, int],
+        commit: bool = True,
+    ):
+        """
+        Dejar el carrito con exactamente las cantidades de quantities
+        ({product_id: cantidad}) en una sola transacción con un solo commit
+        (con commit=False, en la transacción del llamador).
+        current_items son los items ya cargados del carrito; con almacén solo
+        se aplican las diferencias con ellos.
+        """
+        if self.store is not None:
+            # Solo se escriben los productos que cambiaron: una escritura
+            # concurrente sobre otro producto del carrito no se pisa
+            current = {item.product_id: item.quantity for item in current_items}
+            changes = {
+                product_id: quantities.get(product_id, 0)
+                for product_id in current.keys() | quantities.keys()
+                if quantities.get(product_id, 0) != current.get(product_id, 0)
+            }
+            if changes:
+                self.store.set_quantities(cart_id, changes)
+            return self._store_items(cart_id, self._get_quantities(db, cart_id))
+        items_by_product = {item.product_id: item for item in current_items}
+        changed = False
+        for product_id, item in items_by_product.items():
+            if product_id not in quantities:
+                db.delete(item)
+                changed = True
+            elif item.quantity != quantities[product_id]:
+                item.quantity = quantities[product_id]
+                changed = True
+        for product_id, quantity in quantities.items():
+            if product_id not in items_by_product:
+                db.add(CartItemModel(cart_id=cart_id, product_id=product_id, quantity=quantity))
+                changed = True
+        if changed:
+            # touch_cart hace flush: la lectura de abajo ya ve los cambios
+            self.cart_repository.touch_cart(db, cart_id)
+            if commit:
+                db.commit()
+        return self.get_cart_items(db, cart_id)
+
+    def remove_product_from_cart(self, db: Session, cart_id: int, product_id: int, commit: bool = True):
+        """Eliminar el item de un producto con un DELETE directo; None si no estaba en el carrito"""
+        if self.store is not None:
+            self._get_quantities(db, cart_id)
+            quantity = self.store.remove_product(cart_id, product_id)
+            if quantity is None:
+                return None
+            return CartItemModel(cart_id=cart_id, product_id=product_id, quantity=quantity)
+        # Se devuelven columnas y no la entidad: el objeto ORM de una fila borrada
+        # no se puede recargar después del commit
+        item = db.execute(
+            delete(CartItemModel)
+            .where(CartItemModel.cart_id == cart_id, CartItemModel.product_id == product_id)
+            .returning(CartItemModel.id, CartItemModel.cart_id, CartItemModel.product_id, CartItemModel.quantity)
+        ).one_or_none()
+        if item is None:
+            return None
+        self.cart_repository.touch_cart(db, cart_id)
+        if commit:
             db.commit()
-            db.refresh(new_item)
-            return new_item
+        return item
 
-    def update_cart_item_quantity(self, db: Session, item_id: int, quantity: int):
+    def update_cart_item_quantity(self, db: Session, item_id: int, quantity: int, commit: bool = True):
         db_item = db.query(CartItemModel).filter_by(id=item_id).first()
         if not db_item:
             raise HTTPException(status_code=404, detail="Cart item not found")
@@ -47,23 +185,139 @@ class CartItemRepository:
         if quantity <= 0:
             raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
         
+        if self.store is not None:
+            self._get_quantities(db, db_item.cart_id)
+            self.store.set_quantities(db_item.cart_id, {db_item.product_id: quantity})
+            return CartItemModel(id=db_item.id, cart_id=db_item.cart_id, product_id=db_item.product_id, quantity=quantity)
+        
         db_item.quantity = quantity
-        db.commit()
-        db.refresh(db_item)
+        self.cart_repository.touch_cart(db, db_item.cart_id)
+        if commit:
+            db.commit()
+            db.refresh(db_item)
         return db_item
 
-    def remove_item_from_cart(self, db: Session, item_id: int):
+    def remove_item_from_cart(self, db: Session, item_id: int, commit: bool = True):
         db_item = db.query(CartItemModel).filter_by(id=item_id).first()
         if not db_item:
             raise HTTPException(status_code=404, detail="Cart item not found")
         
+        if self.store is not None:
+            self._get_quantities(db, db_item.cart_id)
+            self.store.remove_product(db_item.cart_id, db_item.product_id)
+            return db_item
+        
         db.delete(db_item)
-        db.commit()
+        self.cart_repository.touch_cart(db, db_item.cart_id)
+        if commit:
+            db.commit()
         return db_item
 
-    def clear_cart(self, db: Session, cart_id: int):
-        items = db.query(CartItemModel).filter_by(cart_id=cart_id).all()
-        for item in items:
-            db.delete(item)
+    def clear_cart(self, db: Session, cart_id: int, commit: bool = True):
+        """
+        Vaciar el carrito con un solo DELETE. Con almacén también se escribe en
+        SQLite de inmediato: vaciar el carrito es parte del checkout y no puede
+        quedar pendiente. Con commit=False el almacén no se toca; el llamador
+        debe llamar a clear_stored_items después de su commit.
+        """
+        db.execute(delete(CartItemModel).where(CartItemModel.cart_id == cart_id))
+        self.cart_repository.touch_cart(db, cart_id)
+        if commit:
+            db.commit()
+            self.clear_stored_items(cart_id)
+        return {"message": f"Cart {cart_id} cleared successfully"}
+
+    def clear_stored_items(self, cart_id: int):
+        """Vaciar el carrito en el almacén (si hay) una vez vaciado en SQLite"""
+        if self.store is not None:
+            self.store.set_items(cart_id, {})
+
+    def flush_pending(self, db: Session, batch_size: int) -> int:
+        """Persistir en SQLite hasta batch_size carritos pendientes del almacén; devuelve cuántos"""
+        if self.store is None:
+            return 0
+        cart_ids = self.store.pop_pending(batch_size)
+        if not cart_ids:
+            return 0
+        try:
+            self.flush_carts(db, cart_ids)
+        except Exception:
+            db.rollback()
+            self.store.mark_pending(cart_ids)
+            raise
+        self.store.mark_flushed(cart_ids)
+        return len(cart_ids)
+
+    def flush_carts(self, db: Session, cart_ids: List[int]):
+        """
+        Escribir en SQLite el contenido actual de los carritos en una sola
+        transacción: un DELETE de los items que ya no están, un upsert de los
+        demás y un UPDATE de versión y totales. Los carritos que ya no existen
+        en SQLite (los borró la purga) no se escriben y se olvidan del almacén.
+        """
+        if self.store is None:
+            return
+        items_by_cart = {}
+        for cart_id in cart_ids:
+            items = self.store.get_items(cart_id)
+            if items is not None:
+                items_by_cart[cart_id] = items
+        if not items_by_cart:
+            return
+        # BEGIN IMMEDIATE antes de comprobar qué carritos existen: la purga no
+        # puede borrar uno entre la consulta y la escritura
+        begin_write_transaction(db)
+        existing = set(db.scalars(select(CartModel.id).where(CartModel.id.in_(items_by_cart.keys()))))
+        deleted = [cart_id for cart_id in items_by_cart if cart_id not in existing]
+        for cart_id in deleted:
+            del items_by_cart[cart_id]
+        if items_by_cart:
+            self._write_carts(db, items_by_cart)
         db.commit()
-        return {"message": f"Cart {cart_id} cleared successfully"}
\ No newline at end of file
+        if deleted:
+            self.store.discard(deleted)
+
+    def _write_carts(self, db: Session, items_by_cart: Dict[int, Dict[int, int]]):
+        rows = [
+            {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+            for cart_id, items in items_by_cart.items()
+            for product_id, quantity in items.items()
+        ]
+        removed = delete(CartItemModel).where(CartItemModel.cart_id.in_(items_by_cart.keys()))
+        if rows:
+            removed = removed.where(
+                tuple_(CartItemModel.cart_id, CartItemModel.product_id).not_in(
+                    [(row["cart_id"], row["product_id"]) for row in rows]
+                )
+            )
+        db.execute(removed)
+        if rows:
+            # Upsert (y no DELETE + INSERT) para conservar los ids de los items existentes
+            statement = sqlite_insert(CartItemModel.__table__)
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[CartItemModel.cart_id, CartItemModel.product_id],
+                    set_={"quantity": statement.excluded.quantity}
+                ),
+                rows
+            )
+        self.cart_repository.touch_carts(db, list(items_by_cart.keys()))
+
+    def _get_quantities(self, db: Session, cart_id: int) -> Dict[int, int]:
+        """{product_id: cantidad} del almacén, cargando el carrito de SQLite si no estaba"""
+        quantities = self.store.get_items(cart_id)
+        if quantities is None:
+            quantities = dict(
+                db.query(CartItemModel.product_id, CartItemModel.quantity).filter_by(cart_id=cart_id).all()
+            )
+            self.store.load_items(cart_id, quantities)
+            quantities = self.store.get_items(cart_id)
+        return quantities
+
+    @staticmethod
+    def _store_items(cart_id: int, quantities: Dict[int, int]) -> List[CartItemModel]:
+        # Objetos transitorios (no se agregan a la sesión)
+        return [
+            CartItemModel(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in sorted(quantities.items())
+        ]
\ No newline at end of file
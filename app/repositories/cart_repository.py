@@ -1,12 +1,21 @@
+from datetime import datetime
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from app.repositories.models.cart_models import CartModel
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Tuple
+from app.repositories.models.cart_models import CartModel, CartItemModel
+from app.repositories.models.product_model import ProductModel
+from app.repositories.pagination import approximate_count, paginate_by_id
 
 
 class CartRepository:
 
-    def get_all_carts(self, db: Session):
-        return db.query(CartModel).all()
+    def get_all_carts(self, db: Session, limit: int = 50, cursor: Optional[str] = None):
+        """Página de carritos ordenada por id. Devuelve (carritos, next_cursor)"""
+        return paginate_by_id(db.query(CartModel), CartModel.id, limit, cursor)
+
+    def count_carts_approximate(self, db: Session) -> int:
+        return approximate_count(db, CartModel.__table__)
 
     def get_cart_by_user_id(self, db: Session, user_id: int):
         cart = db.query(CartModel).filter_by(user_id=user_id).first()
@@ -15,12 +24,92 @@ class CartRepository:
             cart = self.create_cart(db, user_id)
         return cart
 
+    def get_cart_with_items(self, db: Session, user_id: int):
+        """
+        Obtener el carrito del usuario con sus items y los productos de cada
+        item en una sola consulta (JOIN). Crea el carrito si no existe.
+        """
+        cart = (
+            db.query(CartModel)
+            .options(joinedload(CartModel.items).joinedload(CartItemModel.product))
+            .filter_by(user_id=user_id)
+            .first()
+        )
+        if not cart:
+            cart = self.create_cart(db, user_id)
+        return cart
+
     def get_cart(self, db: Session, cart_id: int):
         cart = db.query(CartModel).filter_by(id=cart_id).first()
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
         return cart
 
+    def touch_cart(self, db: Session, cart_id: int):
+        """
+        Marcar el carrito como modificado (sin commit): incrementa su versión y
+        recalcula total_items y total_amount en el mismo UPDATE.
+        """
+        self.touch_carts(db, [cart_id])
+
+    def touch_carts(self, db: Session, cart_ids: List[int]):
+        """touch_cart de varios carritos en una sola sentencia"""
+        # Los cambios pendientes de los items tienen que estar en la base antes de sumar
+        db.flush()
+        db.execute(
+            update(CartModel)
+            .where(CartModel.id.in_(cart_ids))
+            .values(
+                version=CartModel.version + 1,
+                last_modified=datetime.utcnow(),
+                **self._totals_values()
+            )
+        )
+
+    def refresh_totals_for_product(self, db: Session, product_id: int):
+        """Recalcular (sin commit) los totales de todos los carritos que tienen el producto, en una sola sentencia"""
+        affected_carts = select(CartItemModel.cart_id).where(CartItemModel.product_id == product_id)
+        db.execute(
+            update(CartModel)
+            .where(CartModel.id.in_(affected_carts))
+            .values(**self._totals_values())
+        )
+
+    def delete_stale_carts(
+        self, db: Session, cutoff: datetime, limit: int, commit: bool = True
+    ) -> Tuple[List[int], int]:
+        """
+        Borrar hasta limit carritos sin modificar desde cutoff, con sus items,
+        en una transacción corta. Devuelve (ids de carritos borrados, items borrados).
+        """
+        stale = (
+            select(CartModel.id)
+            .where(CartModel.last_modified < cutoff)
+            .order_by(CartModel.last_modified)
+            .limit(limit)
+        )
+        cart_ids = db.scalars(
+            delete(CartModel)
+            .where(CartModel.id.in_(stale))
+            .returning(CartModel.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        items_deleted = 0
+        if cart_ids:
+            items_deleted = db.execute(
+                delete(CartItemModel)
+                .where(CartItemModel.cart_id.in_(cart_ids))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        if commit:
+            db.commit()
+        return cart_ids, items_deleted
+
+    def refresh_all_totals(self, db: Session):
+        """Recalcular los totales de todos los carritos"""
+        db.execute(update(CartModel).values(**self._totals_values()))
+        db.commit()
+
     def create_cart(self, db: Session, user_id: int):
         # Verificar si el usuario ya tiene un carrito
         existing_cart = db.query(CartModel).filter_by(user_id=user_id).first()
@@ -40,4 +129,20 @@ class CartRepository:
         
         db.delete(db_cart)
         db.commit()
-        return db_cart
\ No newline at end of file
+        return db_cart
+
+    def _totals_values(self) -> dict:
+        # Subconsultas correlacionadas con la fila de cart que se actualiza:
+        # SUM(quantity) y SUM(price * quantity) de sus items
+        def items_sum(expression):
+            return (
+                select(func.coalesce(func.sum(expression), 0))
+                .select_from(CartItemModel)
+                .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+                .where(CartItemModel.cart_id == CartModel.id)
+                .scalar_subquery()
+            )
+        return {
+            "total_items": items_sum(CartItemModel.quantity),
+            "total_amount": items_sum(ProductModel.price * CartItemModel.quantity),
+        }
@@ -0,0 +1,382 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from app import config
+
+# Campo del hash de Redis que marca un carrito ya cargado de SQLite
+_LOADED_FIELD = "loaded"
+
+
+class CartStore(ABC):
+    """
+    Almacén en memoria de los items de los carritos ({product_id: cantidad}
+    por carrito). Cada escritura deja el carrito como pendiente y
+    CartItemRepository.flush_pending lo persiste en SQLite en lotes
+    (write-behind). get_items devuelve None si el carrito no está cargado.
+    """
+
+    @abstractmethod
+    def get_items(self, cart_id: int) -> Optional[Dict[int, int]]:
+        ...
+
+    @abstractmethod
+    def load_items(self, cart_id: int, items: Dict[int, int]):
+        """Cargar un carrito leído de SQLite (no queda pendiente)"""
+
+    @abstractmethod
+    def add_quantity(self, cart_id: int, product_id: int, quantity: int) -> int:
+        """Sumar quantity al producto y devolver la cantidad resultante"""
+
+    @abstractmethod
+    def set_items(self, cart_id: int, items: Dict[int, int]):
+        """Reemplazar todo el contenido del carrito (se usa al vaciarlo)"""
+
+    @abstractmethod
+    def set_quantities(self, cart_id: int, quantities: Dict[int, int]):
+        """Fijar la cantidad de cada producto de quantities (0 lo quita) sin tocar los demás"""
+        ...
+
+    @abstractmethod
+    def remove_product(self, cart_id: int, product_id: int) -> Optional[int]:
+        """Quitar el producto y devolver la cantidad que tenía, o None si no estaba"""
+
+    @abstractmethod
+    def pop_pending(self, limit: int) -> List[int]:
+        """Sacar hasta limit carritos de la lista de pendientes de persistir"""
+
+    @abstractmethod
+    def mark_pending(self, cart_ids: Iterable[int]):
+        ...
+
+    @abstractmethod
+    def mark_flushed(self, cart_ids: Iterable[int]):
+        """Avisar que los carritos sacados con pop_pending ya están en SQLite (se pueden desalojar)"""
+
+    @abstractmethod
+    def requeue_unflushed(self) -> int:
+        """
+        Devolver a pendientes los carritos sacados con pop_pending que nunca
+        llegaron a mark_flushed (el proceso murió durante el flush); devuelve cuántos
+        """
+
+    @abstractmethod
+    def pending_count(self) -> int:
+        ...
+
+    @abstractmethod
+    def discard(self, cart_ids: Iterable[int]):
+        """Olvidar carritos (por ejemplo, borrados de SQLite)"""
+
+
+class MemoryCartStore(CartStore):
+    """
+    Carritos en un dict del proceso; lo pendiente se pierde si el proceso
+    muere sin flush. Con max_carts > 0 se desalojan los carritos limpios
+    (ya persistidos) menos usados recientemente; los pendientes o en pleno
+    flush no se desalojan nunca.
+    """
+
+    def __init__(self, max_carts: int = 0):
+        self.max_carts = max_carts
+        # En orden de uso: el primero es el candidato a desalojar
+        self._carts: "OrderedDict[int, Dict[int, int]]" = OrderedDict()
+        # dict como conjunto ordenado: los pendientes se persisten en orden de llegada
+        self._pending: Dict[int, None] = {}
+        # Sacados de pendientes por pop_pending y todavía sin mark_flushed
+        self._flushing: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def get_items(self, cart_id: int) -> Optional[Dict[int, int]]:
+        with self._lock:
+            items = self._carts.get(cart_id)
+            if items is None:
+                return None
+            self._carts.move_to_end(cart_id)
+            return dict(items)
+
+    def load_items(self, cart_id: int, items: Dict[int, int]):
+        with self._lock:
+            if cart_id not in self._carts:
+                self._carts[cart_id] = dict(items)
+                self._evict(keep=cart_id)
+
+    def add_quantity(self, cart_id: int, product_id: int, quantity: int) -> int:
+        with self._lock:
+            items = self._write(cart_id)
+            items[product_id] = items.get(product_id, 0) + quantity
+            return items[product_id]
+
+    def set_items(self, cart_id: int, items: Dict[int, int]):
+        with self._lock:
+            current = self._write(cart_id)
+            current.clear()
+            current.update(items)
+
+    def set_quantities(self, cart_id: int, quantities: Dict[int, int]):
+        with self._lock:
+            items = self._write(cart_id)
+            for product_id, quantity in quantities.items():
+                if quantity > 0:
+                    items[product_id] = quantity
+                else:
+                    items.pop(product_id, None)
+
+    def remove_product(self, cart_id: int, product_id: int) -> Optional[int]:
+        with self._lock:
+            quantity = self._carts.get(cart_id, {}).pop(product_id, None)
+            if quantity is not None:
+                self._carts.move_to_end(cart_id)
+                self._pending[cart_id] = None
+            return quantity
+
+    def pop_pending(self, limit: int) -> List[int]:
+        with self._lock:
+            cart_ids = []
+            for cart_id in self._pending:
+                if len(cart_ids) >= limit:
+                    break
+                cart_ids.append(cart_id)
+            for cart_id in cart_ids:
+                del self._pending[cart_id]
+            self._flushing.update(cart_ids)
+            return cart_ids
+
+    def mark_pending(self, cart_ids: Iterable[int]):
+        with self._lock:
+            for cart_id in cart_ids:
+                self._pending[cart_id] = None
+                self._flushing.discard(cart_id)
+
+    def mark_flushed(self, cart_ids: Iterable[int]):
+        with self._lock:
+            self._flushing.difference_update(cart_ids)
+            self._evict()
+
+    def requeue_unflushed(self) -> int:
+        with self._lock:
+            count = len(self._flushing)
+            for cart_id in self._flushing:
+                self._pending[cart_id] = None
+            self._flushing.clear()
+            return count
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def discard(self, cart_ids: Iterable[int]):
+        with self._lock:
+            for cart_id in cart_ids:
+                self._carts.pop(cart_id, None)
+                self._pending.pop(cart_id, None)
+                self._flushing.discard(cart_id)
+
+    def _write(self, cart_id: int) -> Dict[int, int]:
+        # Items del carrito a modificar (con el lock tomado): queda pendiente y como el más reciente
+        self._pending[cart_id] = None
+        items = self._carts.get(cart_id)
+        if items is None:
+            items = self._carts[cart_id] = {}
+            self._evict()
+        self._carts.move_to_end(cart_id)
+        return items
+
+    def _evict(self, keep: Optional[int] = None):
+        # Se llama con el lock tomado; keep es el carrito recién cargado, que no se desaloja
+        excess = len(self._carts) - self.max_carts
+        if self.max_carts <= 0 or excess <= 0:
+            return
+        evictable = []
+        for cart_id in self._carts:
+            if len(evictable) >= excess:
+                break
+            if cart_id != keep and cart_id not in self._pending and cart_id not in self._flushing:
+                evictable.append(cart_id)
+        for cart_id in evictable:
+            del self._carts[cart_id]
+
+
+class RedisCartStore(CartStore):
+    """
+    Carritos en Redis (7.0 o posterior, o un servidor compatible con su
+    protocolo). client es un cliente con la interfaz de redis-py; se puede
+    inyectar uno local para pruebas. Cada carrito es un hash product_id ->
+    cantidad con un campo "loaded" que indica que ya se cargó de SQLite. El
+    conjunto <prefix>:pending lleva cuáles faltan persistir y
+    <prefix>:processing los que se están persistiendo (pop_pending los mueve
+    con SMOVE y mark_flushed los quita), así que ningún cambio se pierde si
+    la API se reinicia, ni siquiera en medio de un flush: al arrancar,
+    requeue_unflushed los devuelve a pendientes. Con idle_ttl_seconds > 0 los carritos
+    limpios vencen (EXPIRE) tras ese tiempo sin uso; los pendientes no
+    vencen hasta que se persisten.
+    """
+
+    def __init__(self, client, prefix: str = "cart", idle_ttl_seconds: int = 0):
+        self.client = client
+        self.prefix = prefix
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.pending_key = f"{prefix}:pending"
+        self.processing_key = f"{prefix}:processing"
+
+    def _items_key(self, cart_id: int) -> str:
+        return f"{self.prefix}:{cart_id}:items"
+
+    def get_items(self, cart_id: int) -> Optional[Dict[int, int]]:
+        key = self._items_key(cart_id)
+        pipeline = self.client.pipeline()
+        pipeline.hgetall(key)
+        if self.idle_ttl_seconds > 0:
+            # XX: solo se renueva el vencimiento de los carritos que lo tienen (los limpios)
+            pipeline.expire(key, self.idle_ttl_seconds, xx=True)
+        items = pipeline.execute()[0]
+        fields = {_decode(field): int(value) for field, value in items.items()}
+        if fields.pop(_LOADED_FIELD, None) is None:
+            return None
+        return {int(product_id): quantity for product_id, quantity in fields.items()}
+
+    def load_items(self, cart_id: int, items: Dict[int, int]):
+        key = self._items_key(cart_id)
+
+        def load(pipeline):
+            # Con WATCH sobre el carrito: si otra petición lo carga o lo
+            # modifica entre la consulta y el EXEC, se reintenta; si ya estaba
+            # cargado no se pisa
+            if pipeline.hexists(key, _LOADED_FIELD):
+                return
+            pipeline.multi()
+            pipeline.delete(key)
+            pipeline.hset(key, mapping={_LOADED_FIELD: 1, **items})
+            self._expire(pipeline, key)
+
+        self.client.transaction(load, key)
+
+    def add_quantity(self, cart_id: int, product_id: int, quantity: int) -> int:
+        pipeline = self.client.pipeline()
+        pipeline.hincrby(self._items_key(cart_id), product_id, quantity)
+        self._mark_written(pipeline, cart_id)
+        return int(pipeline.execute()[0])
+
+    def set_items(self, cart_id: int, items: Dict[int, int]):
+        key = self._items_key(cart_id)
+        pipeline = self.client.pipeline()
+        pipeline.delete(key)
+        pipeline.hset(key, mapping={_LOADED_FIELD: 1, **items})
+        self._mark_written(pipeline, cart_id)
+        pipeline.execute()
+
+    def set_quantities(self, cart_id: int, quantities: Dict[int, int]):
+        key = self._items_key(cart_id)
+        to_set = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        to_remove = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        pipeline = self.client.pipeline()
+        if to_set:
+            pipeline.hset(key, mapping=to_set)
+        if to_remove:
+            pipeline.hdel(key, *to_remove)
+        self._mark_written(pipeline, cart_id)
+        pipeline.execute()
+
+    def remove_product(self, cart_id: int, product_id: int) -> Optional[int]:
+        pipeline = self.client.pipeline()
+        pipeline.hget(self._items_key(cart_id), product_id)
+        pipeline.hdel(self._items_key(cart_id), product_id)
+        self._mark_written(pipeline, cart_id)
+        quantity = pipeline.execute()[0]
+        return int(quantity) if quantity is not None else None
+
+    def pop_pending(self, limit: int) -> List[int]:
+        candidates = self.client.srandmember(self.pending_key, limit) or []
+        if not candidates:
+            return []
+        # SMOVE es atómico por carrito: si otro proceso ya movió alguno, no se toma
+        pipeline = self.client.pipeline()
+        for cart_id in candidates:
+            pipeline.smove(self.pending_key, self.processing_key, cart_id)
+        moved = pipeline.execute()
+        return [int(cart_id) for cart_id, was_moved in zip(candidates, moved) if was_moved]
+
+    def mark_pending(self, cart_ids: Iterable[int]):
+        cart_ids = list(cart_ids)
+        if cart_ids:
+            pipeline = self.client.pipeline()
+            pipeline.sadd(self.pending_key, *cart_ids)
+            pipeline.srem(self.processing_key, *cart_ids)
+            pipeline.execute()
+
+    def mark_flushed(self, cart_ids: Iterable[int]):
+        cart_ids = list(cart_ids)
+        if not cart_ids:
+            return
+        if self.idle_ttl_seconds <= 0:
+            self.client.srem(self.processing_key, *cart_ids)
+            return
+        keys = [self._items_key(cart_id) for cart_id in cart_ids]
+
+        def expire_clean(pipeline):
+            # Con WATCH sobre los carritos: si alguno se modifica (y vuelve a
+            # pendientes) mientras tanto, se reintenta
+            pending = pipeline.smismember(self.pending_key, cart_ids)
+            pipeline.multi()
+            pipeline.srem(self.processing_key, *cart_ids)
+            for key, is_pending in zip(keys, pending):
+                if not is_pending:
+                    pipeline.expire(key, self.idle_ttl_seconds)
+
+        self.client.transaction(expire_clean, *keys)
+
+    def requeue_unflushed(self) -> int:
+        # Con varios procesos sobre el mismo Redis también se devuelven los
+        # flushes en curso de los otros: el carrito se persiste dos veces, sin efecto
+        pipeline = self.client.pipeline()
+        pipeline.scard(self.processing_key)
+        pipeline.sunionstore(self.pending_key, self.pending_key, self.processing_key)
+        pipeline.delete(self.processing_key)
+        return int(pipeline.execute()[0])
+
+    def pending_count(self) -> int:
+        return int(self.client.scard(self.pending_key))
+
+    def discard(self, cart_ids: Iterable[int]):
+        cart_ids = list(cart_ids)
+        if not cart_ids:
+            return
+        pipeline = self.client.pipeline()
+        pipeline.delete(*[self._items_key(cart_id) for cart_id in cart_ids])
+        pipeline.srem(self.pending_key, *cart_ids)
+        pipeline.srem(self.processing_key, *cart_ids)
+        pipeline.execute()
+
+    def _mark_written(self, pipeline, cart_id: int):
+        # Un carrito pendiente no vence hasta que mark_flushed lo deja limpio
+        pipeline.sadd(self.pending_key, cart_id)
+        pipeline.persist(self._items_key(cart_id))
+
+    def _expire(self, pipeline, key: str):
+        if self.idle_ttl_seconds > 0:
+            pipeline.expire(key, self.idle_ttl_seconds)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def create_cart_store(backend: str, redis_client=None) -> Optional[CartStore]:
+    """Crear el almacén según CART_STORE_BACKEND; con "sql" no hay almacén y se escribe directo en SQLite"""
+    if backend == "sql":
+        return None
+    if backend == "memory":
+        return MemoryCartStore(max_carts=config.CART_STORE_MAX_CARTS)
+    if backend == "redis":
+        if redis_client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CART_STORE_BACKEND=redis requires the redis package")
+            redis_client = redis.Redis.from_url(config.CART_STORE_REDIS_URL)
+        return RedisCartStore(redis_client, idle_ttl_seconds=config.CART_STORE_IDLE_TTL_SECONDS)
+    raise ValueError(f"Unknown cart store backend: {backend}")
+
+
+cart_store = create_cart_store(config.CART_STORE_BACKEND)
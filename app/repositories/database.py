@@ -18,6 +18,17 @@ Base = declarative_base()
 
 
 
+def begin_write_transaction(db):
+    """
+    Abrir la transacción de SQLite con BEGIN IMMEDIATE si todavía no hay una.
+    pysqlite solo emite BEGIN antes de un INSERT/UPDATE/DELETE: un SAVEPOINT
+    fuera de una transacción abre la suya y su RELEASE hace COMMIT (y fsync).
+    """
+    connection = db.connection()
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
 def get_db():
     db = SessionLocal()
     try:
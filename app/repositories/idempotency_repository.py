@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.repositories.models.idempotency_model import IdempotencyKeyModel
+
+
+class IdempotencyRepository:
+
+    def get_key(self, db: Session, key: str) -> Optional[IdempotencyKeyModel]:
+        return db.get(IdempotencyKeyModel, key)
+
+    def reserve_key(self, db: Session, key: str, fingerprint: str) -> bool:
+        """
+        Registrar la clave como "en curso" (INSERT ... ON CONFLICT DO NOTHING).
+        Devuelve False si ya existía: otra petición la reservó primero.
+        """
+        result = db.execute(
+            sqlite_insert(IdempotencyKeyModel)
+            .values(key=key, fingerprint=fingerprint, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=[IdempotencyKeyModel.key])
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def take_over_key(self, db: Session, key: str, fingerprint: str, stale_before: datetime) -> bool:
+        """
+        Volver a reservar una clave que quedó en curso desde antes de
+        stale_before (su petición murió sin completarla ni liberarla).
+        Un solo UPDATE condicional: si dos peticiones la retoman a la vez, gana una.
+        """
+        result = db.execute(
+            update(IdempotencyKeyModel)
+            .where(
+                IdempotencyKeyModel.key == key,
+                IdempotencyKeyModel.status_code.is_(None),
+                IdempotencyKeyModel.created_at < stale_before,
+            )
+            .values(fingerprint=fingerprint, created_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def complete_key(self, db: Session, key: str, status_code: int, response: str):
+        """Guardar la respuesta de la petición original"""
+        db.execute(
+            update(IdempotencyKeyModel)
+            .where(IdempotencyKeyModel.key == key)
+            .values(status_code=status_code, response=response)
+        )
+        db.commit()
+
+    def delete_key(self, db: Session, key: str):
+        db.execute(delete(IdempotencyKeyModel).where(IdempotencyKeyModel.key == key))
+        db.commit()
+
+    def delete_expired(self, db: Session, cutoff: datetime, limit: int) -> int:
+        """Borrar hasta limit claves creadas antes de cutoff, en una transacción corta"""
+        expired = (
+            select(IdempotencyKeyModel.key)
+            .where(IdempotencyKeyModel.created_at < cutoff)
+            .order_by(IdempotencyKeyModel.created_at)
+            .limit(limit)
+        )
+        deleted = db.execute(
+            delete(IdempotencyKeyModel)
+            .where(IdempotencyKeyModel.key.in_(expired))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return deleted
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+from app.repositories.database import Base
+from app.repositories.cart_repository import CartRepository
+from app.repositories.order_repository import OrderRepository
+from app.repositories.product_search_repository import ProductSearchRepository
+from app.repositories.product_facet_repository import ProductFacetRepository
+
+
+def _add_missing_columns(engine: Engine):
+    """
+    Agregar con ALTER TABLE las columnas nuevas de los modelos.
+    Las columnas NOT NULL necesitan server_default para poder agregarse.
+    Devuelve los pares (tabla, columna) agregados.
+    """
+    added = set()
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    connection.execute(text(
+                        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}"
+                    ))
+                    added.add((table.name, column.name))
+    return added
+
+
+def _merge_duplicate_cart_items(engine: Engine):
+    """
+    Unificar los items repetidos de un mismo producto en un carrito (sumando
+    las cantidades) antes de crear el índice único (cart_id, product_id).
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("cart_item"):
+        return
+    if "ux_cart_item_cart_product" in {index["name"] for index in inspector.get_indexes("cart_item")}:
+        return
+    with engine.begin() as connection:
+        connection.execute(text(
+            "UPDATE cart_item SET quantity = ("
+            "SELECT SUM(duplicate.quantity) FROM cart_item AS duplicate "
+            "WHERE duplicate.cart_id = cart_item.cart_id AND duplicate.product_id = cart_item.product_id) "
+            "WHERE id IN (SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_id HAVING COUNT(*) > 1)"
+        ))
+        connection.execute(text(
+            "DELETE FROM cart_item WHERE id NOT IN "
+            "(SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_id)"
+        ))
+
+
+def _create_missing_indexes(engine: Engine):
+    """Crear los índices declarados en los modelos que falten en tablas existentes"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+
+
+def run_migrations(engine: Engine):
+    """
+    Actualizar una base de datos existente al esquema actual de los modelos.
+    create_all solo crea tablas nuevas, así que aquí se agregan los cambios
+    sobre tablas que ya existían.
+    """
+    added_columns = _add_missing_columns(engine)
+    _merge_duplicate_cart_items(engine)
+    _create_missing_indexes(engine)
+    if {("cart", "total_items"), ("cart", "total_amount")} & added_columns:
+        # Los carritos existentes quedaron con totales en 0
+        with Session(engine) as db:
+            CartRepository().refresh_all_totals(db)
+    if ("cart", "last_modified") in added_columns:
+        # Sin fecha real, los carritos existentes cuentan como modificados ahora
+        with engine.begin() as connection:
+            cart = Base.metadata.tables["cart"]
+            connection.execute(update(cart).values(last_modified=datetime.utcnow()))
+    if {("order", "items_count"), ("order", "total_quantity")} & added_columns:
+        # Las órdenes existentes quedaron con el resumen en 0
+        with Session(engine) as db:
+            OrderRepository().backfill_summaries(db)
+    ProductSearchRepository().create_index(engine)
+    ProductFacetRepository().ensure_populated(engine)
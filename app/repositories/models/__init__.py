@@ -1,13 +1,18 @@
 from .user_model import UserModel
 from .cart_models import CartModel, CartItemModel
-from .product_model import ProductModel
+from .product_model import ProductModel, ProductCategoryStatsModel
 from .order_models import OrderModel, OrderItemModel
+from .idempotency_model import IdempotencyKeyModel
+from .stock_reservation_model import StockReservationModel
 
 __all__ = [
     "UserModel",
     "CartModel", 
     "CartItemModel",
     "ProductModel",
+    "ProductCategoryStatsModel",
     "OrderModel",
-    "OrderItemModel"
+    "OrderItemModel",
+    "IdempotencyKeyModel",
+    "StockReservationModel"
 ]
\ No newline at end of file
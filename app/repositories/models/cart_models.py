@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.repositories.database import Base
 
@@ -8,6 +9,13 @@ class CartModel(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False, unique=True)
+    # Se incrementa cuando cambian los items; se usa para el ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Totales desnormalizados, los recalcula CartRepository.touch_cart en cada cambio de items
+    total_items = Column(Integer, nullable=False, default=0, server_default="0")
+    total_amount = Column(Float, nullable=False, default=0.0, server_default="0")
+    # Última modificación de los items (touch_cart); la usa la purga de carritos abandonados
+    last_modified = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relaciones
     user = relationship("UserModel", back_populates="cart", uselist=False)  # 1:1
@@ -22,6 +30,13 @@ class CartItemModel(Base):
     product_id = Column(Integer, ForeignKey("product.id"), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
     
+    # Un producto aparece una sola vez por carrito; permite el upsert de add_item_to_cart
+    __table_args__ = (
+        Index("ux_cart_item_cart_product", "cart_id", "product_id", unique=True),
+        # Para encontrar los carritos afectados por un cambio de precio
+        Index("ix_cart_item_product_id", "product_id"),
+    )
+    
     # Relaciones
     cart = relationship("CartModel", back_populates="items")
     product = relationship("ProductModel")
\ No newline at end of file
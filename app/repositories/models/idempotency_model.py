@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from app.repositories.database import Base
+
+
+class IdempotencyKeyModel(Base):
+    """Respuesta guardada de una petición con Idempotency-Key"""
+    __tablename__ = "idempotency_key"
+
+    key = Column(String, primary_key=True)
+    # Hash de método, ruta y parámetros de la petición original
+    fingerprint = Column(String, nullable=False)
+    # NULL mientras la petición original está en curso
+    status_code = Column(Integer)
+    response = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.repositories.database import Base
@@ -11,11 +11,25 @@ class OrderModel(Base):
     user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     total = Column(Float, nullable=False)
     date = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Se incrementa en cada modificación; se usa para el ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Resumen de los items, escrito al crear la orden (los items no cambian después)
+    items_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_quantity = Column(Integer, nullable=False, default=0, server_default="0")
+    # "completed" o "cancelled": las órdenes canceladas no se borran
+    status = Column(String, nullable=False, default="completed", server_default="completed")
     
     # Relaciones
     user = relationship("UserModel", back_populates="orders")  # N:1
     items = relationship("OrderItemModel", back_populates="order", cascade="all, delete-orphan")  # 1:N
 
+    # Historial paginado de la más nueva a la más vieja sobre (date, id),
+    # por usuario y global: cada página es un rango de índice acotado
+    __table_args__ = (
+        Index("ix_order_user_date_id", "user_id", "date", "id"),
+        Index("ix_order_date_id", "date", "id"),
+    )
+
 
 class OrderItemModel(Base):
     __tablename__ = "order_item"
@@ -28,4 +42,9 @@ class OrderItemModel(Base):
     
     # Relaciones
     order = relationship("OrderModel", back_populates="items")
-    product = relationship("ProductModel")
\ No newline at end of file
+    product = relationship("ProductModel")
+
+    # Para cargar los items de varias órdenes con un solo IN (selectinload)
+    __table_args__ = (
+        Index("ix_order_item_order_id", "order_id"),
+    )
\ No newline at end of file
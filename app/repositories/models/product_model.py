@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index
 from app.repositories.database import Base
 
 class ProductModel(Base):
@@ -10,4 +10,25 @@ class ProductModel(Base):
     description = Column(String)
     category = Column(String)
     stock = Column(Integer)
-    image = Column(String)
\ No newline at end of file
+    image = Column(String)
+    # Se incrementa en cada escritura; se usa para el ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Índices compuestos para la paginación por cursor (orden + filtros)
+    __table_args__ = (
+        Index("ix_product_name_id", "name", "id"),
+        Index("ix_product_price_id", "price", "id"),
+        Index("ix_product_category_id", "category", "id"),
+        Index("ix_product_category_price_id", "category", "price", "id"),
+    )
+
+
+class ProductCategoryStatsModel(Base):
+    """Agregados por categoría, mantenidos por ProductRepository en cada escritura"""
+    __tablename__ = "product_category_stats"
+
+    category = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    in_stock_count = Column(Integer, nullable=False, default=0)
+    min_price = Column(Float)
+    max_price = Column(Float)
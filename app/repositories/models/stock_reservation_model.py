@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from app.repositories.database import Base
+
+
+class StockReservationModel(Base):
+    """
+    Stock apartado para una línea de carrito hasta expires_at. Mientras existe,
+    la cantidad ya está descontada de product.stock.
+    """
+    __tablename__ = "stock_reservation"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cart_id = Column(Integer, ForeignKey("cart.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("product.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ux_stock_reservation_cart_product", "cart_id", "product_id", unique=True),
+        # Para que el barrido de vencidas lea solo las que le tocan
+        Index("ix_stock_reservation_expires_at", "expires_at"),
+    )
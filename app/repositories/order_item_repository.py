@@ -1,4 +1,5 @@
 from fastapi import HTTPException
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 from typing import List, Dict
 from app.repositories.models.order_models import OrderItemModel
@@ -9,6 +10,15 @@ class OrderItemRepository:
     def get_order_items(self, db: Session, order_id: int):
         return db.query(OrderItemModel).filter_by(order_id=order_id).all()
 
+    def get_order_quantities(self, db: Session, order_id: int) -> Dict[int, int]:
+        """Unidades de la orden por producto ({product_id: cantidad}), sin cargar los items"""
+        rows = db.execute(
+            select(OrderItemModel.product_id, func.sum(OrderItemModel.quantity))
+            .where(OrderItemModel.order_id == order_id)
+            .group_by(OrderItemModel.product_id)
+        )
+        return {product_id: quantity for product_id, quantity in rows}
+
     def get_order_item(self, db: Session, item_id: int):
         item = db.query(OrderItemModel).filter_by(id=item_id).first()
         if not item:
@@ -53,6 +63,24 @@ class OrderItemRepository:
             db.refresh(item)
         return order_items
 
+    def insert_order_items(self, db: Session, order_items_data: List[Dict]) -> List[OrderItemModel]:
+        """
+        Insertar varios order items con un solo INSERT ... RETURNING, sin commit
+        (para usar dentro de una transacción más grande).
+        order_items_data: Lista de diccionarios con keys: order_id, product_id, quantity, price
+        """
+        for item_data in order_items_data:
+            if item_data['quantity'] <= 0:
+                raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
+            if item_data['price'] <= 0:
+                raise HTTPException(status_code=400, detail="Price must be greater than 0")
+        if not order_items_data:
+            return []
+        return db.scalars(
+            insert(OrderItemModel).returning(OrderItemModel, sort_by_parameter_order=True),
+            order_items_data
+        ).all()
+
     def update_order_item(self, db: Session, item_id: int, quantity: int, price: float):
         db_item = db.query(OrderItemModel).filter_by(id=item_id).first()
         if not db_item:
@@ -1,12 +1,65 @@
+from datetime import datetime
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from app.repositories.models.order_models import OrderModel
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Tuple
+from app.repositories.models.order_models import OrderModel, OrderItemModel
+from app.repositories.pagination import encode_cursor, decode_cursor
+from app.repositories.projection import model_columns
 
 
 class OrderRepository:
 
-    def get_orders(self, db: Session):
-        return db.query(OrderModel).all()
+    def get_orders(
+        self,
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        user_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        fields: Optional[List[str]] = None,
+        include_items: bool = False,
+    ):
+        """
+        Listar órdenes de la más nueva a la más vieja, paginando por cursor
+        (keyset) sobre (date, id). date_from incluida, date_to excluida.
+        Con fields se leen solo esas columnas (más las de orden) y se devuelven dicts.
+        Con include_items los items de toda la página se cargan con una sola
+        consulta más (selectinload).
+        Devuelve (órdenes, next_cursor); next_cursor es None en la última página.
+        """
+        if fields is not None:
+            names = list(dict.fromkeys([*fields, "date", "id"]))
+            query = db.query(*model_columns(OrderModel, names))
+        else:
+            query = db.query(OrderModel)
+            if include_items:
+                query = query.options(selectinload(OrderModel.items))
+        if user_id is not None:
+            query = query.filter(OrderModel.user_id == user_id)
+        if date_from is not None:
+            query = query.filter(OrderModel.date >= date_from)
+        if date_to is not None:
+            query = query.filter(OrderModel.date < date_to)
+
+        last_values = decode_cursor(cursor, 2)
+        if last_values is not None:
+            try:
+                last_date, last_id = datetime.fromisoformat(last_values[0]), int(last_values[1])
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.filter(tuple_(OrderModel.date, OrderModel.id) < (last_date, last_id))
+
+        orders = query.order_by(OrderModel.date.desc(), OrderModel.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor([orders[-1].date.isoformat(), orders[-1].id])
+        if fields is not None:
+            orders = [dict(row._mapping) for row in orders]
+        return orders, next_cursor
 
     def get_order(self, db: Session, order_id: int):
         order = db.query(OrderModel).filter_by(id=order_id).first()
@@ -14,22 +67,105 @@ class OrderRepository:
             raise HTTPException(status_code=404, detail="Order not found")
         return order
 
-    def get_orders_by_user(self, db: Session, user_id: int):
-        return db.query(OrderModel).filter_by(user_id=user_id).all()
+    def get_order_version(self, db: Session, order_id: int) -> int:
+        """Leer solo la versión de la orden (para el ETag)"""
+        version = db.query(OrderModel.version).filter(OrderModel.id == order_id).scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return version
+
+    def get_orders_by_user(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        include_items: bool = False,
+    ):
+        """Historial de órdenes del usuario (ver get_orders). Devuelve (órdenes, next_cursor)"""
+        return self.get_orders(
+            db, limit=limit, cursor=cursor, user_id=user_id, date_from=date_from, date_to=date_to,
+            include_items=include_items
+        )
+
+    def get_orders_by_ids(self, db: Session, order_ids: List[int]) -> Tuple[List[OrderModel], List[int]]:
+        """
+        Obtener varias órdenes con sus items en dos consultas (las órdenes con
+        un IN y todos sus items con otro, vía selectinload).
+        Devuelve (órdenes en el orden pedido, ids que no existen).
+        """
+        unique_ids = list(dict.fromkeys(order_ids))
+        found = {
+            order.id: order
+            for order in db.query(OrderModel)
+            .options(selectinload(OrderModel.items))
+            .filter(OrderModel.id.in_(unique_ids))
+        }
+        orders = [found[order_id] for order_id in unique_ids if order_id in found]
+        missing = [order_id for order_id in unique_ids if order_id not in found]
+        return orders, missing
 
-    def create_order(self, db: Session, user_id: int, total: float):
+    def create_order(
+        self,
+        db: Session,
+        user_id: int,
+        total: float,
+        commit: bool = True,
+        items_count: int = 0,
+        total_quantity: int = 0,
+    ):
+        """
+        Crear la orden. items_count (productos distintos) y total_quantity
+        (unidades) son el resumen de los items que el llamador va a insertar.
+        """
         if total <= 0:
             raise HTTPException(status_code=400, detail="Order total must be greater than 0")
         
         new_order = OrderModel(
             user_id=user_id,
-            total=total
+            total=total,
+            items_count=items_count,
+            total_quantity=total_quantity
         )
         db.add(new_order)
+        if not commit:
+            # Sin commit se hace flush para tener el id (y los defaults) de la orden
+            db.flush()
+            return new_order
         db.commit()
         db.refresh(new_order)
         return new_order
 
+    def mark_cancelled(self, db: Session, order_id: int) -> Optional[OrderModel]:
+        """
+        Marcar la orden como cancelada (sin commit) con un UPDATE condicional.
+        Devuelve None si no existe o ya estaba cancelada, así una orden no se
+        cancela (ni devuelve stock) dos veces.
+        """
+        return db.scalars(
+            update(OrderModel)
+            .where(OrderModel.id == order_id, OrderModel.status != "cancelled")
+            .values(status="cancelled", version=OrderModel.version + 1)
+            .returning(OrderModel),
+            execution_options={"populate_existing": True}
+        ).one_or_none()
+
+    def backfill_summaries(self, db: Session):
+        """Calcular items_count y total_quantity de todas las órdenes a partir de sus items"""
+        def items_aggregate(expression):
+            return (
+                select(expression)
+                .where(OrderItemModel.order_id == OrderModel.id)
+                .scalar_subquery()
+            )
+        db.execute(update(OrderModel).values(
+            items_count=items_aggregate(func.count(OrderItemModel.id)),
+            total_quantity=items_aggregate(func.coalesce(func.sum(OrderItemModel.quantity), 0)),
+        ))
+        db.commit()
+
     def update_order_total(self, db: Session, order_id: int, total: float):
         db_order = db.query(OrderModel).filter_by(id=order_id).first()
         if not db_order:
@@ -39,6 +175,7 @@ class OrderRepository:
             raise HTTPException(status_code=400, detail="Order total must be greater than 0")
         
         db_order.total = total
+        db_order.version = OrderModel.version + 1
         db.commit()
         db.refresh(db_order)
         return db_order
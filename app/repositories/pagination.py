@@ -0,0 +1,72 @@
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Column, Table, func, select, text
+from sqlalchemy.orm import Query, Session
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Codificar los valores de la última fila de una página como cursor opaco"""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """Decodificar un cursor generado por encode_cursor (None si no hay cursor)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def paginate_by_id(query: Query, id_column: Column, limit: int, cursor: Optional[str]) -> Tuple[List[Any], Optional[str]]:
+    """
+    Página de query ordenada por id (keyset: id > último id de la página anterior).
+    Devuelve (filas, next_cursor); next_cursor es None en la última página.
+    """
+    last_values = decode_cursor(cursor, 1)
+    if last_values is not None:
+        query = query.filter(id_column > last_values[0])
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], id_column.key)])
+    return rows, next_cursor
+
+
+def approximate_count(db: Session, table: Table) -> int:
+    """
+    Cantidad aproximada de filas sin recorrer la tabla con COUNT(*): la
+    estadística de ANALYZE (sqlite_stat1) si existe, o si no MAX(id), que se
+    resuelve con la clave primaria (sobrestima si hubo borrados). La
+    estadística es la del último ANALYZE (ver refresh_statistics); como los
+    ids no se repiten, se acota con MAX(id) para que no siga contando las
+    filas borradas desde entonces.
+    """
+    max_id = db.execute(select(func.max(table.c.id))).scalar() or 0
+    has_stats = db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+    ).first()
+    if has_stats:
+        # El primer número de stat es la cantidad de filas de la tabla
+        stat = db.execute(
+            text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"), {"table": table.name}
+        ).scalar()
+        if stat:
+            return min(int(stat.split()[0]), max_id)
+    return max_id
+
+
+def refresh_statistics(db: Session) -> None:
+    """Recalcular sqlite_stat1 (planificador y approximate_count) con ANALYZE"""
+    db.execute(text("ANALYZE"))
+    db.commit()
@@ -0,0 +1,151 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.repositories.models.product_model import ProductModel, ProductCategoryStatsModel
+
+stats = ProductCategoryStatsModel.__table__
+products = ProductModel.__table__
+
+# (category, price, stock) de un producto
+ProductFacetValues = Tuple[Optional[str], Optional[float], Optional[int]]
+
+
+class ProductFacetRepository:
+    """
+    Mantiene product_category_stats (cantidad de productos, cantidad con stock
+    y rango de precios por categoría) de forma incremental. Se llama dentro de
+    la transacción de cada escritura de productos, antes del commit.
+    Los productos sin categoría no se cuentan.
+    """
+
+    def add_products(self, db: Session, rows: Iterable[ProductFacetValues]):
+        """Sumar productos nuevos (un upsert por categoría)"""
+        totals: Dict[str, Dict] = {}
+        for category, price, stock in rows:
+            if category is None:
+                continue
+            entry = totals.setdefault(category, {
+                "category": category, "product_count": 0, "in_stock_count": 0,
+                "min_price": None, "max_price": None,
+            })
+            entry["product_count"] += 1
+            entry["in_stock_count"] += 1 if (stock or 0) > 0 else 0
+            if price is not None:
+                entry["min_price"] = price if entry["min_price"] is None else min(entry["min_price"], price)
+                entry["max_price"] = price if entry["max_price"] is None else max(entry["max_price"], price)
+        if not totals:
+            return
+
+        statement = sqlite_insert(stats)
+        excluded = statement.excluded
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[stats.c.category],
+                set_={
+                    "product_count": stats.c.product_count + excluded.product_count,
+                    "in_stock_count": stats.c.in_stock_count + excluded.in_stock_count,
+                    # min()/max() de SQLite con NULL devuelven NULL, de ahí los coalesce
+                    "min_price": func.min(
+                        func.coalesce(stats.c.min_price, excluded.min_price),
+                        func.coalesce(excluded.min_price, stats.c.min_price),
+                    ),
+                    "max_price": func.max(
+                        func.coalesce(stats.c.max_price, excluded.max_price),
+                        func.coalesce(excluded.max_price, stats.c.max_price),
+                    ),
+                },
+            ),
+            list(totals.values()),
+        )
+
+    def remove_product(self, db: Session, values: ProductFacetValues):
+        """Restar un producto ya eliminado (el DELETE debe estar flusheado)"""
+        category, _, stock = values
+        if category is None:
+            return
+        db.execute(
+            update(stats)
+            .where(stats.c.category == category)
+            .values(
+                product_count=stats.c.product_count - 1,
+                in_stock_count=stats.c.in_stock_count - (1 if (stock or 0) > 0 else 0),
+            )
+        )
+        db.execute(delete(stats).where(stats.c.category == category, stats.c.product_count <= 0))
+        self._refresh_price_range(db, category)
+
+    def change_product(self, db: Session, old: ProductFacetValues, new: ProductFacetValues):
+        """Reflejar la actualización de un producto (el UPDATE debe estar flusheado)"""
+        if old == new:
+            return
+        if old[0] != new[0]:
+            self.remove_product(db, old)
+            self.add_products(db, [new])
+            return
+        category = new[0]
+        if category is None:
+            return
+        in_stock_delta = (1 if (new[2] or 0) > 0 else 0) - (1 if (old[2] or 0) > 0 else 0)
+        if in_stock_delta:
+            self.adjust_in_stock(db, {category: in_stock_delta})
+        if old[1] != new[1]:
+            self._refresh_price_range(db, category)
+
+    def adjust_in_stock(self, db: Session, deltas: Dict[str, int]):
+        """Aplicar cambios en la cantidad de productos con stock por categoría"""
+        deltas = {category: delta for category, delta in deltas.items() if category is not None and delta}
+        if not deltas:
+            return
+        db.execute(
+            update(stats)
+            .where(stats.c.category.in_(deltas.keys()))
+            .values(in_stock_count=stats.c.in_stock_count + case(deltas, value=stats.c.category))
+        )
+
+    def get_facets(self, db: Session) -> List:
+        return db.execute(select(stats).order_by(stats.c.category)).all()
+
+    def rebuild(self, db: Session, commit: bool = True):
+        """Recalcular todos los agregados desde la tabla product"""
+        db.execute(delete(stats))
+        db.execute(
+            insert(stats).from_select(
+                ["category", "product_count", "in_stock_count", "min_price", "max_price"],
+                select(
+                    products.c.category,
+                    func.count(),
+                    func.sum(case((products.c.stock > 0, 1), else_=0)),
+                    func.min(products.c.price),
+                    func.max(products.c.price),
+                )
+                .where(products.c.category.is_not(None))
+                .group_by(products.c.category),
+            )
+        )
+        if commit:
+            db.commit()
+
+    def ensure_populated(self, engine: Engine):
+        """Calcular los agregados si la tabla está vacía pero ya hay productos"""
+        with Session(engine) as db:
+            has_stats = db.execute(select(stats.c.category).limit(1)).first()
+            has_products = db.execute(
+                select(products.c.id).where(products.c.category.is_not(None)).limit(1)
+            ).first()
+            if has_products and not has_stats:
+                self.rebuild(db)
+
+    def _refresh_price_range(self, db: Session, category: str):
+        # Dos subconsultas separadas para que cada MIN/MAX se resuelva con un
+        # solo salto en el índice (category, price, id)
+        min_price = select(func.min(products.c.price)).where(products.c.category == category).scalar_subquery()
+        max_price = select(func.max(products.c.price)).where(products.c.category == category).scalar_subquery()
+        db.execute(
+            update(stats)
+            .where(stats.c.category == category)
+            .values(min_price=min_price, max_price=max_price)
+        )
@@ -1,13 +1,115 @@
 from fastapi import HTTPException
+from sqlalchemy import case, insert, select, tuple_, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from typing import Dict, List, Optional, Tuple
 
 
+from app.repositories.cart_repository import CartRepository
 from app.repositories.models.product_model import ProductModel
+from app.repositories.pagination import encode_cursor, decode_cursor
+from app.repositories.projection import model_columns
+from app.repositories.product_search_repository import ProductSearchRepository
+from app.repositories.product_facet_repository import ProductFacetRepository
+
+# Máximo de ids por sentencia IN (límite de variables de SQLite)
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Claves de orden admitidas para el listado ("-" adelante = descendente)
+PRODUCT_SORT_COLUMNS = {
+    "id": ProductModel.id,
+    "price": ProductModel.price,
+    "name": ProductModel.name,
+}
 
 class ProductRepository:
 
-    def get_products(self, db: Session):
-        return db.query(ProductModel).all()
+    def __init__(self):
+        self.search_repository = ProductSearchRepository()
+        self.facet_repository = ProductFacetRepository()
+        self.cart_repository = CartRepository()
+
+    def get_products(
+        self,
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "id",
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False,
+        fields: Optional[List[str]] = None,
+    ):
+        """
+        Listar productos paginando por cursor (keyset) sobre (clave de orden, id).
+        Con fields solo se leen esas columnas (más las de orden) y se devuelven
+        filas en lugar de modelos.
+        Devuelve (productos, next_cursor); next_cursor es None en la última página.
+        """
+        descending = sort.startswith("-")
+        sort_column = PRODUCT_SORT_COLUMNS.get(sort.lstrip("-"))
+        if sort_column is None:
+            raise HTTPException(status_code=400, detail=f"Invalid sort: {sort}")
+
+        if fields is not None:
+            names = list(dict.fromkeys([*fields, sort_column.key, "id"]))
+            query = db.query(*model_columns(ProductModel, names))
+        else:
+            query = db.query(ProductModel)
+        if category is not None:
+            query = query.filter(ProductModel.category == category)
+        if min_price is not None:
+            query = query.filter(ProductModel.price >= min_price)
+        if max_price is not None:
+            query = query.filter(ProductModel.price <= max_price)
+        if in_stock:
+            query = query.filter(ProductModel.stock > 0)
+
+        # El id desempata cuando la clave de orden se repite
+        key_columns = [sort_column] if sort_column is ProductModel.id else [sort_column, ProductModel.id]
+        last_values = decode_cursor(cursor, len(key_columns))
+        if last_values is not None:
+            key = tuple_(*key_columns)
+            query = query.filter(key < tuple(last_values) if descending else key > tuple(last_values))
+
+        query = query.order_by(*[column.desc() if descending else column.asc() for column in key_columns])
+        products = query.limit(limit + 1).all()
+
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = encode_cursor([getattr(last, column.key) for column in key_columns])
+        return products, next_cursor
+
+    def search_products(self, db: Session, query: str, limit: int = 20, cursor: Optional[str] = None):
+        """
+        Buscar productos por texto en name, description y category.
+        Devuelve (productos, next_cursor) ordenados por relevancia, paginando
+        por cursor (keyset) sobre (rank, id).
+        """
+        last_values = decode_cursor(cursor, 2)
+        if last_values is not None:
+            rank, product_id = last_values
+            if not isinstance(rank, (int, float)) or not isinstance(product_id, int):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            last_values = (float(rank), product_id)
+
+        rows = self.search_repository.search(db, query, limit + 1, after=last_values)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last, rank = rows[-1]
+            next_cursor = encode_cursor([rank, last.id])
+        return [product for product, _ in rows], next_cursor
+
+    def get_product_version(self, db: Session, product_id: int) -> int:
+        """Leer solo la versión del producto (para el ETag)"""
+        version = db.query(ProductModel.version).filter(ProductModel.id == product_id).scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return version
 
     def get_product(self, db: Session, product_id: int):
         product = db.query(ProductModel).filter_by(id=product_id).first()
@@ -15,6 +117,21 @@ class ProductRepository:
             raise HTTPException(status_code=404, detail="Product not found")
         return product
 
+    def get_products_by_ids(self, db: Session, product_ids: List[int]) -> Tuple[List[ProductModel], List[int]]:
+        """
+        Obtener varios productos con una consulta IN (por bloques si son muchos).
+        Devuelve (productos en el orden pedido, ids que no existen).
+        """
+        unique_ids = list(dict.fromkeys(product_ids))
+        found = {}
+        for start in range(0, len(unique_ids), IN_CLAUSE_CHUNK_SIZE):
+            chunk = unique_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+            for product in db.query(ProductModel).filter(ProductModel.id.in_(chunk)):
+                found[product.id] = product
+        products = [found[product_id] for product_id in unique_ids if product_id in found]
+        missing = [product_id for product_id in unique_ids if product_id not in found]
+        return products, missing
+
     def create_product(self, db: Session, product: ProductModel):
         new_product = ProductModel(
         name=product.name,
@@ -25,14 +142,54 @@ class ProductRepository:
         image=product.image
         )
         db.add(new_product)
+        db.flush()
+        self.search_repository.index_product(db, new_product)
+        self.facet_repository.add_products(db, [self._facet_values(new_product)])
         db.commit()
         db.refresh(new_product)
         return new_product
 
+    def bulk_create_products(self, db: Session, rows: List[Dict]) -> List[int]:
+        """
+        Insertar un lote de productos en una sola transacción (un commit por lote).
+        rows: dicts con name, description, price, category, stock, image.
+        Devuelve los ids creados en el mismo orden que rows.
+        """
+        if not rows:
+            return []
+        product_ids = db.execute(
+            insert(ProductModel).returning(ProductModel.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        self.search_repository.index_products(db, [
+            {
+                "id": product_id,
+                "name": row["name"],
+                "description": row["description"],
+                "category": row["category"],
+            }
+            for product_id, row in zip(product_ids, rows)
+        ])
+        self.facet_repository.add_products(
+            db, [(row["category"], row["price"], row["stock"]) for row in rows]
+        )
+        db.commit()
+        return product_ids
+
     def update_product(self, db: Session, product_id: int, product: ProductModel):
         db_product = db.query(ProductModel).filter_by(id=product_id).first()
         if not db_product:
             raise HTTPException(status_code=404, detail="Product not found")
+        # Solo se reindexa si cambió alguno de los campos de texto indexados
+        reindex = (db_product.name, db_product.description, db_product.category) != (
+            product.name, product.description, product.category
+        )
+        if reindex:
+            self.search_repository.remove_product(
+                db, db_product.id, db_product.name, db_product.description, db_product.category
+            )
+        old_facet_values = self._facet_values(db_product)
+        price_changed = db_product.price != product.price
         if db_product:
             db_product.name = product.name
             db_product.description = product.description
@@ -40,6 +197,14 @@ class ProductRepository:
             db_product.category = product.category
             db_product.stock = product.stock
             db_product.image = product.image
+            db_product.version = ProductModel.version + 1
+        db.flush()
+        if reindex:
+            self.search_repository.index_product(db, db_product)
+        self.facet_repository.change_product(db, old_facet_values, self._facet_values(db_product))
+        if price_changed:
+            # Los carritos guardan el monto total: recalcular los que tienen el producto
+            self.cart_repository.refresh_totals_for_product(db, product_id)
         db.commit()
         db.refresh(db_product)
         return db_product
@@ -47,6 +212,138 @@ class ProductRepository:
     def delete_product(self, db: Session, product_id: int):
         db_product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
         if db_product:
+            self.search_repository.remove_product(
+                db, db_product.id, db_product.name, db_product.description, db_product.category
+            )
             db.delete(db_product)
+            db.flush()
+            self.facet_repository.remove_product(db, self._facet_values(db_product))
+            self.cart_repository.refresh_totals_for_product(db, product_id)
             db.commit()
-        return db_product
\ No newline at end of file
+        return db_product
+
+
+    def decrement_stock(self, db: Session, product_id: int, quantity: int, commit: bool = True) -> int:
+        """
+        Descontar stock de forma atómica:
+        UPDATE product SET stock = stock - :q WHERE id = :id AND stock >= :q
+        Devuelve el stock resultante.
+        """
+        return self.decrement_stock_bulk(db, {product_id: quantity}, commit=commit)[product_id]
+
+    def decrement_stock_bulk(self, db: Session, quantities: Dict[int, int], commit: bool = True) -> Dict[int, int]:
+        """
+        Descontar stock de varios productos en una sola sentencia.
+        quantities: {product_id: cantidad}. Es todo o nada: si algún producto no
+        existe o no tiene stock suficiente se lanza la excepción (y, con
+        commit=True, se hace rollback).
+        Devuelve {product_id: stock resultante}.
+        """
+        self._validate_quantities(quantities)
+        delta = case(quantities, value=ProductModel.id)
+        rows = db.execute(
+            update(ProductModel)
+            .where(ProductModel.id.in_(quantities.keys()), ProductModel.stock >= delta)
+            .values(stock=ProductModel.stock - delta, version=ProductModel.version + 1)
+            .returning(ProductModel.id, ProductModel.stock, ProductModel.category)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        self._expire_stock(db, [row.id for row in rows])
+
+        if len(rows) != len(quantities):
+            # Con commit=False el rollback lo hace el llamador (puede ser solo
+            # hasta un SAVEPOINT, sin perder el resto de su transacción)
+            if commit:
+                db.rollback()
+            self._raise_stock_error(db, quantities, {row.id for row in rows})
+
+        # Los productos que quedaron en 0 dejan de contar como "con stock"
+        in_stock_deltas = {}
+        for row in rows:
+            if row.stock <= 0:
+                in_stock_deltas[row.category] = in_stock_deltas.get(row.category, 0) - 1
+        self.facet_repository.adjust_in_stock(db, in_stock_deltas)
+
+        if commit:
+            db.commit()
+        return {row.id: row.stock for row in rows}
+
+    def increment_stock_bulk(self, db: Session, quantities: Dict[int, int], commit: bool = True) -> Dict[int, int]:
+        """
+        Devolver stock a varios productos en una sola sentencia
+        (UPDATE ... SET stock = stock + CASE id ... END).
+        Los productos que ya no existen se ignoran.
+        Devuelve {product_id: stock resultante}.
+        """
+        self._validate_quantities(quantities)
+        delta = case(quantities, value=ProductModel.id)
+        rows = db.execute(
+            update(ProductModel)
+            .where(ProductModel.id.in_(quantities.keys()))
+            .values(stock=ProductModel.stock + delta, version=ProductModel.version + 1)
+            .returning(ProductModel.id, ProductModel.stock, ProductModel.category)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        self._expire_stock(db, [row.id for row in rows])
+
+        # Los productos que estaban en 0 vuelven a contar como "con stock"
+        in_stock_deltas = {}
+        for row in rows:
+            if row.stock - quantities[row.id] <= 0 < row.stock:
+                in_stock_deltas[row.category] = in_stock_deltas.get(row.category, 0) + 1
+        self.facet_repository.adjust_in_stock(db, in_stock_deltas)
+        if commit:
+            db.commit()
+        return {row.id: row.stock for row in rows}
+
+    def _facet_values(self, product: ProductModel):
+        return (product.category, product.price, product.stock)
+
+    def _expire_stock(self, db: Session, product_ids: List[int]):
+        """
+        Expirar stock y version de los productos ya cargados en la sesión tras
+        un UPDATE masivo. Se hace a mano en lugar de synchronize_session="fetch":
+        con la caché de sentencias fría, dos hilos compilando a la vez el mismo
+        UPDATE ... RETURNING con "fetch" pueden leer las columnas devueltas en
+        otro orden (row.stock con el valor de category).
+        """
+        for product_id in product_ids:
+            product = db.identity_map.get(identity_key(ProductModel, product_id))
+            if product is not None:
+                db.expire(product, ["stock", "version"])
+
+    def _validate_quantities(self, quantities: Dict[int, int]):
+        if not quantities:
+            raise HTTPException(status_code=400, detail="No products to update")
+        if any(quantity <= 0 for quantity in quantities.values()):
+            raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
+
+    def _raise_stock_error(self, db: Session, quantities: Dict[int, int], updated_ids: set):
+        failed_ids = [product_id for product_id in quantities if product_id not in updated_ids]
+        products = {
+            row.id: row
+            for row in db.execute(
+                select(ProductModel.id, ProductModel.name, ProductModel.stock)
+                .where(ProductModel.id.in_(failed_ids))
+            )
+        }
+        missing = [product_id for product_id in failed_ids if product_id not in products]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Products not found: {missing}")
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Some items have insufficient stock",
+                "issues": [
+                    {
+                        "product_id": product_id,
+                        "product_name": products[product_id].name,
+                        "requested": quantities[product_id],
+                        "available": products[product_id].stock
+                    }
+                    for product_id in failed_ids
+                ]
+            }
+        )
\ No newline at end of file
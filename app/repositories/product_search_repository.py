@@ -0,0 +1,113 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.repositories.models.product_model import ProductModel
+
+# Pesos BM25 por columna: name, description, category
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0)
+
+
+class ProductSearchRepository:
+    """
+    Índice de texto completo de productos sobre una tabla virtual FTS5.
+    La tabla usa la tabla product como contenido externo, así que solo guarda
+    el índice invertido; ProductRepository la mantiene sincronizada en la
+    misma transacción que cada escritura.
+    """
+
+    def create_index(self, engine: Engine):
+        """Crear la tabla virtual si no existe e indexar los productos existentes"""
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'")
+            ).first()
+            if exists:
+                return
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE product_fts USING fts5("
+                "name, description, category, "
+                "content='product', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            connection.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+
+    def index_product(self, db: Session, product: ProductModel):
+        db.execute(
+            text(
+                "INSERT INTO product_fts(rowid, name, description, category) "
+                "VALUES (:id, :name, :description, :category)"
+            ),
+            {
+                "id": product.id,
+                "name": product.name,
+                "description": product.description,
+                "category": product.category,
+            },
+        )
+
+    def index_products(self, db: Session, rows: List[dict]):
+        """Indexar varios productos en un solo executemany (dicts con id, name, description, category)"""
+        if rows:
+            db.execute(
+                text(
+                    "INSERT INTO product_fts(rowid, name, description, category) "
+                    "VALUES (:id, :name, :description, :category)"
+                ),
+                rows,
+            )
+
+    def remove_product(self, db: Session, product_id: int, name: str, description: str, category: str):
+        # Con contenido externo, FTS5 necesita los valores indexados para borrarlos
+        db.execute(
+            text(
+                "INSERT INTO product_fts(product_fts, rowid, name, description, category) "
+                "VALUES ('delete', :id, :name, :description, :category)"
+            ),
+            {"id": product_id, "name": name, "description": description, "category": category},
+        )
+
+    def search(
+        self, db: Session, query: str, limit: int, after: Optional[Tuple[float, int]] = None
+    ) -> List[Tuple[ProductModel, float]]:
+        """
+        Buscar productos ordenados por relevancia BM25 (y por id entre iguales).
+        Devuelve [(producto, rank)]; after es el (rank, id) de la última fila de
+        la página anterior (keyset: solo se leen las filas que siguen).
+        """
+        match = self.build_match_expression(query)
+        if not match:
+            return []
+        rank = f"bm25(product_fts, {', '.join(str(weight) for weight in SEARCH_WEIGHTS)})"
+        params = {"match": match, "limit": limit}
+        keyset = ""
+        if after is not None:
+            keyset = f"AND ({rank}, product.id) > (:after_rank, :after_id) "
+            params.update(after_rank=after[0], after_id=after[1])
+        statement = text(
+            f"SELECT product.*, {rank} AS search_rank FROM product_fts "
+            "JOIN product ON product.id = product_fts.rowid "
+            "WHERE product_fts MATCH :match "
+            f"{keyset}"
+            "ORDER BY search_rank, product.id "
+            "LIMIT :limit"
+        )
+        rows = db.execute(
+            select(ProductModel, column("search_rank", Float)).from_statement(statement), params
+        ).all()
+        return [(product, rank) for product, rank in rows]
+
+    def rebuild(self, db: Session):
+        """Reconstruir el índice completo a partir de la tabla product"""
+        db.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+        db.commit()
+
+    @staticmethod
+    def build_match_expression(query: str) -> str:
+        # Cada palabra se busca como prefijo; las comillas evitan que el texto
+        # del usuario se interprete como sintaxis de FTS5
+        terms = re.findall(r"\w+", query)
+        return " ".join(f'"{term}"*' for term in terms)
@@ -0,0 +1,24 @@
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+
+
+def parse_fields(model, fields: Optional[str], required: Iterable[str] = ("id",)) -> Optional[List[str]]:
+    """
+    Convertir un parámetro fields=name,price en la lista de columnas a leer.
+    Las columnas de required se incluyen siempre. Devuelve None si no se
+    pidió proyección (se leen todas las columnas).
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    columns = model.__table__.columns
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys([*required, *names]))
+
+
+def model_columns(model, names: List[str]):
+    """Atributos mapeados del modelo para usar en db.query(*columnas)"""
+    return [getattr(model, name) for name in names]
@@ -0,0 +1,98 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.repositories.models.stock_reservation_model import StockReservationModel
+
+
+class StockReservationRepository:
+    """
+    Reservas de stock por línea de carrito. Ningún método hace commit: el
+    stock de los productos se ajusta en la misma transacción (ver
+    StockReservationService).
+    """
+
+    def get_cart_reservations(self, db: Session, cart_id: int) -> Dict[int, int]:
+        """Cantidades reservadas del carrito: {product_id: cantidad}"""
+        rows = db.execute(
+            select(StockReservationModel.product_id, StockReservationModel.quantity)
+            .where(StockReservationModel.cart_id == cart_id)
+        )
+        return {row.product_id: row.quantity for row in rows}
+
+    def set_cart_reservations(self, db: Session, cart_id: int, quantities: Dict[int, int], expires_at: datetime):
+        """
+        Dejar las reservas de esos productos con las cantidades indicadas (0
+        borra la reserva) y extender el vencimiento de todas las del carrito
+        """
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        rows = [
+            {"cart_id": cart_id, "product_id": product_id, "quantity": quantity, "expires_at": expires_at}
+            for product_id, quantity in quantities.items() if quantity > 0
+        ]
+        if removed:
+            db.execute(
+                delete(StockReservationModel)
+                .where(StockReservationModel.cart_id == cart_id, StockReservationModel.product_id.in_(removed))
+                .execution_options(synchronize_session=False)
+            )
+        if rows:
+            statement = sqlite_insert(StockReservationModel.__table__)
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[StockReservationModel.cart_id, StockReservationModel.product_id],
+                    set_={"quantity": statement.excluded.quantity, "expires_at": statement.excluded.expires_at}
+                ),
+                rows
+            )
+        db.execute(
+            update(StockReservationModel)
+            .where(StockReservationModel.cart_id == cart_id)
+            .values(expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+
+    def pop_cart_reservations(self, db: Session, cart_id: int) -> Dict[int, int]:
+        """Borrar las reservas del carrito con un DELETE ... RETURNING y devolver {product_id: cantidad}"""
+        rows = db.execute(
+            delete(StockReservationModel)
+            .where(StockReservationModel.cart_id == cart_id)
+            .returning(StockReservationModel.product_id, StockReservationModel.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        return {row.product_id: row.quantity for row in rows}
+
+    def pop_carts_reservations(self, db: Session, cart_ids: List[int]) -> Dict[int, int]:
+        """pop_cart_reservations de varios carritos con un solo DELETE; devuelve las cantidades sumadas por producto"""
+        rows = db.execute(
+            delete(StockReservationModel)
+            .where(StockReservationModel.cart_id.in_(cart_ids))
+            .returning(StockReservationModel.product_id, StockReservationModel.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        quantities = {}
+        for row in rows:
+            quantities[row.product_id] = quantities.get(row.product_id, 0) + row.quantity
+        return quantities
+
+    def pop_expired(self, db: Session, now: datetime, limit: int) -> List[Tuple[int, int]]:
+        """
+        Borrar hasta limit reservas vencidas con un DELETE ... RETURNING.
+        Devuelve [(product_id, cantidad)] para devolver ese stock.
+        """
+        expired = (
+            select(StockReservationModel.id)
+            .where(StockReservationModel.expires_at < now)
+            .order_by(StockReservationModel.expires_at)
+            .limit(limit)
+        )
+        rows = db.execute(
+            delete(StockReservationModel)
+            .where(StockReservationModel.id.in_(expired))
+            .returning(StockReservationModel.product_id, StockReservationModel.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        return [(row.product_id, row.quantity) for row in rows]
@@ -1,12 +1,27 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
+from typing import List, Optional
 from app.repositories.models.user_model import UserModel
+from app.repositories.pagination import approximate_count, paginate_by_id
+from app.repositories.projection import model_columns
 
 
 class UserRepository:
 
-    def get_users(self, db: Session):
-        return db.query(UserModel).all()
+    def get_users(self, db: Session, limit: int = 50, cursor: Optional[str] = None, fields: Optional[List[str]] = None):
+        """
+        Página de usuarios ordenada por id. Devuelve (usuarios, next_cursor).
+        Con fields se leen solo esas columnas y se devuelven dicts.
+        """
+        if fields is not None:
+            rows, next_cursor = paginate_by_id(
+                db.query(*model_columns(UserModel, fields)), UserModel.id, limit, cursor
+            )
+            return [dict(row._mapping) for row in rows], next_cursor
+        return paginate_by_id(db.query(UserModel), UserModel.id, limit, cursor)
+
+    def count_users_approximate(self, db: Session) -> int:
+        return approximate_count(db, UserModel.__table__)
 
     def get_user(self, db: Session, user_id: int):
         user = db.query(UserModel).filter_by(id=user_id).first()
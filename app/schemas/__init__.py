@@ -1,6 +1,6 @@
-from app.schemas.product_schema import Product,ProductCreate,ProductUpdate
-from app.schemas.user_schema import User,UserCreate,UserUpdate
+from app.schemas.product_schema import Product,ProductCreate,ProductUpdate,ProductPage,ProductBatch,ProductFacet,ProductFacets
+from app.schemas.user_schema import User,UserCreate,UserUpdate,UserPage
 from app.schemas.order_schema import Order,OrderCreate,OrderUpdate
 from app.schemas.order_item_schema import OrderItem,OrderItemCreate,OrderItemUpdate,OrderItemBulkCreate,OrderItemWithProduct
-from app.schemas.cart_schema import Cart,CartCreate,CartWithItems
-from app.schemas.cart_item_schema import CartItem,CartItemCreate,CartItemUpdate,AddToCart,CartItemWithProduct
\ No newline at end of file
+from app.schemas.cart_schema import Cart,CartCreate,CartWithItems,CartSummary,CartPage
+from app.schemas.cart_item_schema import CartItem,CartItemCreate,CartItemUpdate,AddToCart,CartItemWithProduct,CartItemOperation,CartBatchUpdate
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
 
 
 class CartItemCreate(BaseModel):
@@ -17,8 +17,20 @@ class AddToCart(BaseModel):
     quantity: int = Field(default=1, gt=0, description="Quantity must be greater than 0")
 
 
+class CartItemOperation(BaseModel):
+    # add suma quantity (por defecto 1), set fija la cantidad, remove quita el producto
+    op: Literal["add", "set", "remove"]
+    product_id: int
+    quantity: Optional[int] = Field(None, gt=0, description="Quantity must be greater than 0")
+
+
+class CartBatchUpdate(BaseModel):
+    operations: List[CartItemOperation] = Field(min_length=1)
+
+
 class CartItem(BaseModel):
-    id: int
+    # None mientras el item solo existe en el almacén de carritos (antes del flush a SQLite)
+    id: Optional[int] = None
     cart_id: int
     product_id: int
     quantity: int
@@ -9,11 +9,27 @@ class CartCreate(BaseModel):
 class Cart(BaseModel):
     id: int
     user_id: int
+    total_items: int = 0
+    total_amount: float = 0.0
 
     class Config:
         from_attributes = True
 
 
+class CartPage(BaseModel):
+    items: List[Cart] = []
+    next_cursor: Optional[str] = None
+    # Aproximado: ver approximate_count
+    approximate_total: int = 0
+
+
+class CartSummary(BaseModel):
+    cart_id: int
+    user_id: int
+    total_items: int
+    total_amount: float
+
+
 class CartWithItems(BaseModel):
     id: int
     user_id: int
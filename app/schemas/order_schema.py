@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 
 class OrderCreate(BaseModel):
@@ -17,6 +17,7 @@ class Order(BaseModel):
     user_id: int
     total: float
     date: datetime
+    status: str = "completed"
 
     class Config:
         from_attributes = True
@@ -27,16 +28,30 @@ class OrderWithItems(BaseModel):
     user_id: int
     total: float
     date: datetime
+    status: str = "completed"
     items: List['OrderItem'] = []
 
     class Config:
         from_attributes = True
 
 
+class OrderPage(BaseModel):
+    # Con include_items, órdenes con sus items; dicts parciales cuando el listado se pide con fields=
+    items: List[Union[Order, 'OrderWithItems', Dict[str, Any]]] = []
+    next_cursor: Optional[str] = None
+
+
+class OrderBatch(BaseModel):
+    items: List['OrderWithItems'] = []
+    missing_ids: List[int] = []
+
+
 class CreateOrderFromCart(BaseModel):
     user_id: int
 
 
 # Importar después para evitar circular imports
 from .order_item_schema import OrderItem
-OrderWithItems.model_rebuild()
\ No newline at end of file
+OrderWithItems.model_rebuild()
+OrderPage.model_rebuild()
+OrderBatch.model_rebuild()
\ No newline at end of file
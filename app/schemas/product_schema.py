@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 
 
 class ProductCreate(BaseModel):
@@ -28,6 +28,37 @@ class Product(BaseModel):
     category: str
     stock: int
     image: str
+    version: int = 1
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class ProductPage(BaseModel):
+    # Dicts parciales cuando el listado se pide con fields=
+    items: List[Union[Product, Dict[str, Any]]] = []
+    next_cursor: Optional[str] = None
+
+
+class ProductBatch(BaseModel):
+    items: List[Product] = []
+    missing_ids: List[int] = []
+
+
+class ProductFacet(BaseModel):
+    category: str
+    product_count: int
+    in_stock_count: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ProductFacets(BaseModel):
+    categories: List[ProductFacet] = []
+    product_count: int = 0
+    in_stock_count: int = 0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
\ No newline at end of file
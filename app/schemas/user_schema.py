@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 
 
 class UserCreate(BaseModel):
@@ -19,4 +19,12 @@ class User(BaseModel):
     email: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class UserPage(BaseModel):
+    # Dicts parciales cuando el listado se pide con fields=
+    items: List[Union[User, Dict[str, Any]]] = []
+    next_cursor: Optional[str] = None
+    # Aproximado: ver approximate_count
+    approximate_total: int = 0
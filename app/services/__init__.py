@@ -1,3 +1,9 @@
 from app.services.product_service import ProductService
+from app.services.product_import_service import ProductImportService
 from app.services.user_service import UserService
-from app.services.cart_service import CartService
\ No newline at end of file
+from app.services.cart_service import CartService
+from app.services.export_service import ExportService
+from app.services.cart_compaction_service import CartCompactionService
+from app.services.checkout_service import CheckoutService
+from app.services.idempotency_service import IdempotencyService
+from app.services.stock_reservation_service import StockReservationService
\ No newline at end of file
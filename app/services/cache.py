@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Caché en memoria acotada, con desalojo LRU y expiración por TTL.
+    Es segura entre hilos (los endpoints síncronos corren en un threadpool).
+    Con max_entries=0 queda desactivada: toda lectura es un miss.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Se incrementa en cada invalidación; ver load_token()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Devolver el valor cacheado o None si no está o expiró"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def load_token(self) -> int:
+        """
+        Tomar antes de leer de la base de datos y pasarlo a set(): si hubo una
+        invalidación mientras tanto, el valor leído puede estar viejo y no se guarda.
+        """
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, token: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """Guardar el valor; ttl_seconds reemplaza el TTL de la caché para esta entrada"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if token is not None and token != self._generation:
+                return
+            ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
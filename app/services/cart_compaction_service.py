@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app import config
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.cart_repository import CartRepository
+from app.repositories.database import SessionLocal
+from app.services.stock_reservation_service import StockReservationService
+
+# Métricas acumuladas desde que arrancó el proceso
+_metrics_lock = threading.Lock()
+_metrics = {
+    "runs": 0,
+    "carts_deleted": 0,
+    "items_deleted": 0,
+    "units_restored": 0,
+    "batches": 0,
+    "last_run": None,
+}
+
+
+class CartCompactionService:
+    """
+    Purga de carritos abandonados: borra los carritos sin modificar hace más
+    de max_age_days, con sus items, en lotes de batch_size con un commit por
+    lote para no retener el lock de escritura de SQLite. Las reservas de
+    stock de los carritos borrados se liberan en el mismo lote. Un carrito
+    borrado se vuelve a crear vacío la próxima vez que se pide.
+    """
+
+    def __init__(self):
+        self.cart_repository = CartRepository()
+        self.cart_item_repository = CartItemRepository()
+        self.stock_reservation_service = StockReservationService()
+
+    def compact(
+        self,
+        db: Session,
+        max_age_days: float = config.CART_COMPACTION_MAX_AGE_DAYS,
+        batch_size: int = config.CART_COMPACTION_BATCH_SIZE,
+    ) -> Dict:
+        """Purgar carritos abandonados y devolver el reporte de la ejecución"""
+        if batch_size <= 0:
+            raise HTTPException(status_code=400, detail="Batch size must be greater than 0")
+
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+        report = {"cutoff": cutoff, "carts_deleted": 0, "items_deleted": 0, "units_restored": 0, "batches": 0}
+        while True:
+            try:
+                cart_ids, items_deleted = self.cart_repository.delete_stale_carts(
+                    db, cutoff, batch_size, commit=False
+                )
+                units_restored = 0
+                if cart_ids:
+                    units_restored = self.stock_reservation_service.release_carts(db, cart_ids, commit=False)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            if not cart_ids:
+                break
+            if self.cart_item_repository.store is not None:
+                self.cart_item_repository.store.discard(cart_ids)
+            report["batches"] += 1
+            report["carts_deleted"] += len(cart_ids)
+            report["items_deleted"] += items_deleted
+            report["units_restored"] += units_restored
+            if len(cart_ids) < batch_size:
+                break
+        report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+
+        with _metrics_lock:
+            _metrics["runs"] += 1
+            _metrics["carts_deleted"] += report["carts_deleted"]
+            _metrics["items_deleted"] += report["items_deleted"]
+            _metrics["units_restored"] += report["units_restored"]
+            _metrics["batches"] += report["batches"]
+            _metrics["last_run"] = report
+        return report
+
+    def run(self) -> Dict:
+        """Ejecutar la purga con su propia sesión (la usa el job en segundo plano)"""
+        db = SessionLocal()
+        try:
+            return self.compact(db)
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        """Métricas acumuladas de la purga"""
+        with _metrics_lock:
+            return dict(_metrics)
@@ -1,12 +1,16 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from typing import List
+from typing import Dict, List, Optional
 
+from app import config
+from app.repositories.database import SessionLocal
 from app.repositories.cart_repository import CartRepository
 from app.repositories.cart_item_repository import CartItemRepository
 from app.repositories.product_repository import ProductRepository
-from app.schemas.cart_schema import Cart, CartWithItems
-from app.schemas.cart_item_schema import CartItem, CartItemWithProduct, AddToCart, CartItemUpdate
+from app.services.product_service import ProductService
+from app.services.stock_reservation_service import StockReservationService
+from app.schemas.cart_schema import Cart, CartWithItems, CartPage
+from app.schemas.cart_item_schema import CartItem, CartItemWithProduct, AddToCart, CartItemUpdate, CartItemOperation
 
 
 class CartService:
@@ -14,18 +18,17 @@ class CartService:
         self.cart_repository = CartRepository()
         self.cart_item_repository = CartItemRepository()
         self.product_repository = ProductRepository()
+        self.product_service = ProductService()
+        self.stock_reservation_service = StockReservationService()
 
-    def get_all_carts(self, db: Session) -> List[Cart]:
-        """Obtener todos los carritos"""
-        # Nota: Necesitarás agregar este método al CartRepository también
-        try:
-            carts = self.cart_repository.get_all_carts(db)
-            return [Cart.from_orm(cart) for cart in carts]
-        except Exception:
-            raise HTTPException(
-                status_code=500,
-                detail="Error retrieving carts"
-            )
+    def get_all_carts(self, db: Session, limit: int = 50, cursor: Optional[str] = None) -> CartPage:
+        """Obtener una página de carritos"""
+        carts, next_cursor = self.cart_repository.get_all_carts(db, limit=limit, cursor=cursor)
+        return CartPage(
+            items=[Cart.from_orm(cart) for cart in carts],
+            next_cursor=next_cursor,
+            approximate_total=self.cart_repository.count_carts_approximate(db)
+        )
 
     def get_user_cart(self, db: Session, user_id: int) -> CartWithItems:
         """Obtener carrito del usuario con todos sus items"""
@@ -44,17 +47,26 @@ class CartService:
         )
 
     def get_cart_with_product_details(self, db: Session, user_id: int) -> dict:
-        """Obtener carrito con detalles completos de productos"""
-        cart = self.cart_repository.get_cart_by_user_id(db, user_id)
-        cart_items = self.cart_item_repository.get_cart_items(db, cart.id)
+        """
+        Obtener carrito con detalles completos de productos.
+        Carrito, items y productos se leen con una sola consulta
+        (con almacén de carritos, los items vienen del almacén).
+        """
+        if self.cart_item_repository.store is None:
+            cart = self.cart_repository.get_cart_with_items(db, user_id)
+            items = cart.items
+        else:
+            cart = self.cart_repository.get_cart_by_user_id(db, user_id)
+            items = self.cart_item_repository.get_cart_items_with_products(db, cart.id)
         
         items_with_products = []
         total_amount = 0.0
         total_items = 0
         
-        for item in cart_items:
-            # Obtener detalles del producto
-            product = self.product_repository.get_product(db, item.product_id)
+        for item in items:
+            product = item.product
+            if product is None:
+                raise HTTPException(status_code=404, detail="Product not found")
             
             item_total = product.price * item.quantity
             total_amount += item_total
@@ -77,8 +89,10 @@ class CartService:
                 "item_total": item_total
             })
         
+        # Los totales del carrito salen de los items leídos (con almacén, los
+        # guardados en SQLite pueden estar atrasados hasta el próximo flush)
         return {
-            "cart": Cart.from_orm(cart),
+            "cart": Cart(id=cart.id, user_id=cart.user_id, total_items=total_items, total_amount=total_amount),
             "items": items_with_products,
             "summary": {
                 "total_items": total_items,
@@ -86,10 +100,20 @@ class CartService:
             }
         }
 
+    def get_cart_version(self, db: Session, user_id: int) -> tuple:
+        """
+        Clave de versión del detalle del carrito: versión del carrito más la de
+        cada producto (el detalle incluye precio y stock). No carga los productos.
+        """
+        cart = self.cart_repository.get_cart_by_user_id(db, user_id)
+        item_versions = self.cart_item_repository.get_item_versions(db, cart.id)
+        return (cart.id, cart.version, *[tuple(row) for row in item_versions])
+
     def add_item_to_cart(self, db: Session, user_id: int, item_data: AddToCart) -> CartItem:
         """Agregar item al carrito del usuario"""
         # Verificar que el producto existe y hay stock disponible
-        product = self.product_repository.get_product(db, item_data.product_id)
+        # (el checkout vuelve a validar contra la base de datos)
+        product = self.product_service.get_product(db, item_data.product_id)
         
         if product.stock < item_data.quantity:
             raise HTTPException(
@@ -100,10 +124,19 @@ class CartService:
         # Obtener o crear carrito
         cart = self.cart_repository.get_cart_by_user_id(db, user_id)
         
-        # Agregar item al carrito
-        cart_item = self.cart_item_repository.add_item_to_cart(
-            db, cart.id, item_data.product_id, item_data.quantity
-        )
+        # Con reservas, apartar el stock agregado (falla si otro carrito lo tomó)
+        # y agregar el item con un solo commit: si falla uno no queda el otro
+        try:
+            self.stock_reservation_service.hold(
+                db, cart.id, item_data.product_id, item_data.quantity, commit=False
+            )
+            cart_item = self.cart_item_repository.add_item_to_cart(
+                db, cart.id, item_data.product_id, item_data.quantity, commit=False
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
         return CartItem.from_orm(cart_item)
 
@@ -116,18 +149,27 @@ class CartService:
         if item.cart_id != cart.id:
             raise HTTPException(status_code=403, detail="Item does not belong to user's cart")
         
-        # Verificar stock disponible
-        product = self.product_repository.get_product(db, item.product_id)
-        if product.stock < update_data.quantity:
+        # Verificar stock disponible (lo que este carrito ya reservó también cuenta)
+        product = self.product_service.get_product(db, item.product_id)
+        reserved = self.stock_reservation_service.get_reserved(db, cart.id)
+        available = product.stock + reserved.get(item.product_id, 0)
+        if available < update_data.quantity:
             raise HTTPException(
                 status_code=400,
-                detail=f"Insufficient stock. Available: {product.stock}, Requested: {update_data.quantity}"
+                detail=f"Insufficient stock. Available: {available}, Requested: {update_data.quantity}"
             )
-        
-        # Actualizar cantidad
-        updated_item = self.cart_item_repository.update_cart_item_quantity(
-            db, item_id, update_data.quantity
-        )
+        # Reserva y cantidad con un solo commit
+        try:
+            self.stock_reservation_service.reserve(
+                db, cart.id, {item.product_id: update_data.quantity}, reserved=reserved, commit=False
+            )
+            updated_item = self.cart_item_repository.update_cart_item_quantity(
+                db, item_id, update_data.quantity, commit=False
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
         return CartItem.from_orm(updated_item)
 
@@ -140,17 +182,123 @@ class CartService:
         if item.cart_id != cart.id:
             raise HTTPException(status_code=403, detail="Item does not belong to user's cart")
         
-        removed_item = self.cart_item_repository.remove_item_from_cart(db, item_id)
+        # Liberar la reserva y quitar el item con un solo commit
+        try:
+            self.stock_reservation_service.reserve(db, cart.id, {item.product_id: 0}, commit=False)
+            removed_item = self.cart_item_repository.remove_item_from_cart(db, item_id, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        return {
+            "message": "Item removed from cart successfully",
+            "removed_item": CartItem.from_orm(removed_item)
+        }
+
+    def remove_product_from_cart(self, db: Session, cart_id: int, product_id: int) -> dict:
+        """Remover un producto del carrito por su product_id"""
+        # Liberar la reserva y quitar el item con un solo commit
+        try:
+            self.stock_reservation_service.reserve(db, cart_id, {product_id: 0}, commit=False)
+            removed_item = self.cart_item_repository.remove_product_from_cart(db, cart_id, product_id, commit=False)
+            if removed_item is None:
+                # Solo en el caso de error se distingue si falta el carrito o el producto
+                self.cart_repository.get_cart(db, cart_id)
+                raise HTTPException(status_code=404, detail="Product not found in cart")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
         return {
             "message": "Item removed from cart successfully",
             "removed_item": CartItem.from_orm(removed_item)
         }
 
+    def apply_cart_operations(self, db: Session, cart_id: int, operations: List[CartItemOperation]) -> Dict:
+        """
+        Aplicar una lista de operaciones (add, set, remove) sobre el carrito.
+        Los productos se validan contra el stock con una sola consulta y los
+        cambios válidos se guardan en una sola transacción. Las operaciones que
+        fallan no se aplican y se informan en results.
+        """
+        cart = self.cart_repository.get_cart(db, cart_id)
+        current_items = self.cart_item_repository.get_cart_items(db, cart.id)
+        quantities = {item.product_id: item.quantity for item in current_items}
+        original_quantities = dict(quantities)
+        reserved = self.stock_reservation_service.get_reserved(db, cart.id)
+        
+        products, _ = self.product_repository.get_products_by_ids(
+            db, [operation.product_id for operation in operations]
+        )
+        products_by_id = {product.id: product for product in products}
+        
+        results = []
+        for index, operation in enumerate(operations):
+            product_id = operation.product_id
+            error = None
+            if operation.op == "remove":
+                if product_id in quantities:
+                    del quantities[product_id]
+                else:
+                    error = "Product not found in cart"
+            else:
+                product = products_by_id.get(product_id)
+                if operation.op == "add":
+                    new_quantity = quantities.get(product_id, 0) + (operation.quantity or 1)
+                else:
+                    new_quantity = operation.quantity
+                
+                if product is None:
+                    error = "Product not found"
+                elif new_quantity is None:
+                    error = "Quantity is required for set"
+                elif product.stock + reserved.get(product_id, 0) < new_quantity:
+                    available = product.stock + reserved.get(product_id, 0)
+                    error = f"Insufficient stock. Available: {available}, Requested: {new_quantity}"
+                else:
+                    quantities[product_id] = new_quantity
+            
+            results.append({
+                "index": index,
+                "op": operation.op,
+                "product_id": product_id,
+                "status": "error" if error else "applied",
+                "quantity": quantities.get(product_id, 0),
+                "detail": error
+            })
+        
+        # Las reservas se ajustan a las cantidades finales de las líneas que cambiaron
+        changed = {
+            product_id: quantities.get(product_id, 0)
+            for product_id in set(original_quantities) | set(quantities)
+            if quantities.get(product_id, 0) != original_quantities.get(product_id, 0)
+        }
+        try:
+            if changed:
+                self.stock_reservation_service.reserve(db, cart.id, changed, reserved=reserved, commit=False)
+            items = self.cart_item_repository.sync_cart_items(db, cart.id, current_items, quantities, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied = sum(1 for result in results if result["status"] == "applied")
+        
+        return {
+            "cart_id": cart.id,
+            "applied": applied,
+            "failed": len(results) - applied,
+            "results": results,
+            "items": [CartItem.from_orm(item) for item in items]
+        }
+
     def clear_user_cart(self, db: Session, user_id: int) -> dict:
         """Vaciar completamente el carrito del usuario"""
         cart = self.cart_repository.get_cart_by_user_id(db, user_id)
         result = self.cart_item_repository.clear_cart(db, cart.id)
+        if self.stock_reservation_service.enabled:
+            self.stock_reservation_service.release_cart(db, cart.id)
         
         return {
             "message": f"Cart cleared successfully for user {user_id}",
@@ -158,16 +306,39 @@ class CartService:
         }
 
     def get_cart_total(self, db: Session, user_id: int) -> dict:
-        """Calcular total del carrito"""
-        cart_details = self.get_cart_with_product_details(db, user_id)
+        """Obtener total del carrito (totales guardados en la fila del carrito)"""
+        cart = self.cart_repository.get_cart_by_user_id(db, user_id)
+        total_items, total_amount = self.cart_item_repository.get_cart_totals(db, cart)
         
         return {
-            "cart_id": cart_details["cart"].id,
+            "cart_id": cart.id,
             "user_id": user_id,
-            "total_items": cart_details["summary"]["total_items"],
-            "total_amount": cart_details["summary"]["total_amount"]
+            "total_items": total_items,
+            "total_amount": total_amount
         }
 
+    def flush_user_cart(self, db: Session, user_id: int):
+        """Persistir en SQLite el carrito del usuario si está en el almacén (antes del checkout)"""
+        if self.cart_item_repository.store is not None:
+            cart = self.cart_repository.get_cart_by_user_id(db, user_id)
+            self.cart_item_repository.flush_carts(db, [cart.id])
+
+    def flush_pending_carts(self, drain: bool = False) -> int:
+        """
+        Persistir un lote de carritos pendientes del almacén (o todos, con drain).
+        Lo llama el job de write-behind con su propia sesión.
+        """
+        flushed = 0
+        db = SessionLocal()
+        try:
+            while True:
+                count = self.cart_item_repository.flush_pending(db, config.CART_STORE_FLUSH_BATCH_SIZE)
+                flushed += count
+                if not drain or count == 0:
+                    return flushed
+        finally:
+            db.close()
+
     def validate_cart_for_checkout(self, db: Session, user_id: int) -> dict:
         """Validar carrito antes del checkout"""
         cart_details = self.get_cart_with_product_details(db, user_id)
@@ -175,16 +346,19 @@ class CartService:
         if not cart_details["items"]:
             raise HTTPException(status_code=400, detail="Cart is empty")
         
-        # Verificar stock de todos los items
+        # Verificar stock de todos los items (lo que este carrito ya reservó
+        # no está en product.stock pero está disponible para él)
+        reserved = self.stock_reservation_service.get_reserved(db, cart_details["cart"].id)
         issues = []
         for item in cart_details["items"]:
             product = item["product"]
-            if product["stock"] < item["quantity"]:
+            available = product["stock"] + reserved.get(product["id"], 0)
+            if available < item["quantity"]:
                 issues.append({
                     "product_id": product["id"],
                     "product_name": product["name"],
                     "requested": item["quantity"],
-                    "available": product["stock"]
+                    "available": available
                 })
         
         if issues:
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app import config
+from app.repositories.database import SessionLocal
+from app.services.cache import LRUCache
+from app.services.checkout_service import CheckoutService
+
+logger = logging.getLogger(__name__)
+
+# Marca que le indica al escritor que termine cuando vacíe la cola
+_STOP = object()
+
+
+class CheckoutQueue:
+    """
+    Cola de checkouts para picos de compras (CHECKOUT_MODE=queue).
+    POST /carts/purchase encola y responde 202 con la URL del estado; un único
+    escritor (una tarea asyncio) saca hasta batch_size compras por vez y las
+    hace con CheckoutService.checkout_many: una transacción y un fsync por
+    lote en lugar de uno por orden, y sin peleas por el lock de escritura de
+    SQLite. El resultado de cada compra queda en results (en memoria) hasta
+    que vence.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, results: LRUCache):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.results = results
+        self.checkout_service = CheckoutService()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._queued = 0
+        self.batches = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_batch: Optional[Dict] = None
+
+    async def start(self):
+        """Crear la cola y lanzar el escritor en el event loop actual"""
+        if self._writer is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Dejar de aceptar compras y esperar a que el escritor procese las encoladas"""
+        if self._writer is None:
+            return
+        self._stopping = True
+        self._queue.put_nowait(_STOP)
+        await self._writer
+        self._writer = None
+        self._loop = None
+
+    def submit(self, user_id: int) -> Dict:
+        """
+        Encolar la compra del carrito del usuario y devolver su estado inicial.
+        Se llama desde los endpoints síncronos (threadpool), por eso la cola se
+        alimenta con call_soon_threadsafe.
+        """
+        if self._writer is None or self._stopping:
+            raise HTTPException(status_code=503, detail="Checkout queue is not running")
+        with self._lock:
+            if self._queued >= self.max_size:
+                raise HTTPException(status_code=503, detail="Checkout queue is full")
+            self._queued += 1
+
+        checkout_id = uuid.uuid4().hex
+        state = {
+            "checkout_id": checkout_id,
+            "user_id": user_id,
+            "status": "queued",
+            "submitted_at": datetime.utcnow(),
+            "status_url": f"/carts/purchase/{checkout_id}",
+        }
+        self.results.set(checkout_id, state)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (checkout_id, user_id))
+        return state
+
+    def get_status(self, checkout_id: str) -> Dict:
+        state = self.results.get(checkout_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Checkout not found")
+        return state
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            queued = self._queued
+        return {
+            "running": self._writer is not None,
+            "queued": queued,
+            "max_size": self.max_size,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "completed": self.completed,
+            "failed": self.failed,
+            "last_batch": self.last_batch,
+        }
+
+    async def _run(self):
+        while True:
+            batch = []
+            item = await self._queue.get()
+            while True:
+                if item is not _STOP:
+                    batch.append(item)
+                if len(batch) >= self.batch_size or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            if batch:
+                # El trabajo con SQLite es bloqueante: va al threadpool
+                await run_in_threadpool(self._process_batch, batch)
+            if self._stopping and self._queue.empty():
+                return
+
+    def _process_batch(self, batch: List[Tuple[str, int]]):
+        started = time.perf_counter()
+        for checkout_id, _ in batch:
+            self._update(checkout_id, status="processing")
+
+        db = SessionLocal()
+        try:
+            outcomes = self.checkout_service.checkout_many(db, [user_id for _, user_id in batch])
+        except Exception as e:
+            # Falló el lote entero (por ejemplo, el commit): ninguna compra se hizo
+            logger.exception("Checkout batch failed")
+            outcomes = [
+                {"status": "failed", "status_code": 500, "detail": f"Error processing purchase: {str(e)}"}
+            ] * len(batch)
+        finally:
+            db.close()
+
+        completed = 0
+        for (checkout_id, _), outcome in zip(batch, outcomes):
+            if outcome["status"] == "completed":
+                completed += 1
+                self._update(checkout_id, status="completed", result=outcome["result"])
+            else:
+                self._update(
+                    checkout_id,
+                    status="failed",
+                    error={"status_code": outcome["status_code"], "detail": outcome["detail"]}
+                )
+
+        with self._lock:
+            self._queued -= len(batch)
+            self.batches += 1
+            self.completed += completed
+            self.failed += len(batch) - completed
+            self.last_batch = {
+                "size": len(batch),
+                "completed": completed,
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+            }
+
+    def _update(self, checkout_id: str, **changes):
+        state = self.results.get(checkout_id)
+        if state is None:
+            return
+        self.results.set(checkout_id, {**state, **changes, "updated_at": datetime.utcnow()})
+
+
+def create_checkout_queue(mode: str) -> Optional[CheckoutQueue]:
+    """Crear la cola según CHECKOUT_MODE; con "sync" no hay cola y se compra en el momento"""
+    if mode == "sync":
+        return None
+    if mode == "queue":
+        return CheckoutQueue(
+            max_size=config.CHECKOUT_QUEUE_MAX_SIZE,
+            batch_size=config.CHECKOUT_QUEUE_BATCH_SIZE,
+            results=LRUCache(
+                max_entries=config.CHECKOUT_QUEUE_RESULTS_MAX_ENTRIES,
+                ttl_seconds=config.CHECKOUT_QUEUE_RESULT_TTL_SECONDS
+            ),
+        )
+    raise ValueError(f"Unknown checkout mode: {mode}")
+
+
+checkout_queue = create_checkout_queue(config.CHECKOUT_MODE)
@@ -0,0 +1,151 @@
+from typing import Dict, List
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.repositories.cart_repository import CartRepository
+from app.repositories.database import begin_write_transaction
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.order_repository import OrderRepository
+from app.repositories.order_item_repository import OrderItemRepository
+from app.repositories.product_repository import ProductRepository
+from app.services.cart_service import CartService
+from app.services.product_service import ProductService
+from app.services.stock_reservation_service import StockReservationService
+from app.schemas.order_schema import OrderWithItems
+from app.schemas.order_item_schema import OrderItem
+
+
+class CheckoutService:
+    """
+    Compra del carrito como una sola unidad de trabajo: descuento condicional
+    del stock, orden e items insertados en bloque y vaciado del carrito, con
+    un solo commit. Si algo falla se hace rollback y no queda nada a medias.
+    """
+
+    def __init__(self):
+        self.cart_repository = CartRepository()
+        self.cart_item_repository = CartItemRepository()
+        self.order_repository = OrderRepository()
+        self.order_item_repository = OrderItemRepository()
+        self.product_repository = ProductRepository()
+        self.cart_service = CartService()
+        self.product_service = ProductService()
+        self.stock_reservation_service = StockReservationService()
+
+    def checkout(self, db: Session, user_id: int) -> Dict:
+        """Comprar el carrito del usuario y devolver la orden creada"""
+        # Con almacén de carritos, los cambios pendientes se persisten antes
+        self.cart_service.flush_user_cart(db, user_id)
+        cart = self.cart_repository.get_cart_by_user_id(db, user_id)
+
+        try:
+            result = self._purchase_cart(db, user_id, cart.id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        self.cart_item_repository.clear_stored_items(cart.id)
+        return result
+
+    def checkout_many(self, db: Session, user_ids: List[int]) -> List[Dict]:
+        """
+        Group commit: comprar los carritos de varios usuarios en una sola
+        transacción, cada uno dentro de su SAVEPOINT. Si una compra falla solo
+        se deshace la suya y las demás siguen. Devuelve, en el mismo orden que
+        user_ids, {"status": "completed", "result": ...} o
+        {"status": "failed", "status_code": ..., "detail": ...}.
+        """
+        # Solo los ids: retener los objetos haría que cada UPDATE del lote los
+        # recorra al sincronizar la sesión
+        cart_ids = [self.cart_repository.get_cart_by_user_id(db, user_id).id for user_id in user_ids]
+        self.cart_item_repository.flush_carts(db, list(set(cart_ids)))
+
+        outcomes = []
+        purchased = set()
+        try:
+            # Sin una transacción abierta, cada SAVEPOINT sería un commit propio
+            begin_write_transaction(db)
+            for user_id, cart_id in zip(user_ids, cart_ids):
+                if cart_id in purchased:
+                    # El mismo carrito dos veces en el lote: ya quedó vacío
+                    outcomes.append({"status": "failed", "status_code": 400, "detail": "Cart is empty"})
+                    continue
+                savepoint = db.begin_nested()
+                try:
+                    result = self._purchase_cart(db, user_id, cart_id)
+                    savepoint.commit()
+                except HTTPException as e:
+                    savepoint.rollback()
+                    outcomes.append({"status": "failed", "status_code": e.status_code, "detail": e.detail})
+                    continue
+                except Exception as e:
+                    savepoint.rollback()
+                    outcomes.append({"status": "failed", "status_code": 500, "detail": f"Error processing purchase: {str(e)}"})
+                    continue
+                purchased.add(cart_id)
+                outcomes.append({"status": "completed", "result": result})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        for cart_id in purchased:
+            self.cart_item_repository.clear_stored_items(cart_id)
+        return outcomes
+
+    def _purchase_cart(self, db: Session, user_id: int, cart_id: int) -> Dict:
+        """
+        Pasos de la compra sin commit ni rollback (los hace el llamador):
+        stock, orden, items y vaciado del carrito
+        """
+        cart_items = self.cart_item_repository.get_cart_items(db, cart_id)
+        if not cart_items:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        quantities = {}
+        for item in cart_items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+        # 1. Convertir las reservas del carrito y descontar con el UPDATE
+        #    condicional (stock >= cantidad) solo lo que no estaba reservado;
+        #    toma el lock de escritura, así que los precios leídos después no cambian
+        self.stock_reservation_service.convert(db, cart_id, quantities)
+        products, _ = self.product_repository.get_products_by_ids(db, list(quantities))
+        prices = {product.id: product.price for product in products}
+
+        # 2. Orden e items
+        total_amount = sum(prices[product_id] * quantity for product_id, quantity in quantities.items())
+        order = self.order_repository.create_order(
+            db, user_id, total_amount, commit=False,
+            items_count=len(quantities), total_quantity=sum(quantities.values())
+        )
+        order_items = self.order_item_repository.insert_order_items(db, [
+            {
+                "order_id": order.id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "price": prices[product_id]  # Precio al momento de la compra
+            }
+            for product_id, quantity in quantities.items()
+        ])
+
+        # 3. Vaciar el carrito
+        self.cart_item_repository.clear_cart(db, cart_id, commit=False)
+
+        # La respuesta se arma antes del commit, que expira los objetos
+        order_with_items = OrderWithItems(
+            id=order.id,
+            user_id=order.user_id,
+            total=order.total,
+            date=order.date,
+            items=[OrderItem.from_orm(item) for item in order_items]
+        )
+        return {
+            "success": True,
+            "message": "Purchase completed successfully",
+            "order": order_with_items,
+            "items_purchased": len(order_items),
+            "total_amount": total_amount
+        }
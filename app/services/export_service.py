@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Table, select
+
+from app import config
+from app.repositories.database import SessionLocal
+from app.repositories.models.product_model import ProductModel
+from app.repositories.models.order_models import OrderModel, OrderItemModel
+from app.repositories.models.user_model import UserModel
+from app.repositories.models.cart_models import CartModel
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ExportService:
+    """
+    Exportación de tablas completas en NDJSON o CSV.
+    Las filas se leen del cursor en lotes de batch_size (yield_per) y se
+    serializan lote a lote, así que la memoria no depende del tamaño de la tabla.
+    """
+
+    tables = {
+        "products": ProductModel.__table__,
+        "orders": OrderModel.__table__,
+        "order_items": OrderItemModel.__table__,
+        "users": UserModel.__table__,
+        "carts": CartModel.__table__,
+    }
+
+    def media_type(self, file_format: str) -> str:
+        if file_format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported export format: {file_format}")
+        return EXPORT_FORMATS[file_format]
+
+    def stream_export(
+        self,
+        name: str,
+        file_format: str,
+        batch_size: int = config.EXPORT_BATCH_SIZE,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[str]:
+        """
+        Generador con el contenido del archivo exportado, en bloques de texto.
+        columns limita las columnas exportadas (ya validadas con parse_fields).
+        """
+        self.media_type(file_format)
+        table = self.tables[name]
+        return self._stream_table(table, file_format, batch_size, columns)
+
+    def _stream_table(self, table: Table, file_format: str, batch_size: int, columns: Optional[List[str]] = None) -> Iterator[str]:
+        # La sesión se abre dentro del generador: la de get_db se cierra antes
+        # de que StreamingResponse termine de enviar el cuerpo
+        db = SessionLocal()
+        try:
+            selected = [table.c[column] for column in columns] if columns else [table]
+            result = db.execute(
+                select(*selected).order_by(table.c.id).execution_options(yield_per=batch_size)
+            )
+            columns = list(result.keys())
+
+            if file_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+                for rows in result.partitions():
+                    writer.writerows(
+                        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                        for row in rows
+                    )
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                for rows in result.partitions():
+                    yield "".join(
+                        json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+        finally:
+            db.close()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app import config
+from app.repositories.database import SessionLocal
+from app.repositories.idempotency_repository import IdempotencyRepository
+from app.services.cache import LRUCache
+
+MAX_KEY_LENGTH = 255
+
+# Respuestas ya completadas: key -> (fingerprint, status_code, contenido)
+idempotency_cache = LRUCache(
+    max_entries=config.IDEMPOTENCY_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.IDEMPOTENCY_KEY_TTL_SECONDS
+)
+
+
+class IdempotencyService:
+    """
+    Soporte de Idempotency-Key: la primera petición con una clave reserva la
+    clave, se ejecuta y guarda su respuesta; las repeticiones (misma clave y
+    misma petición) reciben la respuesta guardada sin volver a ejecutarse.
+    Las respuestas se leen primero de una caché LRU en memoria y, si no están,
+    de la tabla idempotency_key. Las claves vencen a las
+    IDEMPOTENCY_KEY_TTL_SECONDS y un job las borra en lotes; una clave que
+    quedó en curso más de IDEMPOTENCY_IN_PROGRESS_LEASE_SECONDS se puede retomar.
+    """
+
+    def __init__(self):
+        self.repository = IdempotencyRepository()
+
+    @staticmethod
+    def fingerprint(method: str, path: str, params: Iterable[Tuple[str, str]]) -> str:
+        """Hash que identifica la petición (método, ruta y parámetros de query)"""
+        raw = json.dumps([method, path, sorted(params)], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def begin(self, db: Session, key: str, fingerprint: str) -> Optional[Tuple[int, Any]]:
+        """
+        Devolver (status_code, contenido) guardados si la petición es una
+        repetición; si es nueva, reservar la clave y devolver None.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must have 1 to {MAX_KEY_LENGTH} characters")
+
+        cached = idempotency_cache.get(key)
+        if cached is not None:
+            return self._replay(cached, fingerprint)
+
+        if self.repository.reserve_key(db, key, fingerprint):
+            return None
+
+        record = self.repository.get_key(db, key)
+        if record is not None and record.created_at < self._cutoff():
+            # Vencida pero todavía no compactada: se trata como nueva
+            self.repository.delete_key(db, key)
+            record = None
+        if record is None:
+            if self.repository.reserve_key(db, key, fingerprint):
+                return None
+            record = self.repository.get_key(db, key)
+        if record.status_code is None:
+            stale_before = datetime.utcnow() - timedelta(seconds=config.IDEMPOTENCY_IN_PROGRESS_LEASE_SECONDS)
+            if record.created_at < stale_before and self.repository.take_over_key(db, key, fingerprint, stale_before):
+                # La petición original murió sin completar ni liberar la clave
+                return None
+            if record.fingerprint != fingerprint:
+                self._raise_mismatch()
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+        entry = (record.fingerprint, record.status_code, json.loads(record.response))
+        # En caché solo por lo que le queda a la clave, no por un TTL completo
+        remaining = (record.created_at - self._cutoff()).total_seconds()
+        idempotency_cache.set(key, entry, ttl_seconds=remaining)
+        return self._replay(entry, fingerprint)
+
+    def complete(self, db: Session, key: str, fingerprint: str, status_code: int, content: Any) -> Any:
+        """Guardar la respuesta de la petición original y devolverla serializable"""
+        encoded = jsonable_encoder(content)
+        self.repository.complete_key(db, key, status_code, json.dumps(encoded))
+        idempotency_cache.set(key, (fingerprint, status_code, encoded))
+        return encoded
+
+    def release(self, db: Session, key: str):
+        """Liberar la clave si la petición original falló, para que se pueda reintentar"""
+        self.repository.delete_key(db, key)
+        idempotency_cache.invalidate(key)
+
+    def compact(self, db: Session, batch_size: int = config.IDEMPOTENCY_COMPACTION_BATCH_SIZE) -> Dict:
+        """Borrar las claves vencidas en lotes de batch_size"""
+        report = {"deleted": 0, "batches": 0}
+        cutoff = self._cutoff()
+        while True:
+            deleted = self.repository.delete_expired(db, cutoff, batch_size)
+            report["deleted"] += deleted
+            if deleted:
+                report["batches"] += 1
+            if deleted < batch_size:
+                return report
+
+    def run_compaction(self) -> Dict:
+        """compact con su propia sesión (la usa el job en segundo plano)"""
+        db = SessionLocal()
+        try:
+            return self.compact(db)
+        finally:
+            db.close()
+
+    def get_cache_stats(self) -> dict:
+        return idempotency_cache.stats()
+
+    def _replay(self, entry: Tuple[str, int, Any], fingerprint: str) -> Tuple[int, Any]:
+        stored_fingerprint, status_code, content = entry
+        if stored_fingerprint != fingerprint:
+            self._raise_mismatch()
+        return status_code, content
+
+    @staticmethod
+    def _raise_mismatch():
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request"
+        )
+
+    @staticmethod
+    def _cutoff() -> datetime:
+        return datetime.utcnow() - timedelta(seconds=config.IDEMPOTENCY_KEY_TTL_SECONDS)
@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    Ejecuta func cada interval_seconds en un hilo daemon.
+    Un error se registra en el log y en las métricas pero no detiene el job.
+    stop() espera a que termine la ejecución en curso.
+    """
+
+    def __init__(self, name: str, interval_seconds: float, func: Callable[[], Any]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self.last_error: Optional[str] = None
+        self.last_run_at: Optional[float] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self) -> Any:
+        self.last_run_at = time.time()
+        try:
+            self.last_result = self.func()
+            self.last_error = None
+            return self.last_result
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.exception("Background job %s failed", self.name)
+        finally:
+            self.runs += 1
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval_seconds,
+            "running": self._thread is not None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "last_run_at": self.last_run_at,
+        }
+
+    def _loop(self):
+        # wait() devuelve True en cuanto se pide stop(), sin esperar el intervalo
+        while not self._stop_event.wait(self.interval_seconds):
+            self.run_once()
@@ -1,14 +1,17 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from typing import List, Dict
-from datetime import datetime
+from typing import List, Dict, Optional
+from datetime import datetime, timezone
 
 from app.repositories.order_repository import OrderRepository
 from app.repositories.order_item_repository import OrderItemRepository
 from app.repositories.product_repository import ProductRepository
 from app.repositories.cart_repository import CartRepository
 from app.repositories.cart_item_repository import CartItemRepository
-from app.schemas.order_schema import Order, OrderCreate, OrderWithItems
+from app.repositories.models.order_models import OrderModel
+from app.repositories.projection import parse_fields
+from app.services.product_service import ProductService
+from app.schemas.order_schema import Order, OrderBatch, OrderCreate, OrderPage, OrderWithItems
 from app.schemas.order_item_schema import OrderItem, OrderItemCreate
 
 
@@ -19,11 +22,40 @@ class OrderService:
         self.product_repository = ProductRepository()
         self.cart_repository = CartRepository()
         self.cart_item_repository = CartItemRepository()
+        self.product_service = ProductService()
 
-    def get_all_orders(self, db: Session) -> List[Order]:
-        """Obtener todas las órdenes"""
-        orders = self.order_repository.get_orders(db)
-        return [Order.from_orm(order) for order in orders]
+    def _get_products_map(self, db: Session, product_ids: List[int]) -> Dict:
+        """Productos por ID leídos de la base de datos (404 si falta alguno)"""
+        products, missing_ids = self.product_repository.get_products_by_ids(db, product_ids)
+        if missing_ids:
+            raise HTTPException(status_code=404, detail=f"Products not found: {missing_ids}")
+        return {product.id: product for product in products}
+
+    @staticmethod
+    def _to_utc(value: Optional[datetime]) -> Optional[datetime]:
+        """Las fechas se guardan en UTC sin zona: convertir los filtros con zona horaria"""
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def get_all_orders(
+        self,
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        fields: Optional[str] = None,
+    ) -> OrderPage:
+        """Obtener una página de órdenes, de la más nueva a la más vieja (solo las columnas de fields, si se indica)"""
+        columns = parse_fields(OrderModel, fields)
+        orders, next_cursor = self.order_repository.get_orders(
+            db, limit=limit, cursor=cursor,
+            date_from=self._to_utc(date_from), date_to=self._to_utc(date_to), fields=columns
+        )
+        if columns is None:
+            orders = [Order.from_orm(order) for order in orders]
+        return OrderPage(items=orders, next_cursor=next_cursor)
 
     def get_order_by_id(self, db: Session, order_id: int) -> OrderWithItems:
         """Obtener orden por ID con sus items"""
@@ -40,13 +72,43 @@ class OrderService:
             user_id=order_schema.user_id,
             total=order_schema.total,
             date=order_schema.date,
+            status=order_schema.status,
             items=items_schema
         )
 
-    def get_orders_by_user(self, db: Session, user_id: int) -> List[Order]:
-        """Obtener órdenes de un usuario específico"""
-        orders = self.order_repository.get_orders_by_user(db, user_id)
-        return [Order.from_orm(order) for order in orders]
+    def get_order_version(self, db: Session, order_id: int) -> int:
+        """Versión actual de la orden, sin cargar sus items"""
+        return self.order_repository.get_order_version(db, order_id)
+
+    def get_orders_by_user(
+        self,
+        db: Session,
+        user_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        include_items: bool = False,
+    ) -> OrderPage:
+        """
+        Obtener una página del historial de órdenes de un usuario, de la más
+        nueva a la más vieja (con sus items, si se indica include_items)
+        """
+        orders, next_cursor = self.order_repository.get_orders_by_user(
+            db, user_id, limit=limit, cursor=cursor,
+            date_from=self._to_utc(date_from), date_to=self._to_utc(date_to),
+            include_items=include_items
+        )
+        schema = OrderWithItems if include_items else Order
+        return OrderPage(items=[schema.from_orm(order) for order in orders], next_cursor=next_cursor)
+
+    def get_orders_by_ids(self, db: Session, order_ids: List[int]) -> OrderBatch:
+        """Obtener varias órdenes con sus items (dos consultas en total) y los ids inexistentes"""
+        orders, missing_ids = self.order_repository.get_orders_by_ids(db, order_ids)
+        return OrderBatch(
+            items=[OrderWithItems.from_orm(order) for order in orders],
+            missing_ids=missing_ids
+        )
 
     def create_order(self, db: Session, order_data: OrderCreate) -> Order:
         """Crear orden simple"""
@@ -72,9 +134,11 @@ class OrderService:
             order_items_data = []
             total_amount = 0.0
             
+            # Obtener todos los productos actuales en una sola consulta
+            products_by_id = self._get_products_map(db, [item.product_id for item in cart_items])
+            
             for cart_item in cart_items:
-                # Obtener producto actual
-                product = self.product_repository.get_product(db, cart_item.product_id)
+                product = products_by_id[cart_item.product_id]
                 
                 # Verificar stock
                 if product.stock < cart_item.quantity:
@@ -95,7 +159,11 @@ class OrderService:
                 })
             
             # 3. Crear la orden
-            created_order = self.order_repository.create_order(db, user_id, total_amount)
+            created_order = self.order_repository.create_order(
+                db, user_id, total_amount,
+                items_count=len(order_items_data),
+                total_quantity=sum(item["quantity"] for item in order_items_data)
+            )
             
             # 4. Crear los order items
             order_items_for_creation = []
@@ -150,8 +218,10 @@ class OrderService:
             total_amount = 0.0
             validated_items = []
             
+            products_by_id = self._get_products_map(db, [item["product_id"] for item in items_data])
+            
             for item in items_data:
-                product = self.product_repository.get_product(db, item["product_id"])
+                product = products_by_id[item["product_id"]]
                 
                 if product.stock < item["quantity"]:
                     raise HTTPException(
@@ -169,7 +239,11 @@ class OrderService:
                 })
             
             # 2. Crear orden
-            created_order = self.order_repository.create_order(db, user_id, total_amount)
+            created_order = self.order_repository.create_order(
+                db, user_id, total_amount,
+                items_count=len(validated_items),
+                total_quantity=sum(item["quantity"] for item in validated_items)
+            )
             
             # 3. Crear order items
             order_items_for_creation = []
@@ -205,69 +279,57 @@ class OrderService:
 
     def cancel_order(self, db: Session, order_id: int) -> Dict:
         """
-        Cancelar orden y restaurar stock de productos
+        Cancelar la orden y devolver su stock en una sola transacción: un
+        UPDATE condicional de la orden, una consulta agrupada de sus items y un
+        solo UPDATE de stock (stock + CASE) para todos los productos, sin
+        importar cuántas líneas tenga. La orden queda con status "cancelled".
         """
         try:
-            # 1. Obtener orden y sus items
-            order = self.order_repository.get_order(db, order_id)
-            order_items = self.order_item_repository.get_order_items(db, order_id)
-            
-            # 2. Restaurar stock de cada producto
-            for item in order_items:
-                try:
-                    # Obtener producto actual
-                    product = self.product_repository.get_product(db, item.product_id)
-                    # Restaurar stock
-                    new_stock = product.stock + item.quantity
-                    
-                    # Actualizar producto (necesitarás este método en ProductService)
-                    updated_data = {
-                        'name': product.name,
-                        'price': product.price,
-                        'description': product.description,
-                        'category': product.category,
-                        'stock': new_stock,
-                        'image': product.image
-                    }
-                    
-                    from app.repositories.models.product_model import ProductModel
-                    product_model = ProductModel(**updated_data)
-                    self.product_repository.update_product(db, item.product_id, product_model)
-                    
-                except Exception as stock_error:
-                    # Log error pero continúa con otros productos
-                    print(f"Error restoring stock for product {item.product_id}: {stock_error}")
+            order = self.order_repository.mark_cancelled(db, order_id)
+            if order is None:
+                # Solo en el caso de error se distingue si falta la orden o ya estaba cancelada
+                self.order_repository.get_order(db, order_id)
+                raise HTTPException(status_code=409, detail="Order is already cancelled")
             
-            # 3. Eliminar la orden (esto también eliminará los order_items por cascade)
-            deleted_order = self.order_repository.delete_order(db, order_id)
-            
-            return {
-                "success": True,
-                "message": "Order cancelled successfully",
-                "cancelled_order": Order.from_orm(deleted_order),
-                "stock_restored": len(order_items)
-            }
+            quantities = self.order_item_repository.get_order_quantities(db, order_id)
+            if quantities:
+                self.product_service.restore_products_stock(db, quantities, commit=False)
             
-        except HTTPException:
+            # La respuesta se arma antes del commit, que expira los objetos
+            cancelled_order = Order.from_orm(order)
+            db.commit()
+        except Exception:
+            db.rollback()
             raise
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error cancelling order: {str(e)}"
-            )
+        
+        return {
+            "success": True,
+            "message": "Order cancelled successfully",
+            "cancelled_order": cancelled_order,
+            "stock_restored": len(quantities)
+        }
+
+    def discard_order(self, db: Session, order_id: int) -> Dict:
+        """
+        Eliminar una orden cuyo stock nunca se descontó (compra que falló
+        antes de reducir stock), sin tocar el stock de los productos
+        """
+        deleted_order = self.order_repository.delete_order(db, order_id)
+        return {
+            "success": True,
+            "message": "Order discarded",
+            "discarded_order": Order.from_orm(deleted_order)
+        }
 
     def get_order_total(self, db: Session, order_id: int) -> Dict:
-        """Obtener resumen de totales de una orden"""
+        """Obtener resumen de totales de una orden (guardado en la propia orden: sin leer los items)"""
         order = self.order_repository.get_order(db, order_id)
-        order_items = self.order_item_repository.get_order_items(db, order_id)
-        
-        total_items = sum(item.quantity for item in order_items)
-        
         return {
             "order_id": order.id,
             "user_id": order.user_id,
             "total_amount": order.total,
-            "total_items": total_items,
+            "total_items": order.total_quantity,
             "date": order.date,
-            "items_count": len(order_items)
+            "items_count": order.items_count,
+            "status": order.status
         }
\ No newline at end of file
@@ -0,0 +1,110 @@
+import csv
+import json
+import time
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app import config
+from app.repositories import ProductRepository
+from app.schemas.product_schema import ProductCreate
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+
+class ProductImportService:
+    """
+    Importación masiva de productos desde NDJSON o CSV.
+    El archivo se lee fila por fila y las filas válidas se insertan en lotes
+    de batch_size, con un commit por lote.
+    """
+
+    def __init__(self):
+        self.repository = ProductRepository()
+
+    def import_products(
+        self,
+        db: Session,
+        stream: TextIO,
+        file_format: str,
+        batch_size: int = config.PRODUCT_IMPORT_BATCH_SIZE,
+    ) -> Dict:
+        """Importar productos desde un stream de texto y devolver el reporte"""
+        if file_format not in IMPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported import format: {file_format}")
+        if batch_size <= 0:
+            raise HTTPException(status_code=400, detail="Batch size must be greater than 0")
+
+        started = time.perf_counter()
+        report = {
+            "format": file_format,
+            "batch_size": batch_size,
+            "rows_read": 0,
+            "imported": 0,
+            "failed": 0,
+            "batches": 0,
+            "errors": [],
+            "errors_truncated": False,
+        }
+        batch: List[Tuple[int, Dict]] = []
+
+        for row_number, data, error in self._read_rows(stream, file_format):
+            report["rows_read"] += 1
+            if error is None:
+                try:
+                    batch.append((row_number, ProductCreate(**data).model_dump()))
+                except ValidationError as e:
+                    error = "; ".join(
+                        f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+                    )
+                except TypeError:
+                    error = "Row must be an object"
+            if error is not None:
+                self._add_error(report, row_number, error)
+
+            if len(batch) >= batch_size:
+                self._flush_batch(db, batch, report)
+                batch = []
+
+        if batch:
+            self._flush_batch(db, batch, report)
+
+        elapsed = time.perf_counter() - started
+        report["elapsed_seconds"] = round(elapsed, 3)
+        report["rows_per_second"] = round(report["imported"] / elapsed, 1) if elapsed > 0 else None
+        return report
+
+    def _read_rows(self, stream: TextIO, file_format: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+        """Generar (número de fila, datos, error de parseo) sin cargar el archivo entero"""
+        if file_format == "csv":
+            reader = csv.DictReader(stream)
+            for data in reader:
+                yield reader.line_num, data, None
+            return
+
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line), None
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+
+    def _flush_batch(self, db: Session, batch: List[Tuple[int, Dict]], report: Dict):
+        report["batches"] += 1
+        try:
+            self.repository.bulk_create_products(db, [row for _, row in batch])
+            report["imported"] += len(batch)
+        except Exception as e:
+            db.rollback()
+            for row_number, _ in batch:
+                self._add_error(report, row_number, f"Batch insert failed: {e}")
+
+    def _add_error(self, report: Dict, row_number: int, error: str):
+        report["failed"] += 1
+        if len(report["errors"]) < config.PRODUCT_IMPORT_MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": error})
+        else:
+            report["errors_truncated"] = True
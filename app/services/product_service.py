@@ -1,53 +1,170 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from typing import Dict, List, Optional, Tuple
 
+from app import config
 from app.repositories import ProductRepository
 from app.repositories.models.product_model import ProductModel   
+from app.repositories.projection import parse_fields
+from app.schemas.product_schema import Product, ProductPage, ProductFacet, ProductFacets
+from app.services.cache import LRUCache
+
+# Caché compartida por todas las instancias del servicio (una por proceso)
+product_cache = LRUCache(
+    max_entries=config.PRODUCT_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.PRODUCT_CACHE_TTL_SECONDS
+)
 
 
 class ProductService:
+    """
+    Las lecturas por ID pasan por product_cache. El stock cacheado puede tener
+    hasta PRODUCT_CACHE_TTL_SECONDS de antigüedad (por ejemplo si otro proceso
+    lo modificó), así que el checkout debe leer con fresh=True o directamente
+    del repositorio.
+    """
     def __init__(self):
         self.repository : ProductRepository = ProductRepository()
 
-    def get_products(self, db: Session):
-        return self.repository.get_products(db)
+    def get_products(
+        self,
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "id",
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False,
+        fields: Optional[str] = None,
+    ) -> ProductPage:
+        """
+        Obtener una página de productos filtrada.
+        fields (ej: "name,price") limita las columnas leídas y devueltas.
+        """
+        columns = parse_fields(ProductModel, fields)
+        products, next_cursor = self.repository.get_products(
+            db, limit=limit, cursor=cursor, sort=sort, category=category,
+            min_price=min_price, max_price=max_price, in_stock=in_stock,
+            fields=columns
+        )
+        if columns is not None:
+            items = [{name: getattr(row, name) for name in columns} for row in products]
+        else:
+            items = [Product.from_orm(product) for product in products]
+        return ProductPage(items=items, next_cursor=next_cursor)
+
+    def search_products(self, db: Session, query: str, limit: int = 20, cursor: Optional[str] = None) -> ProductPage:
+        """Buscar productos por texto, ordenados por relevancia"""
+        products, next_cursor = self.repository.search_products(db, query, limit=limit, cursor=cursor)
+        return ProductPage(
+            items=[Product.from_orm(product) for product in products],
+            next_cursor=next_cursor
+        )
+
+    def get_facets(self, db: Session) -> ProductFacets:
+        """Cantidades por categoría y rango de precios, leídos de la tabla de agregados"""
+        categories = [ProductFacet.from_orm(row) for row in self.repository.facet_repository.get_facets(db)]
+        min_prices = [facet.min_price for facet in categories if facet.min_price is not None]
+        max_prices = [facet.max_price for facet in categories if facet.max_price is not None]
+        return ProductFacets(
+            categories=categories,
+            product_count=sum(facet.product_count for facet in categories),
+            in_stock_count=sum(facet.in_stock_count for facet in categories),
+            min_price=min(min_prices) if min_prices else None,
+            max_price=max(max_prices) if max_prices else None
+        )
+
+    def get_product_version(self, db: Session, product_id: int) -> int:
+        """Versión actual del producto, leída de la base de datos"""
+        return self.repository.get_product_version(db, product_id)
 
-    def get_product(self, db: Session, product_id: int):
-        return self.repository.get_product(db,product_id)
+    def get_product(self, db: Session, product_id: int, fresh: bool = False, version: Optional[int] = None) -> Product:
+        """
+        Obtener producto por ID, desde la caché salvo que se pida fresh.
+        Con version solo se usa la entrada cacheada si es de esa versión.
+        """
+        if not fresh:
+            cached = product_cache.get(product_id)
+            if cached is not None and (version is None or cached.version == version):
+                return cached
+        token = product_cache.load_token()
+        product = Product.from_orm(self.repository.get_product(db, product_id))
+        product_cache.set(product_id, product, token)
+        return product
+
+    def get_products_by_ids(self, db: Session, product_ids: List[int], fresh: bool = False) -> Tuple[List[Product], List[int]]:
+        """
+        Obtener varios productos por ID: los que están en caché no se consultan y
+        el resto se trae con una sola consulta.
+        Devuelve (productos en el orden pedido, ids que no existen).
+        """
+        unique_ids = list(dict.fromkeys(product_ids))
+        found = {}
+        if not fresh:
+            for product_id in unique_ids:
+                cached = product_cache.get(product_id)
+                if cached is not None:
+                    found[product_id] = cached
+
+        pending = [product_id for product_id in unique_ids if product_id not in found]
+        if pending:
+            token = product_cache.load_token()
+            products, _ = self.repository.get_products_by_ids(db, pending)
+            for product in products:
+                found[product.id] = Product.from_orm(product)
+                product_cache.set(product.id, found[product.id], token)
+
+        products = [found[product_id] for product_id in unique_ids if product_id in found]
+        missing = [product_id for product_id in unique_ids if product_id not in found]
+        return products, missing
+
+    def get_cache_stats(self) -> dict:
+        """Contadores de la caché de productos"""
+        return product_cache.stats()
 
     def create_product(self, db: Session, product: ProductModel):
-        return self.repository.create_product(db,product)
+        new_product = self.repository.create_product(db,product)
+        product_cache.invalidate(new_product.id)
+        return new_product
 
     def update_product(self, db: Session, product_id: int, product: ProductModel):
-        return self.repository.update_product(db,product_id, product)
+        try:
+            return self.repository.update_product(db,product_id, product)
+        finally:
+            product_cache.invalidate(product_id)
 
     def delete_product(self, db: Session, product_id: int):
-        return self.repository.delete_product(db,product_id)
+        try:
+            return self.repository.delete_product(db,product_id)
+        finally:
+            product_cache.invalidate(product_id)
     
-    def reduce_product_stock(self, db: Session, product_id: int, quantity: int):
-        """Reducir stock de un producto"""
-        # Obtener producto actual
-        product = self.repository.get_product(db, product_id)
-        
-        # Verificar stock suficiente
-        if product.stock < quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for product {product.name}. Available: {product.stock}, Requested: {quantity}"
-            )
-        
-        # Calcular nuevo stock
-        new_stock = product.stock - quantity
-        
-        # Crear modelo actualizado
-        updated_product = ProductModel(
-            name=product.name,
-            price=product.price,
-            description=product.description,
-            category=product.category,
-            stock=new_stock,
-            image=product.image
-        )
-        
-        # Actualizar en base de datos
-        return self.repository.update_product(db, product_id, updated_product)
\ No newline at end of file
+    def reduce_product_stock(self, db: Session, product_id: int, quantity: int) -> int:
+        """Reducir stock de un producto con un UPDATE condicional; devuelve el stock resultante"""
+        try:
+            return self.repository.decrement_stock(db, product_id, quantity)
+        finally:
+            product_cache.invalidate(product_id)
+
+    def reduce_products_stock(self, db: Session, quantities: Dict[int, int], commit: bool = True) -> Dict[int, int]:
+        """
+        Reducir stock de varios productos en una sola sentencia (todo o nada).
+        quantities: {product_id: cantidad}
+        """
+        try:
+            return self.repository.decrement_stock_bulk(db, quantities, commit=commit)
+        finally:
+            for product_id in quantities:
+                product_cache.invalidate(product_id)
+
+    def restore_products_stock(self, db: Session, quantities: Dict[int, int], commit: bool = True) -> Dict[int, int]:
+        """
+        Devolver stock a varios productos en una sola sentencia.
+        quantities: {product_id: cantidad}
+        """
+        try:
+            return self.repository.increment_stock_bulk(db, quantities, commit=commit)
+        finally:
+            for product_id in quantities:
+                product_cache.invalidate(product_id)
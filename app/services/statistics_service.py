@@ -0,0 +1,23 @@
+from sqlalchemy.orm import Session
+
+from app.repositories.database import SessionLocal
+from app.repositories.pagination import refresh_statistics
+
+
+class StatisticsService:
+    """
+    Estadísticas de SQLite (sqlite_stat1). Las usan el planificador y los
+    totales aproximados de los listados, que sin un ANALYZE reciente quedan
+    con la cantidad de filas de la última vez que se corrió.
+    """
+
+    def refresh(self, db: Session) -> None:
+        refresh_statistics(db)
+
+    def run_refresh(self) -> None:
+        """refresh con su propia sesión (la usa el job en segundo plano)"""
+        db = SessionLocal()
+        try:
+            self.refresh(db)
+        finally:
+            db.close()
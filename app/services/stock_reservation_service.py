@@ -0,0 +1,188 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app import config
+from app.repositories.database import SessionLocal
+from app.repositories.stock_reservation_repository import StockReservationRepository
+from app.services.product_service import ProductService
+
+# Métricas del barrido acumuladas desde que arrancó el proceso
+_metrics_lock = threading.Lock()
+_metrics = {
+    "runs": 0,
+    "reservations_released": 0,
+    "units_restored": 0,
+    "batches": 0,
+    "last_run": None,
+}
+
+
+class StockReservationService:
+    """
+    Reservas de stock con vencimiento para las líneas de los carritos
+    (STOCK_RESERVATION_TTL_SECONDS > 0). Reservar descuenta el stock con el
+    mismo UPDATE condicional del checkout, así que product.stock pasa a ser el
+    stock disponible (sin lo apartado en carritos) y agregar al carrito falla
+    en el momento si no alcanza. Cada cambio del carrito extiende el
+    vencimiento de todas sus reservas; el checkout las convierte en la venta
+    sin volver a descontarlas y el barrido devuelve el stock de las vencidas.
+    """
+
+    def __init__(self, ttl_seconds: float = config.STOCK_RESERVATION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.repository = StockReservationRepository()
+        self.product_service = ProductService()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get_reserved(self, db: Session, cart_id: int) -> Dict[int, int]:
+        """Cantidades reservadas por el carrito ({} con las reservas desactivadas)"""
+        if not self.enabled:
+            return {}
+        return self.repository.get_cart_reservations(db, cart_id)
+
+    def reserve(
+        self,
+        db: Session,
+        cart_id: int,
+        quantities: Dict[int, int],
+        reserved: Optional[Dict[int, int]] = None,
+        commit: bool = True,
+    ):
+        """
+        Dejar reservadas para el carrito las cantidades de quantities
+        ({product_id: cantidad}; 0 libera la reserva). Solo se descuenta o se
+        devuelve la diferencia con lo ya reservado (reserved, si ya se leyó).
+        Si no alcanza el stock se lanza la excepción y no cambia nada.
+        """
+        if not self.enabled:
+            return
+        if reserved is None:
+            reserved = self.repository.get_cart_reservations(db, cart_id)
+        to_hold = {
+            product_id: quantity - reserved.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+            if quantity > reserved.get(product_id, 0)
+        }
+        to_release = {
+            product_id: reserved[product_id] - quantity
+            for product_id, quantity in quantities.items()
+            if reserved.get(product_id, 0) > quantity
+        }
+        try:
+            if to_hold:
+                self.product_service.reduce_products_stock(db, to_hold, commit=False)
+            if to_release:
+                self.product_service.restore_products_stock(db, to_release, commit=False)
+            self.repository.set_cart_reservations(db, cart_id, quantities, self._expires_at())
+            if commit:
+                db.commit()
+        except Exception:
+            if commit:
+                db.rollback()
+            raise
+
+    def hold(self, db: Session, cart_id: int, product_id: int, quantity: int, commit: bool = True):
+        """Reservar quantity unidades más del producto (lo que se agrega al carrito)"""
+        if not self.enabled:
+            return
+        reserved = self.repository.get_cart_reservations(db, cart_id)
+        self.reserve(
+            db, cart_id, {product_id: reserved.get(product_id, 0) + quantity}, reserved=reserved, commit=commit
+        )
+
+    def release_cart(self, db: Session, cart_id: int, commit: bool = True):
+        """Liberar todas las reservas del carrito devolviendo su stock"""
+        self.release_carts(db, [cart_id], commit=commit)
+
+    def release_carts(self, db: Session, cart_ids: List[int], commit: bool = True) -> int:
+        """
+        Liberar las reservas de varios carritos (por ejemplo, los purgados)
+        con un DELETE y un UPDATE de stock; devuelve las unidades devueltas
+        """
+        reserved = self.repository.pop_carts_reservations(db, cart_ids)
+        if reserved:
+            self.product_service.restore_products_stock(db, reserved, commit=False)
+        if commit:
+            db.commit()
+        return sum(reserved.values())
+
+    def convert(self, db: Session, cart_id: int, quantities: Dict[int, int]):
+        """
+        Checkout (sin commit): borrar las reservas del carrito y descontar solo
+        lo que no estaba reservado (por ejemplo, si la reserva venció), con el
+        UPDATE condicional de siempre. Lo reservado de más se devuelve.
+        """
+        reserved = self.repository.pop_cart_reservations(db, cart_id)
+        shortfall = {
+            product_id: quantity - reserved.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+            if quantity > reserved.get(product_id, 0)
+        }
+        excess = {
+            product_id: quantity - quantities.get(product_id, 0)
+            for product_id, quantity in reserved.items()
+            if quantity > quantities.get(product_id, 0)
+        }
+        if shortfall:
+            self.product_service.reduce_products_stock(db, shortfall, commit=False)
+        if excess:
+            self.product_service.restore_products_stock(db, excess, commit=False)
+
+    def sweep(self, db: Session, batch_size: int = config.STOCK_RESERVATION_SWEEP_BATCH_SIZE) -> Dict:
+        """
+        Devolver el stock de las reservas vencidas, en lotes de batch_size con
+        un commit por lote (DELETE ... RETURNING y un solo UPDATE de stock)
+        """
+        if batch_size <= 0:
+            raise HTTPException(status_code=400, detail="Batch size must be greater than 0")
+
+        started = time.perf_counter()
+        report = {"reservations_released": 0, "units_restored": 0, "batches": 0}
+        while True:
+            now = datetime.utcnow()
+            expired = self.repository.pop_expired(db, now, batch_size)
+            if not expired:
+                break
+            quantities = {}
+            for product_id, quantity in expired:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            self.product_service.restore_products_stock(db, quantities, commit=False)
+            db.commit()
+            report["batches"] += 1
+            report["reservations_released"] += len(expired)
+            report["units_restored"] += sum(quantities.values())
+            if len(expired) < batch_size:
+                break
+        report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+
+        with _metrics_lock:
+            _metrics["runs"] += 1
+            _metrics["reservations_released"] += report["reservations_released"]
+            _metrics["units_restored"] += report["units_restored"]
+            _metrics["batches"] += report["batches"]
+            _metrics["last_run"] = report
+        return report
+
+    def run_sweep(self) -> Dict:
+        """Ejecutar el barrido con su propia sesión (la usa el job en segundo plano)"""
+        db = SessionLocal()
+        try:
+            return self.sweep(db)
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        """Métricas acumuladas del barrido"""
+        with _metrics_lock:
+            return {"enabled": self.enabled, "ttl_seconds": self.ttl_seconds, **_metrics}
+
+    def _expires_at(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
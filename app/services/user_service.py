@@ -1,11 +1,12 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 
 from app.repositories.user_repository import UserRepository
 from app.repositories.cart_repository import CartRepository
-from app.schemas.user_schema import User, UserCreate, UserUpdate
+from app.schemas.user_schema import User, UserCreate, UserUpdate, UserPage
 from app.repositories.models.user_model import UserModel
+from app.repositories.projection import parse_fields
 
 
 class UserService:
@@ -13,10 +14,17 @@ class UserService:
         self.user_repository = UserRepository()
         self.cart_repository = CartRepository()
 
-    def get_all_users(self, db: Session) -> List[User]:
-        """Obtener todos los usuarios"""
-        users = self.user_repository.get_users(db)
-        return [User.from_orm(user) for user in users]
+    def get_all_users(self, db: Session, limit: int = 50, cursor: Optional[str] = None, fields: Optional[str] = None) -> UserPage:
+        """Obtener una página de usuarios (solo las columnas de fields, si se indica)"""
+        columns = parse_fields(UserModel, fields)
+        users, next_cursor = self.user_repository.get_users(db, limit=limit, cursor=cursor, fields=columns)
+        if columns is None:
+            users = [User.from_orm(user) for user in users]
+        return UserPage(
+            items=users,
+            next_cursor=next_cursor,
+            approximate_total=self.user_repository.count_users_approximate(db)
+        )
 
     def get_user_by_id(self, db: Session, user_id: int) -> User:
         """Obtener usuario por ID"""
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.repositories.database import Base
+from app.repositories.migrations import run_migrations
+# Importar todos los modelos para que se registren en SQLAlchemy
+from app.repositories.models import *
+from app.services.product_service import product_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_product_cache():
+    # Cada prueba usa su propia base: los ids de productos se repiten
+    product_cache.clear()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Base SQLite temporal con el esquema y las migraciones de la app"""
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'test.db')}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def products(db):
+    """Tres productos con stock de sobra; devuelve sus ids"""
+    product_ids = db.scalars(
+        insert(ProductModel).returning(ProductModel.id),
+        [
+            {"name": f"Producto {i}", "price": 10.0 * i, "description": "", "category": "test",
+             "stock": 100, "image": ""}
+            for i in range(1, 4)
+        ]
+    ).all()
+    db.commit()
+    return product_ids
+
+
+@pytest.fixture
+def create_user_cart(db):
+    """Fábrica de usuarios con su carrito vacío: create_user_cart() -> (user_id, cart_id)"""
+    created = []
+
+    def create():
+        index = len(created)
+        user_id = db.scalar(
+            insert(UserModel).values(name=f"test-{index}", email=f"test-{index}@example.com").returning(UserModel.id)
+        )
+        cart_id = db.scalar(insert(CartModel).values(user_id=user_id).returning(CartModel.id))
+        db.commit()
+        created.append((user_id, cart_id))
+        return user_id, cart_id
+
+    return create
+
+
+@pytest.fixture
+def user_cart(create_user_cart):
+    """(user_id, cart_id) de un usuario con su carrito vacío"""
+    return create_user_cart()
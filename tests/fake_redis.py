@@ -0,0 +1,251 @@
+import threading
+import time
+
+
+class WatchError(Exception):
+    pass
+
+
+def _encode(value) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class FakeRedis:
+    """
+    Cliente en memoria con el subconjunto de la interfaz de redis-py que usa
+    RedisCartStore (hashes, conjuntos, vencimientos y pipelines con
+    WATCH/MULTI). clock permite adelantar el tiempo en las pruebas.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._expires = {}
+        self._versions = {}
+        self._lock = threading.RLock()
+
+    # Claves y vencimientos
+
+    def _get(self, key, default_factory=None):
+        key = _encode(key)
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= self.clock():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            self._touch(key)
+        if key not in self._data and default_factory is not None:
+            self._data[key] = default_factory()
+        return self._data.get(key)
+
+    def _touch(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _cleanup(self, key):
+        if not self._data.get(key):
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def ttl(self, key):
+        with self._lock:
+            if self._get(key) is None:
+                return -2
+            expires_at = self._expires.get(_encode(key))
+            return -1 if expires_at is None else expires_at - self.clock()
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                if self._get(key) is not None:
+                    key = _encode(key)
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    self._touch(key)
+                    deleted += 1
+            return deleted
+
+    def expire(self, key, seconds, xx=False):
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            key = _encode(key)
+            if xx and key not in self._expires:
+                return False
+            self._expires[key] = self.clock() + seconds
+            self._touch(key)
+            return True
+
+    def persist(self, key):
+        with self._lock:
+            if self._get(key) is None or _encode(key) not in self._expires:
+                return False
+            del self._expires[_encode(key)]
+            self._touch(_encode(key))
+            return True
+
+    # Hashes
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._get(key) or {})
+
+    def hget(self, key, field):
+        with self._lock:
+            return (self._get(key) or {}).get(_encode(field))
+
+    def hexists(self, key, field):
+        with self._lock:
+            return _encode(field) in (self._get(key) or {})
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self._lock:
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            data = self._get(key, dict)
+            added = sum(1 for field in items if _encode(field) not in data)
+            data.update({_encode(field): _encode(value) for field, value in items.items()})
+            self._touch(_encode(key))
+            return added
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            data = self._get(key, dict)
+            value = int(data.get(_encode(field), 0)) + amount
+            data[_encode(field)] = _encode(value)
+            self._touch(_encode(key))
+            return value
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            data = self._get(key) or {}
+            deleted = sum(1 for field in fields if data.pop(_encode(field), None) is not None)
+            if deleted:
+                self._touch(_encode(key))
+                self._cleanup(_encode(key))
+            return deleted
+
+    # Conjuntos
+
+    def sadd(self, key, *members):
+        with self._lock:
+            data = self._get(key, set)
+            added = {_encode(member) for member in members} - data
+            data.update(added)
+            self._touch(_encode(key))
+            return len(added)
+
+    def srem(self, key, *members):
+        with self._lock:
+            data = self._get(key) or set()
+            removed = {_encode(member) for member in members} & data
+            data.difference_update(removed)
+            if removed:
+                self._touch(_encode(key))
+                self._cleanup(_encode(key))
+            return len(removed)
+
+    def spop(self, key, count=None):
+        with self._lock:
+            data = self._get(key) or set()
+            popped = [data.pop() for _ in range(min(count or 1, len(data)))]
+            if popped:
+                self._touch(_encode(key))
+                self._cleanup(_encode(key))
+            return popped if count is not None else (popped[0] if popped else None)
+
+    def srandmember(self, key, count=None):
+        with self._lock:
+            members = list(self._get(key) or set())
+            return members[:count] if count is not None else (members[0] if members else None)
+
+    def smove(self, source, destination, member):
+        with self._lock:
+            data = self._get(source) or set()
+            if _encode(member) not in data:
+                return False
+            data.discard(_encode(member))
+            self._touch(_encode(source))
+            self._cleanup(_encode(source))
+            self._get(destination, set).add(_encode(member))
+            self._touch(_encode(destination))
+            return True
+
+    def sunionstore(self, destination, *keys):
+        with self._lock:
+            union = set()
+            for key in keys:
+                union |= self._get(key) or set()
+            self._data[_encode(destination)] = union
+            self._expires.pop(_encode(destination), None)
+            self._touch(_encode(destination))
+            self._cleanup(_encode(destination))
+            return len(union)
+
+    def scard(self, key):
+        with self._lock:
+            return len(self._get(key) or set())
+
+    def sismember(self, key, member):
+        with self._lock:
+            return _encode(member) in (self._get(key) or set())
+
+    def smismember(self, key, members):
+        with self._lock:
+            data = self._get(key) or set()
+            return [_encode(member) in data for member in members]
+
+    # Pipelines y transacciones
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def transaction(self, func, *watches):
+        while True:
+            pipeline = self.pipeline()
+            pipeline.watch(*watches)
+            try:
+                func(pipeline)
+                return pipeline.execute()
+            except WatchError:
+                continue
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self._commands = []
+        self._watched = None
+        self._immediate = False
+
+    def watch(self, *keys):
+        with self.client._lock:
+            self._watched = {_encode(key): self.client._versions.get(_encode(key), 0) for key in keys}
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def execute(self):
+        with self.client._lock:
+            if self._watched is not None:
+                for key, version in self._watched.items():
+                    # Un vencimiento también cuenta como modificación
+                    self.client._get(key)
+                    if self.client._versions.get(key, 0) != version:
+                        raise WatchError()
+            results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        self._commands = []
+        self._watched = None
+        return results
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            if self._immediate:
+                return command(*args, **kwargs)
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
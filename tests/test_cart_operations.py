@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import event
+
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.models import CartItemModel, ProductModel, StockReservationModel
+from app.schemas.cart_item_schema import CartItemOperation
+from app.services.cart_service import CartService
+from app.services.stock_reservation_service import StockReservationService
+
+
+@pytest.fixture
+def cart_service():
+    service = CartService()
+    service.cart_item_repository = CartItemRepository(store=None)
+    service.stock_reservation_service = StockReservationService(ttl_seconds=900)
+    return service
+
+
+def cart_quantities(db, cart_id):
+    db.expire_all()
+    return dict(db.query(CartItemModel.product_id, CartItemModel.quantity).filter_by(cart_id=cart_id).all())
+
+
+def test_operations_report_each_result(db, products, user_cart, cart_service):
+    _, cart_id = user_cart
+    cart_service.apply_cart_operations(db, cart_id, [CartItemOperation(op="add", product_id=products[0])])
+
+    result = cart_service.apply_cart_operations(db, cart_id, [
+        CartItemOperation(op="add", product_id=products[0], quantity=2),
+        CartItemOperation(op="set", product_id=products[1], quantity=500),
+        CartItemOperation(op="remove", product_id=products[2]),
+        CartItemOperation(op="set", product_id=9999, quantity=1),
+        CartItemOperation(op="set", product_id=products[2], quantity=4),
+    ])
+
+    assert (result["applied"], result["failed"]) == (2, 3)
+    assert [(r["index"], r["status"], r["quantity"]) for r in result["results"]] == [
+        (0, "applied", 3),
+        (1, "error", 0),
+        (2, "error", 0),
+        (3, "error", 0),
+        (4, "applied", 4),
+    ]
+    assert result["results"][1]["detail"] == "Insufficient stock. Available: 100, Requested: 500"
+    assert result["results"][2]["detail"] == "Product not found in cart"
+    assert result["results"][3]["detail"] == "Product not found"
+    assert cart_quantities(db, cart_id) == {products[0]: 3, products[2]: 4}
+
+
+def test_operations_are_committed_once(engine, db, products, user_cart, cart_service):
+    _, cart_id = user_cart
+    commits = []
+
+    def on_commit(connection):
+        commits.append(connection)
+
+    event.listen(engine, "commit", on_commit)
+    try:
+        cart_service.apply_cart_operations(db, cart_id, [
+            CartItemOperation(op="add", product_id=products[0], quantity=2),
+            CartItemOperation(op="add", product_id=products[1], quantity=1),
+        ])
+    finally:
+        event.remove(engine, "commit", on_commit)
+
+    # Reservas e items en la misma transacción
+    assert len(commits) == 1
+
+
+def test_failed_write_applies_nothing(db, products, user_cart, cart_service, monkeypatch):
+    _, cart_id = user_cart
+    cart_service.apply_cart_operations(db, cart_id, [CartItemOperation(op="add", product_id=products[0], quantity=2)])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(cart_service.cart_item_repository, "sync_cart_items", fail)
+    with pytest.raises(RuntimeError):
+        cart_service.apply_cart_operations(db, cart_id, [
+            CartItemOperation(op="set", product_id=products[0], quantity=5),
+            CartItemOperation(op="add", product_id=products[1], quantity=1),
+        ])
+
+    assert cart_quantities(db, cart_id) == {products[0]: 2}
+    assert dict(db.query(StockReservationModel.product_id, StockReservationModel.quantity).all()) == {products[0]: 2}
+    assert db.get(ProductModel, products[0]).stock == 98
+    assert db.get(ProductModel, products[1]).stock == 100
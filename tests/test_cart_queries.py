@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.repositories.cart_item_repository import CartItemRepository
+from app.services.cart_service import CartService
+
+
+@contextmanager
+def count_statements(engine):
+    """Contar las sentencias que se envían a la base mientras dura el bloque"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def cart_service():
+    # Escritura directa a SQLite, sin almacén de carritos
+    service = CartService()
+    service.cart_item_repository = CartItemRepository(store=None)
+    return service
+
+
+def fill_cart(db, cart_id, product_ids):
+    # Por el repositorio, que además mantiene los totales guardados en el carrito
+    repository = CartItemRepository(store=None)
+    for product_id in product_ids:
+        repository.add_item_to_cart(db, cart_id, product_id, 2)
+
+
+@pytest.mark.parametrize("method", ["get_cart_with_product_details", "get_cart_total"])
+def test_cart_reads_issue_constant_statements(engine, db, products, user_cart, cart_service, method):
+    user_id, cart_id = user_cart
+
+    db.expire_all()
+    with count_statements(engine) as empty_statements:
+        getattr(cart_service, method)(db, user_id)
+
+    fill_cart(db, cart_id, products)
+    db.expire_all()
+    with count_statements(engine) as full_statements:
+        result = getattr(cart_service, method)(db, user_id)
+
+    assert len(full_statements) == len(empty_statements)
+    if method == "get_cart_with_product_details":
+        assert len(result["items"]) == len(products)
+        assert result["summary"]["total_items"] == 2 * len(products)
+    else:
+        assert result["total_items"] == 2 * len(products)
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.cart_repository import CartRepository
+from app.repositories.cart_store import MemoryCartStore, RedisCartStore, create_cart_store
+from app.repositories.models import CartItemModel, OrderItemModel
+from app.services.cart_service import CartService
+from app.services.checkout_service import CheckoutService
+from fake_redis import FakeRedis
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return create_cart_store("memory")
+    return create_cart_store("redis", redis_client=FakeRedis())
+
+
+def stored_items(db, cart_id):
+    return dict(db.query(CartItemModel.product_id, CartItemModel.quantity).filter_by(cart_id=cart_id).all())
+
+
+def test_load_does_not_overwrite_loaded_cart(store):
+    store.load_items(1, {10: 1})
+    store.add_quantity(1, 10, 2)
+    # Una lectura vieja de SQLite no pisa lo que ya se modificó en el almacén
+    store.load_items(1, {10: 1})
+    assert store.get_items(1) == {10: 3}
+
+
+def test_set_quantities_only_touches_given_products(store):
+    store.load_items(1, {10: 1, 11: 1})
+    store.set_quantities(1, {10: 5, 11: 0, 12: 2})
+    assert store.get_items(1) == {10: 5, 12: 2}
+    assert store.pending_count() == 1
+
+
+def test_write_behind_persists_on_flush(db, products, user_cart, store):
+    _, cart_id = user_cart
+    repository = CartItemRepository(store)
+    repository.add_item_to_cart(db, cart_id, products[0], 2)
+    repository.add_item_to_cart(db, cart_id, products[1], 1)
+
+    assert stored_items(db, cart_id) == {}
+    assert store.pending_count() == 1
+
+    assert repository.flush_pending(db, batch_size=10) == 1
+    assert stored_items(db, cart_id) == {products[0]: 2, products[1]: 1}
+    assert store.pending_count() == 0
+
+    repository.remove_product_from_cart(db, cart_id, products[0])
+    repository.flush_pending(db, batch_size=10)
+    assert stored_items(db, cart_id) == {products[1]: 1}
+
+
+def test_failed_flush_keeps_carts_pending(db, products, user_cart, store, monkeypatch):
+    _, cart_id = user_cart
+    repository = CartItemRepository(store)
+    repository.add_item_to_cart(db, cart_id, products[0], 1)
+
+    def fail(db, cart_ids):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(repository, "flush_carts", fail)
+    with pytest.raises(RuntimeError):
+        repository.flush_pending(db, batch_size=10)
+    assert store.pending_count() == 1
+
+
+def test_checkout_flushes_pending_cart_first(db, products, user_cart, store):
+    user_id, cart_id = user_cart
+    checkout_service = CheckoutService()
+    checkout_service.cart_item_repository = CartItemRepository(store)
+    checkout_service.cart_service.cart_item_repository = CartItemRepository(store)
+    checkout_service.cart_item_repository.add_item_to_cart(db, cart_id, products[0], 2)
+    assert stored_items(db, cart_id) == {}
+
+    result = checkout_service.checkout(db, user_id)
+
+    order_id = result["order"].id
+    assert dict(
+        db.query(OrderItemModel.product_id, OrderItemModel.quantity).filter_by(order_id=order_id).all()
+    ) == {products[0]: 2}
+    assert stored_items(db, cart_id) == {}
+    assert store.get_items(cart_id) == {}
+
+
+def test_memory_store_evicts_only_flushed_carts():
+    store = MemoryCartStore(max_carts=2)
+    store.load_items(1, {})
+    store.add_quantity(2, 10, 1)
+    store.add_quantity(3, 10, 1)
+    # El carrito limpio se desaloja; los pendientes no
+    assert store.get_items(1) is None
+    assert store.get_items(2) == {10: 1}
+
+    cart_ids = store.pop_pending(10)
+    store.load_items(4, {})
+    # Sacados para el flush pero sin confirmar: tampoco se desalojan
+    assert store.get_items(2) == {10: 1}
+    assert store.get_items(3) == {10: 1}
+
+    store.mark_flushed(cart_ids)
+    assert [store.get_items(cart_id) for cart_id in (2, 3, 4)].count(None) == 1
+
+
+def test_redis_store_expires_only_flushed_carts():
+    clock = Clock()
+    client = FakeRedis(clock=clock)
+    store = RedisCartStore(client, idle_ttl_seconds=60)
+    store.load_items(1, {10: 1})
+    store.load_items(2, {10: 1})
+    store.add_quantity(2, 10, 1)
+
+    clock.now = 120
+    assert store.get_items(1) is None
+    assert store.get_items(2) == {10: 2}
+
+    store.mark_flushed(store.pop_pending(10))
+    clock.now = 240
+    assert store.get_items(2) is None
+
+
+def test_redis_load_retries_when_cart_changes():
+    client = FakeRedis()
+    store = RedisCartStore(client)
+    hexists = client.hexists
+
+    def concurrent_load(key, field):
+        # Otra petición carga y modifica el carrito entre la consulta y el EXEC
+        client.hexists = hexists
+        exists = hexists(key, field)
+        store.load_items(1, {10: 1})
+        store.add_quantity(1, 10, 2)
+        return exists
+
+    client.hexists = concurrent_load
+    store.load_items(1, {10: 1})
+    assert store.get_items(1) == {10: 3}
+
+
+def test_unfinished_flush_is_requeued(db, products, user_cart, store):
+    _, cart_id = user_cart
+    repository = CartItemRepository(store)
+    repository.add_item_to_cart(db, cart_id, products[0], 2)
+
+    # El proceso muere después de sacar el carrito de pendientes y antes del commit
+    assert store.pop_pending(10) == [cart_id]
+    if isinstance(store, RedisCartStore):
+        store = RedisCartStore(store.client)
+        repository = CartItemRepository(store)
+
+    assert store.requeue_unflushed() == 1
+    assert store.pending_count() == 1
+    repository.flush_pending(db, batch_size=10)
+    assert stored_items(db, cart_id) == {products[0]: 2}
+    assert store.requeue_unflushed() == 0
+
+
+def test_cart_details_totals_come_from_the_store(db, products, user_cart, store):
+    user_id, cart_id = user_cart
+    cart_service = CartService()
+    cart_service.cart_item_repository = CartItemRepository(store)
+    cart_service.cart_item_repository.add_item_to_cart(db, cart_id, products[0], 2)
+
+    details = cart_service.get_cart_with_product_details(db, user_id)
+
+    assert details["summary"] == {"total_items": 2, "total_amount": 20.0}
+    assert (details["cart"].total_items, details["cart"].total_amount) == (2, 20.0)
+
+
+def test_flush_skips_carts_deleted_by_compaction(db, products, user_cart, store):
+    _, cart_id = user_cart
+    repository = CartItemRepository(store)
+    repository.add_item_to_cart(db, cart_id, products[0], 2)
+
+    # La purga borra el carrito mientras su escritura sigue pendiente en el almacén
+    CartRepository().delete_stale_carts(db, datetime.utcnow() + timedelta(days=1), limit=10)
+    repository.flush_pending(db, batch_size=10)
+
+    assert stored_items(db, cart_id) == {}
+    assert store.get_items(cart_id) is None
+    assert store.pending_count() == 0
@@ -0,0 +1,132 @@
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.models import CartItemModel, OrderItemModel, OrderModel, ProductModel
+from app.services.checkout_service import CheckoutService
+
+
+@pytest.fixture
+def checkout_service():
+    service = CheckoutService()
+    service.cart_item_repository = CartItemRepository(store=None)
+    service.cart_service.cart_item_repository = CartItemRepository(store=None)
+    return service
+
+
+@pytest.fixture
+def sqlite_trace(engine):
+    """Sentencias que SQLite ejecuta de verdad (incluye los BEGIN/COMMIT implícitos de pysqlite)"""
+    statements = []
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        dbapi_connection.set_trace_callback(statements.append)
+
+    event.listen(engine, "checkout", on_checkout)
+    yield statements
+    event.remove(engine, "checkout", on_checkout)
+
+
+def fill_cart(db, cart_id, quantities):
+    repository = CartItemRepository(store=None)
+    for product_id, quantity in quantities.items():
+        repository.add_item_to_cart(db, cart_id, product_id, quantity)
+
+
+def stock(db, product_id):
+    db.expire_all()
+    return db.get(ProductModel, product_id).stock
+
+
+def assert_nothing_purchased(db, products, cart_id, cart_lines):
+    db.expire_all()
+    assert db.query(OrderModel).count() == 0
+    assert db.query(OrderItemModel).count() == 0
+    assert [stock(db, product_id) for product_id in products] == [100, 100, 100]
+    assert db.query(CartItemModel).filter_by(cart_id=cart_id).count() == cart_lines
+
+
+def test_checkout_creates_order_and_empties_cart(db, products, user_cart, checkout_service):
+    user_id, cart_id = user_cart
+    fill_cart(db, cart_id, {products[0]: 2, products[1]: 1})
+
+    result = checkout_service.checkout(db, user_id)
+
+    assert result["total_amount"] == 2 * 10.0 + 20.0
+    assert {(item.product_id, item.quantity) for item in result["order"].items} == {(products[0], 2), (products[1], 1)}
+    assert stock(db, products[0]) == 98
+    assert stock(db, products[1]) == 99
+    assert db.query(CartItemModel).filter_by(cart_id=cart_id).count() == 0
+
+
+def test_checkout_with_insufficient_stock_changes_nothing(db, products, user_cart, checkout_service):
+    user_id, cart_id = user_cart
+    fill_cart(db, cart_id, {products[0]: 2, products[1]: 101})
+
+    with pytest.raises(HTTPException) as error:
+        checkout_service.checkout(db, user_id)
+
+    assert error.value.status_code == 400
+    assert_nothing_purchased(db, products, cart_id, 2)
+
+
+def test_checkout_rolls_back_stock_when_a_later_step_fails(db, products, user_cart, checkout_service):
+    user_id, cart_id = user_cart
+    fill_cart(db, cart_id, {products[0]: 2, products[2]: 3})
+
+    def fail_insert(db, order_items_data):
+        raise RuntimeError("disk full")
+
+    # Falla después de descontar el stock y crear la orden
+    checkout_service.order_item_repository.insert_order_items = fail_insert
+    with pytest.raises(RuntimeError):
+        checkout_service.checkout(db, user_id)
+
+    assert_nothing_purchased(db, products, cart_id, 2)
+
+
+def test_checkout_many_commits_once_per_batch(engine, db, products, create_user_cart, checkout_service, sqlite_trace):
+    users = [create_user_cart() for _ in range(3)]
+    for _, cart_id in users:
+        fill_cart(db, cart_id, {products[0]: 1})
+    db.close()
+
+    # Lo que ve otra conexión antes de cada compra: nada hasta el commit del lote
+    reader = sqlite3.connect(engine.url.database)
+    visible_orders = []
+    purchase_cart = checkout_service._purchase_cart
+
+    def purchase_and_peek(db, user_id, cart_id):
+        visible_orders.append(reader.execute("SELECT COUNT(*) FROM \"order\"").fetchone()[0])
+        return purchase_cart(db, user_id, cart_id)
+
+    checkout_service._purchase_cart = purchase_and_peek
+    sqlite_trace.clear()
+    outcomes = checkout_service.checkout_many(db, [user_id for user_id, _ in users])
+
+    assert [outcome["status"] for outcome in outcomes] == ["completed"] * 3
+    assert visible_orders == [0, 0, 0]
+    assert reader.execute("SELECT COUNT(*) FROM \"order\"").fetchone()[0] == 3
+    assert sum(1 for statement in sqlite_trace if statement.upper().startswith("COMMIT")) == 1
+    reader.close()
+
+
+def test_checkout_many_rolls_back_only_the_failed_purchase(db, products, create_user_cart, checkout_service):
+    users = [create_user_cart() for _ in range(3)]
+    fill_cart(db, users[0][1], {products[0]: 2})
+    # Más de lo que hay en stock
+    fill_cart(db, users[1][1], {products[0]: 1, products[1]: 500})
+    fill_cart(db, users[2][1], {products[0]: 3})
+
+    outcomes = checkout_service.checkout_many(db, [user_id for user_id, _ in users])
+
+    assert [outcome["status"] for outcome in outcomes] == ["completed", "failed", "completed"]
+    assert outcomes[1]["status_code"] == 400
+    assert stock(db, products[0]) == 95
+    assert stock(db, products[1]) == 100
+    assert db.query(OrderModel).count() == 2
+    assert db.query(CartItemModel).filter_by(cart_id=users[1][1]).count() == 2
+    assert db.query(CartItemModel).filter_by(cart_id=users[0][1]).count() == 0
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app import config
+from app.repositories.models import IdempotencyKeyModel
+from app.services import idempotency_service
+from app.services.cache import LRUCache
+from app.services.idempotency_service import IdempotencyService
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    cache = LRUCache(max_entries=100, ttl_seconds=config.IDEMPOTENCY_KEY_TTL_SECONDS, clock=clock)
+    monkeypatch.setattr(idempotency_service, "idempotency_cache", cache)
+    return clock
+
+
+def backdate(db, key, seconds):
+    db.execute(
+        update(IdempotencyKeyModel)
+        .where(IdempotencyKeyModel.key == key)
+        .values(created_at=datetime.utcnow() - timedelta(seconds=seconds))
+    )
+    db.commit()
+
+
+def test_replay_from_database_is_cached_only_until_the_key_expires(db, clock):
+    service = IdempotencyService()
+    assert service.begin(db, "key-1", "fp") is None
+    service.complete(db, "key-1", "fp", 200, {"ok": True})
+
+    # Otro proceso: no está en su caché y la clave tiene 10 segundos de vida restantes
+    idempotency_service.idempotency_cache.clear()
+    backdate(db, "key-1", config.IDEMPOTENCY_KEY_TTL_SECONDS - 10)
+    assert service.begin(db, "key-1", "fp") == (200, {"ok": True})
+    assert idempotency_service.idempotency_cache.get("key-1") is not None
+
+    clock.now = 11
+    assert idempotency_service.idempotency_cache.get("key-1") is None
+
+
+def test_abandoned_in_progress_key_can_be_taken_over(db, clock, monkeypatch):
+    monkeypatch.setattr(config, "IDEMPOTENCY_IN_PROGRESS_LEASE_SECONDS", 30.0)
+    service = IdempotencyService()
+    assert service.begin(db, "key-1", "fp") is None
+
+    with pytest.raises(HTTPException) as error:
+        service.begin(db, "key-1", "fp")
+    assert error.value.status_code == 409
+
+    # La petición original murió hace más que la concesión
+    backdate(db, "key-1", 31)
+    assert service.begin(db, "key-1", "fp") is None
+
+    # La nueva dueña vuelve a estar en curso
+    with pytest.raises(HTTPException) as error:
+        service.begin(db, "key-1", "fp")
+    assert error.value.status_code == 409
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app.repositories.models import OrderModel
+from app.repositories.order_repository import OrderRepository
+
+NOON = datetime(2026, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def orders(db, create_user_cart):
+    """
+    Órdenes de dos usuarios, varias con exactamente la misma fecha; devuelve
+    {user_id: [ids]} con los ids en el orden esperado (fecha e id descendentes)
+    """
+    users = [create_user_cart()[0] for _ in range(2)]
+    dates = [NOON - timedelta(minutes=1)] + [NOON] * 5 + [NOON + timedelta(minutes=1)]
+    rows = []
+    for date in dates:
+        for user_id in users:
+            order_id = db.scalar(
+                insert(OrderModel).values(user_id=user_id, total=10.0, date=date).returning(OrderModel.id)
+            )
+            rows.append((date, order_id, user_id))
+    db.commit()
+    rows.sort(reverse=True)
+    return {
+        None: [order_id for _, order_id, _ in rows],
+        **{user_id: [order_id for _, order_id, owner in rows if owner == user_id] for user_id in users},
+    }
+
+
+def collect_pages(db, limit, **filters):
+    repository = OrderRepository()
+    seen, cursor = [], None
+    while True:
+        page, cursor = repository.get_orders(db, limit=limit, cursor=cursor, **filters)
+        assert len(page) <= limit
+        seen.extend(order["id"] if isinstance(order, dict) else order.id for order in page)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 100])
+def test_pages_split_equal_timestamps_without_gaps_or_repeats(db, orders, limit):
+    assert collect_pages(db, limit) == orders[None]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_user_history_pages_with_equal_timestamps(db, orders, limit):
+    for user_id, expected in orders.items():
+        if user_id is not None:
+            assert collect_pages(db, limit, user_id=user_id) == expected
+
+
+def test_projected_pages_with_equal_timestamps(db, orders):
+    assert collect_pages(db, 3, fields=["total"]) == orders[None]
+
+
+def test_date_range_pages_with_equal_timestamps(db, orders):
+    # Solo las de las 12:00 en punto (date_to excluida)
+    seen = collect_pages(db, 3, date_from=NOON, date_to=NOON + timedelta(seconds=1))
+    assert seen == orders[None][2:12]
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.controllers import order_router
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.database import get_db
+from app.repositories.models import OrderModel, ProductModel
+from app.schemas.order_schema import OrderCreate
+from app.services.checkout_service import CheckoutService
+from app.services.order_service import OrderService
+
+
+@pytest.fixture
+def client(engine):
+    app = FastAPI()
+    app.include_router(router=order_router)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path", ["/orders", "/orders/"])
+def test_orders_by_ids_without_redirect(client, db, user_cart, path):
+    user_id, _ = user_cart
+    order = OrderService().create_order(db, OrderCreate(user_id=user_id, total=25.0))
+
+    response = client.get(path, params={"ids": f"{order.id},999999"}, follow_redirects=False)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [order.id]
+    assert body["missing_ids"] == [999999]
+
+
+@pytest.fixture
+def purchased_order(db, products, user_cart):
+    """Orden comprada con 2 unidades del primer producto y 5 del segundo; devuelve su id"""
+    user_id, cart_id = user_cart
+    repository = CartItemRepository(store=None)
+    repository.add_item_to_cart(db, cart_id, products[0], 2)
+    repository.add_item_to_cart(db, cart_id, products[1], 5)
+    service = CheckoutService()
+    service.cart_item_repository = repository
+    service.cart_service.cart_item_repository = repository
+    return service.checkout(db, user_id)["order"].id
+
+
+def order_state(db, order_id, product_ids):
+    db.expire_all()
+    return db.get(OrderModel, order_id).status, [db.get(ProductModel, product_id).stock for product_id in product_ids]
+
+
+def test_cancel_restores_stock_once(client, db, products, purchased_order):
+    assert order_state(db, purchased_order, products) == ("completed", [98, 95, 100])
+
+    first = client.post(f"/orders/{purchased_order}/cancel")
+    assert first.status_code == 200
+    assert first.json()["cancelled_order"]["status"] == "cancelled"
+    assert order_state(db, purchased_order, products) == ("cancelled", [100, 100, 100])
+
+    second = client.post(f"/orders/{purchased_order}/cancel")
+    assert second.status_code == 409
+    assert order_state(db, purchased_order, products) == ("cancelled", [100, 100, 100])
+
+
+def test_concurrent_cancels_restore_stock_once(client, db, products, purchased_order):
+    barrier = threading.Barrier(2)
+    status_codes = []
+
+    def cancel():
+        barrier.wait()
+        status_codes.append(client.post(f"/orders/{purchased_order}/cancel").status_code)
+
+    threads = [threading.Thread(target=cancel) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(status_codes) == [200, 409]
+    assert order_state(db, purchased_order, products) == ("cancelled", [100, 100, 100])
+
+
+def test_cancel_missing_order(client):
+    assert client.post("/orders/999999/cancel").status_code == 404
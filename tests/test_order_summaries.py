@@ -0,0 +1,82 @@
+from sqlalchemy import insert, text
+
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.migrations import run_migrations
+from app.repositories.models import OrderItemModel, OrderModel
+from app.repositories.order_repository import OrderRepository
+from app.services.checkout_service import CheckoutService
+from app.services.order_service import OrderService
+
+
+def insert_order(db, user_id, quantities):
+    """Orden con un item por cantidad, escrita sin el resumen (como antes de las columnas)"""
+    order_id = db.scalar(insert(OrderModel).values(user_id=user_id, total=10.0).returning(OrderModel.id))
+    for product_id, quantity in quantities:
+        db.execute(insert(OrderItemModel).values(order_id=order_id, product_id=product_id, quantity=quantity, price=10.0))
+    return order_id
+
+
+def summary_columns(db, order_id):
+    db.expire_all()
+    order = db.get(OrderModel, order_id)
+    return order.items_count, order.total_quantity
+
+
+def test_checkout_stores_the_summary(db, products, user_cart):
+    user_id, cart_id = user_cart
+    repository = CartItemRepository(store=None)
+    repository.add_item_to_cart(db, cart_id, products[0], 2)
+    repository.add_item_to_cart(db, cart_id, products[1], 5)
+    service = CheckoutService()
+    service.cart_item_repository = repository
+    service.cart_service.cart_item_repository = repository
+
+    order_id = service.checkout(db, user_id)["order"].id
+
+    assert summary_columns(db, order_id) == (2, 7)
+    summary = OrderService().get_order_total(db, order_id)
+    assert (summary["items_count"], summary["total_items"]) == (2, 7)
+
+
+def test_create_order_with_items_stores_the_summary(db, products, user_cart):
+    user_id, _ = user_cart
+    order = OrderService().create_order_with_items(db, user_id, [
+        {"product_id": products[0], "quantity": 1},
+        {"product_id": products[1], "quantity": 3},
+        {"product_id": products[2], "quantity": 4},
+    ])
+
+    assert summary_columns(db, order.id) == (3, 8)
+
+
+def test_backfill_summaries_from_items(db, products, user_cart):
+    user_id, _ = user_cart
+    with_items = insert_order(db, user_id, [(products[0], 2), (products[1], 3)])
+    without_items = insert_order(db, user_id, [])
+    db.commit()
+
+    OrderRepository().backfill_summaries(db)
+
+    assert summary_columns(db, with_items) == (2, 5)
+    assert summary_columns(db, without_items) == (0, 0)
+
+
+def test_migration_backfills_existing_orders(engine, db, products, user_cart):
+    user_id, _ = user_cart
+    # Base de antes de las columnas del resumen
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE "order" DROP COLUMN items_count'))
+        connection.execute(text('ALTER TABLE "order" DROP COLUMN total_quantity'))
+        connection.execute(text(
+            'INSERT INTO "order" (user_id, total, date, version, status) '
+            "VALUES (:user_id, 30.0, CURRENT_TIMESTAMP, 1, 'completed')"
+        ), {"user_id": user_id})
+        order_id = connection.execute(text('SELECT MAX(id) FROM "order"')).scalar()
+        connection.execute(insert(OrderItemModel), [
+            {"order_id": order_id, "product_id": products[0], "quantity": 1, "price": 10.0},
+            {"order_id": order_id, "product_id": products[2], "quantity": 6, "price": 10.0},
+        ])
+
+    run_migrations(engine)
+
+    assert summary_columns(db, order_id) == (2, 7)
@@ -0,0 +1,28 @@
+from sqlalchemy import delete
+
+from app.repositories.models import UserModel
+from app.repositories.pagination import approximate_count, refresh_statistics
+
+
+def test_approximate_count_follows_refreshed_statistics(db, create_user_cart):
+    for _ in range(4):
+        create_user_cart()
+    refresh_statistics(db)
+    assert approximate_count(db, UserModel.__table__) == 4
+
+    for _ in range(3):
+        create_user_cart()
+    # Hasta el próximo ANALYZE se sigue usando la estadística vieja
+    assert approximate_count(db, UserModel.__table__) == 4
+    refresh_statistics(db)
+    assert approximate_count(db, UserModel.__table__) == 7
+
+
+def test_approximate_count_is_bounded_by_max_id_after_deletes(db, create_user_cart):
+    users = [create_user_cart()[0] for _ in range(5)]
+    refresh_statistics(db)
+
+    db.execute(delete(UserModel).where(UserModel.id >= users[2]))
+    db.commit()
+    # La estadística todavía dice 5, pero ya no hay ids por encima del segundo
+    assert approximate_count(db, UserModel.__table__) == 2
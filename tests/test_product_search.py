@@ -0,0 +1,60 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.repositories.models import ProductModel
+from app.repositories.pagination import encode_cursor
+from app.repositories.product_repository import ProductRepository
+from app.repositories.product_search_repository import ProductSearchRepository
+
+
+@pytest.fixture
+def catalog(db):
+    # Relevancias distintas (nombre, categoría, descripción) y empates
+    db.execute(insert(ProductModel), [
+        {"name": "Mate de calabaza", "description": "", "category": "mate", "price": 10.0, "stock": 5, "image": ""},
+        {"name": "Bombilla", "description": "para mate", "category": "accesorios", "price": 5.0, "stock": 5, "image": ""},
+        {"name": "Mate", "description": "", "category": "mate", "price": 12.0, "stock": 5, "image": ""},
+        {"name": "Yerba", "description": "ideal para mate", "category": "mate", "price": 8.0, "stock": 5, "image": ""},
+        {"name": "Termo", "description": "para mate", "category": "accesorios", "price": 30.0, "stock": 5, "image": ""},
+        {"name": "Taza", "description": "", "category": "cocina", "price": 3.0, "stock": 5, "image": ""},
+    ])
+    ProductSearchRepository().rebuild(db)
+
+
+def search_all(db, query, limit):
+    repository = ProductRepository()
+    ids, cursor = [], None
+    while True:
+        products, cursor = repository.search_products(db, query, limit=limit, cursor=cursor)
+        ids.extend(product.id for product in products)
+        if cursor is None:
+            return ids
+
+
+def test_search_pages_follow_relevance_order(db, catalog):
+    expected, cursor = ProductRepository().search_products(db, "mate", limit=100)
+    assert cursor is None
+    assert len(expected) == 5
+
+    for limit in (1, 2, 3):
+        assert search_all(db, "mate", limit) == [product.id for product in expected]
+
+
+def test_search_next_page_is_not_shifted_by_new_products(db, catalog):
+    repository = ProductRepository()
+    first_page, cursor = repository.search_products(db, "mate", limit=2)
+    rest = search_all(db, "mate", 100)[2:]
+
+    # Un producto más relevante agregado entre páginas no desplaza las siguientes
+    product = ProductModel(name="Mate mate", description="mate", category="mate", price=1.0, stock=1, image="")
+    repository.create_product(db, product)
+    next_page, _ = repository.search_products(db, "mate", limit=100, cursor=cursor)
+
+    assert [product.id for product in next_page] == rest
+
+
+def test_search_rejects_offset_cursor(db, catalog):
+    with pytest.raises(HTTPException) as error:
+        ProductRepository().search_products(db, "mate", cursor=encode_cursor([2]))
+    assert error.value.status_code == 400
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.repositories.models import ProductModel
+from app.repositories.product_repository import ProductRepository
+
+
+def stocks(db, product_ids):
+    db.expire_all()
+    return dict(db.execute(select(ProductModel.id, ProductModel.stock).where(ProductModel.id.in_(product_ids))).all())
+
+
+def test_decrement_stock_bulk_updates_every_product(db, products):
+    remaining = ProductRepository().decrement_stock_bulk(db, {products[0]: 3, products[1]: 100})
+
+    assert remaining == {products[0]: 97, products[1]: 0}
+    assert stocks(db, products) == {products[0]: 97, products[1]: 0, products[2]: 100}
+
+
+def test_decrement_stock_bulk_refreshes_loaded_products(db, products):
+    product = db.get(ProductModel, products[0])
+    ProductRepository().decrement_stock_bulk(db, {products[0]: 4}, commit=False)
+
+    # Sin commit de por medio, el objeto ya cargado en la sesión ve el stock nuevo
+    assert product.stock == 96
+    db.rollback()
+
+
+def test_concurrent_decrements_for_the_last_unit(engine, db, products):
+    db.execute(update(ProductModel).where(ProductModel.id == products[0]).values(stock=1))
+    db.commit()
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # Las dos sesiones salen juntas a descontar la misma unidad
+    barrier = threading.Barrier(2)
+    results = []
+
+    def buy():
+        session = session_factory()
+        try:
+            barrier.wait()
+            ProductRepository().decrement_stock_bulk(session, {products[0]: 1})
+            results.append("ok")
+        except HTTPException as error:
+            results.append(error.status_code)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=buy) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results, key=str) == [400, "ok"]
+    assert stocks(db, [products[0]]) == {products[0]: 0}
+
+
+@pytest.mark.parametrize("bad_item, status_code", [
+    ("missing", 404),
+    ("short", 400),
+])
+def test_decrement_stock_bulk_is_all_or_nothing(db, products, bad_item, status_code):
+    quantities = {products[0]: 5, products[1]: 5}
+    if bad_item == "missing":
+        quantities[999999] = 1
+    else:
+        quantities[products[2]] = 101
+
+    with pytest.raises(HTTPException) as error:
+        ProductRepository().decrement_stock_bulk(db, quantities)
+
+    assert error.value.status_code == status_code
+    assert stocks(db, products) == {product_id: 100 for product_id in products}
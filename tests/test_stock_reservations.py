@@ -0,0 +1,122 @@
+import pytest
+from fastapi import HTTPException
+
+from app.repositories.cart_item_repository import CartItemRepository
+from app.repositories.models import ProductModel, StockReservationModel
+from app.schemas.cart_item_schema import AddToCart, CartItemUpdate
+from app.services.cart_compaction_service import CartCompactionService
+from app.services.cart_service import CartService
+from app.services.stock_reservation_service import StockReservationService
+
+
+@pytest.fixture
+def cart_service():
+    service = CartService()
+    service.cart_item_repository = CartItemRepository(store=None)
+    service.stock_reservation_service = StockReservationService(ttl_seconds=900)
+    return service
+
+
+def stock(db, product_id):
+    db.expire_all()
+    return db.get(ProductModel, product_id).stock
+
+
+def test_add_item_holds_stock(db, products, user_cart, cart_service):
+    user_id, _ = user_cart
+    cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+
+    assert stock(db, products[0]) == 97
+    assert db.query(StockReservationModel).count() == 1
+
+
+def test_failed_item_write_does_not_keep_hold(db, products, user_cart, cart_service, monkeypatch):
+    user_id, _ = user_cart
+
+    def fail(*args, **kwargs):
+        raise HTTPException(status_code=500, detail="write failed")
+
+    monkeypatch.setattr(cart_service.cart_item_repository, "add_item_to_cart", fail)
+    with pytest.raises(HTTPException):
+        cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+
+    assert stock(db, products[0]) == 100
+    assert db.query(StockReservationModel).count() == 0
+
+
+
+def reserved_quantities(db):
+    return dict(db.query(StockReservationModel.product_id, StockReservationModel.quantity).all())
+
+
+def test_failed_quantity_update_keeps_previous_hold(db, products, user_cart, cart_service, monkeypatch):
+    user_id, _ = user_cart
+    item = cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+
+    def fail(*args, **kwargs):
+        raise HTTPException(status_code=500, detail="write failed")
+
+    monkeypatch.setattr(cart_service.cart_item_repository, "update_cart_item_quantity", fail)
+    with pytest.raises(HTTPException):
+        cart_service.update_cart_item_quantity(db, user_id, item.id, CartItemUpdate(quantity=10))
+
+    assert stock(db, products[0]) == 97
+    assert reserved_quantities(db) == {products[0]: 3}
+
+
+def test_quantity_update_moves_hold(db, products, user_cart, cart_service):
+    user_id, _ = user_cart
+    item = cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+    cart_service.update_cart_item_quantity(db, user_id, item.id, CartItemUpdate(quantity=1))
+
+    assert stock(db, products[0]) == 99
+    assert reserved_quantities(db) == {products[0]: 1}
+
+
+def test_remove_releases_hold(db, products, user_cart, cart_service):
+    user_id, cart_id = user_cart
+    item = cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+    cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[1], quantity=2))
+
+    cart_service.remove_item_from_cart(db, user_id, item.id)
+    cart_service.remove_product_from_cart(db, cart_id, products[1])
+
+    assert stock(db, products[0]) == 100
+    assert stock(db, products[1]) == 100
+    assert reserved_quantities(db) == {}
+
+
+def test_removing_missing_product_keeps_holds(db, products, user_cart, cart_service):
+    user_id, cart_id = user_cart
+    cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+
+    with pytest.raises(HTTPException) as error:
+        cart_service.remove_product_from_cart(db, cart_id, products[1])
+
+    assert error.value.status_code == 404
+    assert reserved_quantities(db) == {products[0]: 3}
+
+
+def test_reserved_cart_is_valid_for_checkout(db, products, user_cart, cart_service):
+    user_id, _ = user_cart
+    # Todo el stock queda reservado por este carrito
+    cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=100))
+
+    assert stock(db, products[0]) == 0
+    assert cart_service.validate_cart_for_checkout(db, user_id)["valid"] is True
+
+def test_compaction_releases_reservations_of_purged_carts(db, products, user_cart, cart_service):
+    user_id, cart_id = user_cart
+    cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[0], quantity=3))
+    cart_service.add_item_to_cart(db, user_id, AddToCart(product_id=products[1], quantity=2))
+
+    compaction_service = CartCompactionService()
+    compaction_service.cart_item_repository = CartItemRepository(store=None)
+    # Con edad máxima negativa todos los carritos quedan por debajo del corte
+    report = compaction_service.compact(db, max_age_days=-1, batch_size=10)
+
+    assert report["carts_deleted"] == 1
+    assert report["units_restored"] == 5
+    assert stock(db, products[0]) == 100
+    assert stock(db, products[1]) == 100
+    assert db.query(StockReservationModel).count() == 0